@@ -6,7 +6,9 @@ import json
 import os
 import sys
 
-# Object representation of a ticket mapping its number to its prime number ID
+# Object representation of a ticket mapping its number to its ID
+# The ID is either a bitmask of song IDs (written in hex) or, for older
+# games, a product of prime number song IDs
 class Ticket:
 
     def __init__(self, ticketNumber, ticketId):
@@ -87,17 +89,18 @@ class MainApp:
             if theTicket != None:
                 with open(path + "/gameTracks.json", 'rt') as f:
                     gameTracks = json.load(f)
-                Song = namedtuple('Song', ['song_id', 'title', 'artist', 'count', 'duration',
-                                           'filename', 'album'])
+                Song = namedtuple('Song', ['song_id', 'title', 'artist', 'count'])
                 for idx in range(len(gameTracks)):
                     try:
                         gameTracks[idx]['song_id'] = gameTracks[idx]['songId']
                         del gameTracks[idx]['songId']
                     except KeyError:
                         pass
-                gameTracks = map(lambda s: Song(**s), gameTracks)
+                gameTracks = [Song(song_id=s['song_id'], title=s['title'],
+                                   artist=s['artist'], count=s.get('count', idx))
+                              for idx, s in enumerate(gameTracks, 1)]
 
-                winPoint, title, artist = self.checkWin(int(theTicket.ticketId), path, gameTracks)
+                winPoint, title, artist = self.checkWin(theTicket.ticketId.strip(), path, gameTracks)
 
                 self.ticketStatusWindow.config(fg=normalColour)
 
@@ -123,7 +126,9 @@ class MainApp:
 
     def checkWin(self, ticketId, directory, lines):
         """returns the point and track in which the ticket will win"""
-        ticketTracks = self.primes(ticketId)
+        if ticketId.startswith("0x"):
+            return self.checkWinMask(int(ticketId, 16), lines)
+        ticketTracks = self.primes(int(ticketId))
         lastSong = "INVALID"
         lastArtist = ""
         lastTitle = ""
@@ -141,6 +146,17 @@ class MainApp:
         else:
             return [0, "", ""]
 
+    def checkWinMask(self, ticketMask, lines):
+        """returns the point and track in which the ticket will win, using
+        a ticket ID that is a bitmask of the song IDs on the ticket"""
+        remaining = ticketMask
+        for i in lines:
+            if remaining & int(i.song_id):
+                remaining &= ~int(i.song_id)
+                if remaining == 0:
+                    return [int(i.count), i.title, i.artist]
+        return [0, "", ""]
+
     def primes(self, n):
         """calculates the prime factors of the prime ticket ID. This will tell exactly what
         tracks were on the ticket"""
@@ -2,6 +2,7 @@
 Classes to store directories of mp3 files.
 """
 
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 import csv
 import hashlib
 import json
@@ -10,19 +11,95 @@ import os
 from pathlib import Path
 import stat
 import sys
+import time
 
-from typing import Dict, List, Optional, Sequence
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, overload
 
+from musicbingo.libraryindex import DirectoryListing, LibraryIndex
 from musicbingo.mp3.exceptions import InvalidMP3Exception
 from musicbingo.mp3.parser import MP3Parser
 from musicbingo.progress import Progress
 from musicbingo.song import HasParent, Metadata, Song
 
+class SongRange(Sequence[Song]):
+    """
+    A read-only view of a range of a list of songs, which does not
+    make a copy of the list.
+    """
+    def __init__(self, songs: List[Song], start: int, end: int) -> None:
+        self._songs = songs
+        self._start = start
+        self._end = end
+
+    @overload
+    def __getitem__(self, index: int) -> Song: # pylint: disable=no-self-use
+        ...
+
+    @overload
+    def __getitem__(self, index: slice) -> Sequence[Song]: # pylint: disable=no-self-use
+        ...
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, end, step = index.indices(len(self))
+            if step == 1:
+                return SongRange(self._songs, self._start + start, self._start + end)
+            return [self[idx] for idx in range(start, end, step)]
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError(index)
+        return self._songs[self._start + index]
+
+    def __iter__(self) -> Iterator[Song]:
+        for index in range(self._start, self._end):
+            yield self._songs[index]
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def __repr__(self) -> str:
+        return f'SongRange({list(self)})'
+
+
+class RefIdIndex:
+    """
+    Index of every Song and Directory in a tree of directories.
+    The songs of the whole tree are stored in one list, ordered so that
+    the songs in each directory (including its sub-directories) are in
+    one contiguous range of the list.
+    """
+    def __init__(self, root: "Directory") -> None:
+        self.songs: Dict[int, Song] = {}
+        self.directories: Dict[int, Directory] = {}
+        self.paths: Dict[Path, Directory] = {}
+        self.all_songs: List[Song] = []
+        self.ranges: Dict[int, Tuple[int, int]] = {}
+        self._add(root)
+
+    def _add(self, directory: "Directory") -> None:
+        """add a directory and all of its contents to the index"""
+        self.directories.setdefault(directory.ref_id, directory)
+        self.paths[directory.directory] = directory
+        for song in directory.songs:
+            self.songs.setdefault(song.ref_id, song)
+        start = len(self.all_songs)
+        for sub_dir in directory.subdirectories:
+            self._add(sub_dir)
+        self.all_songs += directory.songs
+        self.ranges[id(directory)] = (start, len(self.all_songs))
+
+    def songs_in(self, directory: "Directory") -> SongRange:
+        """all songs in the directory and its sub-directories"""
+        start, end = self.ranges[id(directory)]
+        return SongRange(self.all_songs, start, end)
+
+
 class Directory(HasParent):
     """Represents one directory full of mp3 files.
     It will parse reach mp3 file it finds to create Song objects.
     As this process is quite slow, it caches its results in a
-    songs.json file.
+    songs.json file, or in a LibraryIndex if one is provided.
     """
 
     maxFileSize = 32 * 1024 * 1024
@@ -30,17 +107,28 @@ class Directory(HasParent):
 
     def __init__(self, parent: Optional[HasParent], ref_id: int,
                  directory: Path, parser: MP3Parser,
-                 progress: Progress):
+                 progress: Progress, index: Optional[LibraryIndex] = None):
         super(Directory, self).__init__(parent)
         self.ref_id = ref_id
         self.directory = directory
         self.parser = parser
         self.progress = progress
+        self.index = index
         self.songs: List[Song] = []
         self.subdirectories: List[Directory] = []
         self.title: str = f'[{directory.name}]'
         self.artist: str = ''
         self.cache_hash: str = ''
+        # songs found by parallel_search(), indexed by position in directory
+        self._found: Dict[int, Song] = {}
+        # index of the whole tree, only used in the top level Directory
+        self._ref_ids: Optional[RefIdIndex] = None
+        # (mtime_ns, entry_count) of directory when parallel_search() found
+        # that it has changed since the previous search
+        self._scan_state: Optional[Tuple[int, int]] = None
+        # position in this directory of each sub-directory found by
+        # parallel_search(), indexed by name
+        self._subdir_positions: Dict[str, int] = {}
 
     @property
     def filename(self) -> str:
@@ -51,22 +139,7 @@ class Directory(HasParent):
         """Walk self.directory finding all songs and sub-directories."""
         if not self.directory.is_dir():
             raise IOError(f'Directory "{self.directory}" does not exist')
-        cache: Dict[str, Dict] = {}
-        filename = self.directory / self.cache_filename
-        if filename.exists():
-            with filename.open('r') as cfn:
-                data = cfn.read()
-            contents = json.loads(data)
-            sha = hashlib.sha256()
-            sha.update(data.encode('utf-8'))
-            self.cache_hash = sha.hexdigest()
-            for song in contents:
-                cache[song['filename']] = song
-            del data
-            del contents
-            del sha
-        else:
-            print(f'Missing {filename}')
+        cache = self._load_cache()
         folder_list = list(self.directory.iterdir())
         divisor = math.pow(10, depth) * len(folder_list)
         for index, filename in enumerate(folder_list):
@@ -80,9 +153,164 @@ class Directory(HasParent):
             except InvalidMP3Exception as err:
                 print(sys.exc_info())
                 print(f"Error inspecting file: {filename} - {err}")
+        self.invalidate_index()
         if self.songs:
             self.save_cache()
 
+    def parallel_search(self, workers: Optional[int] = None) -> None:
+        """
+        Walk self.directory finding all songs and sub-directories.
+        The whole directory tree is enumerated first, using the cache
+        files, and then every MP3 file that was not found in a cache is
+        parsed using a pool of "workers" threads.
+        If a LibraryIndex is being used, the contents of a directory
+        that has not changed since the previous search are loaded from
+        the index, without listing the directory or checking its files.
+        A file that is overwritten in place does not change its
+        directory, so is not parsed again (the DirectoryWatcher detects
+        these files while it is running).
+        """
+        if not self.directory.is_dir():
+            raise IOError(f'Directory "{self.directory}" does not exist')
+        pending: List[Tuple[Directory, int, Path, os.stat_result]] = []
+        self._enumerate(pending)
+        if workers is None:
+            workers = min(32, (os.cpu_count() or 1) + 4)
+        total = len(pending)
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures: Dict[Future, Tuple[Directory, int, Path, os.stat_result]] = {
+                pool.submit(self.parser.parse, item[2]): item for item in pending
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                if self.progress.abort:
+                    for fut in futures:
+                        fut.cancel()
+                    break
+                directory, index, filename, fstats = futures[future]
+                try:
+                    metadata = future.result()
+                    directory._found[index] = Song(directory, directory.ref_id + index + 1,
+                                                   metadata)
+                    if self.index is not None:
+                        self.index.store(filename, fstats, metadata)
+                except InvalidMP3Exception as err:
+                    print(f"Error inspecting file: {filename} - {err}")
+                rate = done / max(time.time() - start, 0.001)
+                self.progress.text = f'{done}/{total} files ({rate:.1f} files/sec)'
+                self.progress.pct = 100.0 * done / total
+        self._add_found_songs(not self.progress.abort)
+        self.invalidate_index()
+        if self.index is not None:
+            self.index.commit()
+
+    def _enumerate(self,
+                   pending: List[Tuple["Directory", int, Path, os.stat_result]],
+                   dir_stats: Optional[os.stat_result] = None) -> None:
+        """
+        Find all songs and sub-directories, without parsing any MP3 files.
+        Every MP3 file that is not in the cache is added to "pending"
+        """
+        if self.index is not None:
+            if dir_stats is None:
+                dir_stats = os.stat(str(self.directory))
+            listing = self.index.directory_listing(self.directory,
+                                                   dir_stats.st_mtime_ns)
+            if listing is not None:
+                self._enumerate_listing(pending, listing)
+                return
+        cache = self._load_cache()
+        entries = list(os.scandir(str(self.directory)))
+        if dir_stats is not None:
+            self._scan_state = (dir_stats.st_mtime_ns, len(entries))
+        self.progress.text = f'Searching {self.directory.name}'
+        for index, entry in enumerate(entries):
+            filename = self.directory / entry.name
+            if entry.is_dir():
+                subdir = Directory(self, 1000 * (self.ref_id + index), filename,
+                                   self.parser, self.progress, self.index)
+                subdir._enumerate(pending, entry.stat())
+                self.subdirectories.append(subdir)
+                self._subdir_positions[entry.name] = index
+                continue
+            if not entry.name.lower().endswith(".mp3") or not entry.is_file():
+                continue
+            fstats = entry.stat()
+            song = self._cached_song(cache, filename, index, fstats)
+            if song is not None:
+                self._found[index] = song
+            elif fstats.st_size > self.maxFileSize:
+                print(f"Error inspecting file: {filename} - {filename} is too large")
+            else:
+                pending.append((self, index, filename, fstats))
+
+    def _enumerate_listing(self,
+                           pending: List[Tuple["Directory", int, Path, os.stat_result]],
+                           listing: DirectoryListing) -> None:
+        """
+        Add the songs and sub-directories of a directory that has not
+        changed since the previous search, using the contents recorded
+        in the LibraryIndex.
+        """
+        for name, index in sorted(listing.subdirectories.items(),
+                                  key=lambda item: item[1]):
+            filename = self.directory / name
+            try:
+                dir_stats = os.stat(str(filename))
+            except OSError:
+                continue
+            subdir = Directory(self, 1000 * (self.ref_id + index), filename,
+                               self.parser, self.progress, self.index)
+            subdir._enumerate(pending, dir_stats)
+            self.subdirectories.append(subdir)
+        for index, metadata in listing.songs.values():
+            self._found[index] = Song(self, self.ref_id + index + 1, metadata)
+
+    def _add_found_songs(self, complete: bool) -> None:
+        """
+        Add the songs found by parallel_search() to this directory and
+        its sub-directories, in the order they are in the directory.
+        If complete is True, the state of each directory is recorded in
+        the LibraryIndex (if one is being used).
+        """
+        for sub_dir in self.subdirectories:
+            sub_dir._add_found_songs(complete)
+        self.songs = [self._found[index] for index in sorted(self._found.keys())]
+        if self.index is not None and self._scan_state is not None and complete:
+            self.index.update_directory(
+                self.directory, *self._scan_state,
+                songs={song.filename: index for index, song in self._found.items()},
+                subdirectories=self._subdir_positions)
+        self._found = {}
+        self._scan_state = None
+        self._subdir_positions = {}
+        if self.songs and self.index is None:
+            self.save_cache()
+
+    def _load_cache(self) -> Dict[str, Dict]:
+        """load the contents of the cache file for this directory"""
+        cache: Dict[str, Dict] = {}
+        if self.index is not None:
+            # the cache file is only used to populate the index
+            self.index.import_json_cache(self.directory, self.cache_filename)
+            return cache
+        filename = self.directory / self.cache_filename
+        if filename.exists():
+            with filename.open('r', encoding='utf-8') as cfn:
+                data = cfn.read()
+            contents = json.loads(data)
+            sha = hashlib.sha256()
+            sha.update(data.encode('utf-8'))
+            self.cache_hash = sha.hexdigest()
+            for song in contents:
+                cache[song['filename']] = song
+            del data
+            del contents
+            del sha
+        else:
+            print(f'Missing {filename}')
+        return cache
+
     def _check_file(self, cache: Dict[str, dict],
                     filename: Path, index: int, start_pct: float,
                     depth: int) -> Optional[Song]:
@@ -94,45 +322,117 @@ class Directory(HasParent):
         fstats = os.stat(abs_fname)
         if stat.S_ISDIR(fstats.st_mode):
             subdir = Directory(self, 1000 * (self.ref_id + index), filename,
-                               self.parser, self.progress)
+                               self.parser, self.progress, self.index)
             subdir.search(depth + 1, start_pct)
             self.subdirectories.append(subdir)
             return None
         if not stat.S_ISREG(fstats.st_mode) or not abs_fname.lower().endswith(".mp3"):
             return None
-        try:
-            mdata = cache[filename.name]
-            mdata['filepath'] = filename
-            try:
-                mdata['song_id'] = mdata['songId']
-                del mdata['songId']
-            except KeyError:
-                pass
-            try:
-                del mdata['index']
-            except KeyError:
-                pass
-            #print('use cache', filename.name)
-            return Song(self, self.ref_id + index + 1, Metadata(**mdata))
-        except KeyError:
-            pass
+        song = self._cached_song(cache, filename, index, fstats)
+        if song is not None:
+            return song
         if fstats.st_size > self.maxFileSize:
             raise InvalidMP3Exception(f'{filename} is too large')
         print('parse', filename.name)
         metadata = self.parser.parse(filename)
+        if self.index is not None:
+            self.index.store(filename, fstats, metadata)
         return Song(self, self.ref_id + index + 1, metadata)
 
+    def _cached_song(self, cache: Dict[str, dict], filename: Path,
+                     index: int, fstats: os.stat_result) -> Optional[Song]:
+        """Create a Song using the cache, or None if not in the cache"""
+        if self.index is not None:
+            metadata = self.index.lookup(filename, fstats)
+            if metadata is None:
+                return None
+            return Song(self, self.ref_id + index + 1, metadata)
+        try:
+            mdata = cache[filename.name]
+        except KeyError:
+            return None
+        mdata['filepath'] = filename
+        try:
+            mdata['song_id'] = mdata['songId']
+            del mdata['songId']
+        except KeyError:
+            pass
+        try:
+            del mdata['index']
+        except KeyError:
+            pass
+        #print('use cache', filename.name)
+        return Song(self, self.ref_id + index + 1, Metadata(**mdata))
+
+    def _root(self) -> "Directory":
+        """get the top level Directory of this tree"""
+        root = self
+        while isinstance(root._parent, Directory):
+            root = root._parent
+        return root
+
+    def _ref_id_index(self) -> RefIdIndex:
+        """get the index of the whole tree, creating it if required"""
+        root = self._root()
+        if root._ref_ids is None:
+            root._ref_ids = RefIdIndex(root)
+        return root._ref_ids
+
+    def invalidate_index(self) -> None:
+        """
+        Discard the index of ref_id values.
+        Must be called after modifying the songs or sub-directories of
+        any Directory in the tree.
+        """
+        self._root()._ref_ids = None
+
+    def _contains(self, item: HasParent) -> bool:
+        """check if item is this directory or is below this directory"""
+        node: Optional[HasParent] = item
+        while node is not None:
+            if node is self:
+                return True
+            node = node._parent
+        return False
+
     def find(self, ref_id: int) -> Optional[Song]:
         """Find a Song by its ref_id"""
-        for song in self.songs:
-            if song.ref_id == ref_id:
-                return song
-        for sub_dir in self.subdirectories:
-            song2 = sub_dir.find(ref_id)
-            if song2 is not None:
-                return song2
+        song = self._ref_id_index().songs.get(ref_id)
+        if song is not None and self._contains(song):
+            return song
+        return None
+
+    def sort_key(self, column: str) -> str:
+        """get the key used when sorting directories by the given attribute"""
+        return Song.collation_key(str(getattr(self, column, '')))
+
+    def find_directory(self, path: Path) -> Optional["Directory"]:
+        """Find a Directory by its path"""
+        directory = self._ref_id_index().paths.get(path)
+        if directory is not None and self._contains(directory):
+            return directory
         return None
 
+    def add_song(self, song: Song) -> None:
+        """add a song to this directory"""
+        self.songs.append(song)
+        self.invalidate_index()
+
+    def remove_song(self, song: Song) -> None:
+        """remove a song from this directory"""
+        self.songs.remove(song)
+        self.invalidate_index()
+
+    def add_subdirectory(self, directory: "Directory") -> None:
+        """add a sub-directory to this directory"""
+        self.subdirectories.append(directory)
+        self.invalidate_index()
+
+    def remove_subdirectory(self, directory: "Directory") -> None:
+        """remove a sub-directory from this directory"""
+        self.subdirectories.remove(directory)
+        self.invalidate_index()
+
     def total_length(self) -> int:
         """Returns total number of songs.
         Returns total of songs in this directory plus any subdirectories
@@ -142,24 +442,24 @@ class Directory(HasParent):
             total += len(sub_dir)
         return total
 
-    def get_songs(self, ref_id: int) -> List[Song]:
+    def get_songs(self, ref_id: int) -> Sequence[Song]:
         """
         Get all matching songs.
         Returns a list of all songs that match ref_id or all songs
-        in a directory if its ref_id matches
+        in a directory if its ref_id matches.
+        The songs of a directory are returned as a view of the index,
+        without copying them.
         """
-        song_list: List[Song] = []
+        index = self._ref_id_index()
         if ref_id == self.ref_id:
-            for sub_dir in self.subdirectories:
-                song_list += sub_dir.get_songs(sub_dir.ref_id)
-            song_list += self.songs
-        else:
-            for sub_dir in self.subdirectories:
-                song_list += sub_dir.get_songs(ref_id)
-            for song in self.songs:
-                if ref_id == song.ref_id:
-                    song_list.append(song)
-        return song_list
+            return index.songs_in(self)
+        directory = index.directories.get(ref_id)
+        if directory is not None and self._contains(directory):
+            return index.songs_in(directory)
+        song = index.songs.get(ref_id)
+        if song is not None and self._contains(song):
+            return [song]
+        return []
 
     def sort(self, key, reverse=False):
         """Sort directories and songs within each directory"""
@@ -167,21 +467,25 @@ class Directory(HasParent):
         for sub_dir in self.subdirectories:
             sub_dir.sort(key=key, reverse=reverse)
         self.songs.sort(key=key, reverse=reverse)
+        self.invalidate_index()
 
     def save_cache(self):
         """Write contents of this directory to a cache file"""
+        if self.index is not None:
+            self.index.commit()
+            return
         songs = [song.marshall(exclude=['filepath', 'ref_id', 'song_id']) for song in self.songs]
         js_str = json.dumps(songs, ensure_ascii=True)
         sha = hashlib.sha256()
         sha.update(js_str.encode('utf-8'))
         if self.cache_hash != sha.hexdigest():
             cfn = os.path.join(self.directory, self.cache_filename)
-            with open(cfn, 'w') as cache_file:
+            with open(cfn, 'w', encoding='utf-8') as cache_file:
                 cache_file.write(js_str)
 
     def create_index(self, filename: str) -> None:
         """Create a CSV file that contains a list of all songs"""
-        with open(filename, "wb") as index_file:
+        with open(filename, "w", encoding='utf-8', newline='') as index_file:
             writer = csv.writer(index_file)
             self._add_to_index(writer)
 
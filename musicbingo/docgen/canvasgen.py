@@ -0,0 +1,634 @@
+"""
+A DocumentGenerator that draws documents directly onto a reportlab
+canvas.
+
+Pages of Bingo tickets only contain elements that have a fixed size, so
+the position of every element can be calculated without using the
+platypus layout engine. Drawing these elements straight onto the canvas
+is much faster than creating, wrapping and splitting a platypus flowable
+for every element.
+Documents that contain elements that need to be laid out by platypus
+(such as tables without fixed column widths and row heights) are
+rendered by PDFGenerator.
+"""
+
+import copy
+from functools import partial
+import html
+import itertools
+import os
+import re
+from typing import (
+    Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple, cast
+)
+
+from reportlab import rl_config # type: ignore
+from reportlab.lib.rl_accel import fp_str # type: ignore # pylint: disable=no-name-in-module
+from reportlab.pdfbase import pdfmetrics # type: ignore
+from reportlab.pdfgen import canvas # type: ignore
+
+from musicbingo.docgen.colour import Colour
+from musicbingo.docgen import documentgenerator as DG
+from musicbingo.docgen.layoutcache import LayoutCache
+from musicbingo.docgen.pdfgen import PDFGenerator
+from musicbingo.docgen.styles import HorizontalAlignment, Padding, TableStyle
+from musicbingo.docgen.styles import VerticalAlignment
+from musicbingo.progress import Progress
+
+class TextLine(NamedTuple):
+    """one line of text in a paragraph, positioned relative to the paragraph"""
+    text: str
+    font: str
+    font_size: float
+    x_offset: float
+    baseline: float
+
+class TextBlock(NamedTuple):
+    """the lines of a paragraph, after being fitted to a width"""
+    lines: List[TextLine]
+    height: float
+    colour: Optional[Colour]
+
+class CellBox(NamedTuple):
+    """the style of one table cell"""
+    background: Optional[Colour]
+    padding: Padding
+
+class CanvasPDFGenerator(PDFGenerator):
+    """
+    Converts a Document into a PDF file by drawing each element at a
+    precomputed position on a reportlab canvas.
+    """
+
+    FONT = 'Helvetica'
+    BOLD_FONT = 'Helvetica-Bold'
+    # padding that platypus adds to each side of a page's frame
+    FRAME_PADDING: float = 6
+    # padding of a table cell that does not have a padding style
+    CELL_PADDING = Padding(top="3pt", right="6pt", bottom="3pt", left="6pt")
+    # smallest font size used when shrinking text to fit into a cell
+    MIN_FONT_SIZE: float = 6
+    BOLD_RE = re.compile(r'^<b>(.*)</b>$', re.DOTALL)
+    TAG_RE = re.compile(r'<[^>]+>')
+
+    def __init__(self, shrink_to_fit: bool = False):
+        """
+        shrink_to_fit - if True, the font size of text that is too tall
+                        for its table cell is reduced until it fits.
+                        PDFGenerator never changes the font size, so
+                        this option is off by default, so that both
+                        generators produce the same layout.
+        """
+        super(CanvasPDFGenerator, self).__init__()
+        self.shrink_to_fit = shrink_to_fit
+        # PDF operators for the tables and table cells that have been
+        # drawn in the current document
+        self._code_cache = LayoutCache(self.LAYOUT_CACHE_SIZE)
+
+    #pylint: disable=too-many-locals
+    def render(self, filename: str, document: DG.Document,
+               progress: Progress) -> None:
+        """
+        Renders the given document as a PDF file.
+        If the document contains elements that cannot be drawn directly,
+        the document is rendered by PDFGenerator. The elements of a
+        StreamingDocument are not known until they are drawn, so the
+        first page is used to decide how to render it. If a later page
+        contains an element that cannot be drawn, a ValueError is raised
+        and the PDF file is not created.
+        """
+        pages = document.pages()
+        first_page = next(pages, [])
+        streaming = isinstance(document, DG.StreamingDocument)
+        if streaming:
+            drawable = all(self.can_draw(elt) for elt in first_page)
+        else:
+            drawable = all(self.can_draw(elt) for elt in document._elements)
+        if not drawable:
+            super(CanvasPDFGenerator, self).render(
+                filename, self.restore_first_page(document, first_page, pages),
+                progress)
+            return
+        # the PDF is drawn into a temporary file, so that a partial PDF
+        # is not left behind if drawing fails
+        partial_name = f'{filename}.tmp'
+        try:
+            self.draw_pages(partial_name, document,
+                            itertools.chain([first_page], pages), progress)
+        except BaseException:
+            if os.path.exists(partial_name):
+                os.remove(partial_name)
+            raise
+        os.replace(partial_name, filename)
+        progress.pct = 100.0
+
+    def draw_pages(self, filename: str, document: DG.Document,
+                   pages: Iterator[List[DG.Element]], progress: Progress) -> None:
+        """
+        Draw the given pages of a document into a PDF file
+        """
+        streaming = isinstance(document, DG.StreamingDocument)
+        page_width = document.pagesize.width().points()
+        page_height = document.pagesize.height().points()
+        canv = canvas.Canvas(filename, pagesize=(page_width, page_height))
+        self._code_cache.clear()
+        if document.title:
+            canv.setTitle(document.title)
+        left = document.left_margin.points() + self.FRAME_PADDING
+        width = (page_width - document.right_margin.points() -
+                 self.FRAME_PADDING - left)
+        top = page_height - document.top_margin.points() - self.FRAME_PADDING
+        bottom = document.bottom_margin.points() + self.FRAME_PADDING
+        cursor = top
+        num_pages = document.num_pages
+        for number, page in enumerate(pages, start=1):
+            self.report_page(progress, number, num_pages)
+            for elt in page:
+                if isinstance(elt, DG.PageBreak):
+                    if cursor < top:
+                        canv.showPage()
+                        cursor = top
+                    continue
+                if streaming and not self.can_draw(elt):
+                    raise ValueError(f'Unable to draw {elt}')
+                height = self.element_height(elt)
+                if cursor - height < bottom and cursor < top:
+                    canv.showPage()
+                    cursor = top
+                cursor -= height
+                self.draw_element(canv, elt, left, cursor, width, height)
+        if cursor < top or canv.getPageNumber() == 1:
+            canv.showPage()
+        canv.save()
+
+    @staticmethod
+    def restore_first_page(document: DG.Document, first_page: List[DG.Element],
+                           pages: Iterator[List[DG.Element]]) -> DG.Document:
+        """
+        Get a document that can be rendered again, after its first page
+        has been taken from document.pages()
+        """
+        if not isinstance(document, DG.StreamingDocument):
+            return document
+        result = copy.copy(document)
+        #pylint: disable=protected-access
+        result._source = itertools.chain(first_page,
+                                         itertools.chain.from_iterable(pages))
+        return result
+
+    def can_draw(self, elt: DG.Element) -> bool:
+        """can the given element be drawn without using platypus?"""
+        if isinstance(elt, (DG.Box, DG.HorizontalLine, DG.Image,
+                            DG.PageBreak, DG.Spacer)):
+            return True
+        if not isinstance(elt, DG.Table):
+            return False
+        if (elt.heading is not None or elt.footer is not None or
+                elt.col_widths is None or elt.row_heights is None):
+            return False
+        if len(elt.row_heights) != len(elt.data):
+            return False
+        for row in elt.data:
+            if len(row) > len(elt.col_widths):
+                return False
+            for cell in row:
+                if isinstance(cell, DG.Paragraph):
+                    continue
+                if not all(isinstance(item, DG.Paragraph) for item in cell):
+                    return False
+        return True
+
+    def element_height(self, elt: DG.Element) -> float:
+        """the amount of vertical space used by an element"""
+        if isinstance(elt, DG.Table):
+            return sum(height.points() for height in cast(List, elt.row_heights))
+        if isinstance(elt, DG.HorizontalLine):
+            before, after = self.line_spacing(elt)
+            return before + elt.thickness.points() + after
+        return cast(DG.Spacer, elt).height.points()
+
+    @staticmethod
+    def line_spacing(line: DG.HorizontalLine) -> Tuple[float, float]:
+        """space before and after a HorizontalLine"""
+        assert line.style is not None
+        if line.style.padding:
+            return (line.style.padding.top.points(),
+                    line.style.padding.bottom.points())
+        return (1, 1)
+
+    #pylint: disable=too-many-arguments
+    def draw_element(self, canv: canvas.Canvas, elt: DG.Element, left: float,
+                     bottom: float, width: float, height: float) -> None:
+        """
+        Draw one element, horizontally centred in the space from "left"
+        to "left + width"
+        """
+        if isinstance(elt, DG.Image):
+            img_width = elt.width.points()
+            canv.drawImage(str(elt.filename), left + (width - img_width) / 2.0,
+                           bottom, width=img_width, height=height, mask='auto')
+        elif isinstance(elt, DG.HorizontalLine):
+            self.draw_horiz_line(canv, elt, left, bottom, width)
+        elif isinstance(elt, DG.Box):
+            box_width = elt.width.points()
+            assert elt.style is not None
+            canv.saveState()
+            canv.setLineWidth(1)
+            canv.setStrokeColor(self.translate_colour(elt.style.colour))
+            x_pos = left + (width - box_width) / 2.0
+            canv.line(x_pos, bottom, x_pos + box_width, bottom)
+            canv.restoreState()
+        elif isinstance(elt, DG.Table):
+            self.draw_table(canv, elt, left, bottom + height, width)
+
+    def draw_horiz_line(self, canv: canvas.Canvas, line: DG.HorizontalLine,
+                        left: float, bottom: float, width: float) -> None:
+        """Draw a HorizontalLine"""
+        _, after = self.line_spacing(line)
+        line_width = line.width.points_or_relative()
+        if isinstance(line_width, str):
+            line_width = width * float(line_width[:-1]) * 0.01
+        line_width = min(line_width, width)
+        thickness = line.thickness.points()
+        assert line.style is not None
+        canv.saveState()
+        canv.setLineWidth(thickness)
+        canv.setLineCap(1)
+        canv.setStrokeColor(self.translate_colour(line.style.colour))
+        if line.dash is not None:
+            canv.setDash([dash.points() for dash in line.dash])
+        x_pos = left + (width - line_width) / 2.0
+        y_pos = bottom + after + thickness / 2.0
+        canv.line(x_pos, y_pos, x_pos + line_width, y_pos)
+        canv.restoreState()
+
+    #pylint: disable=too-many-locals
+    def draw_table(self, canv: canvas.Canvas, table: DG.Table, left: float,
+                   top: float, width: float) -> None:
+        """
+        Draw a Table, whose top edge is at "top".
+        The cell backgrounds and grid lines, and the contents of each
+        cell, are only converted into PDF drawing operators the first
+        time that they are used in this document. Every table that
+        looks the same re-uses these operators.
+        """
+        col_widths = tuple(w.points() for w in cast(List, table.col_widths))
+        row_heights = tuple(h.points() for h in cast(List, table.row_heights))
+        style = cast(TableStyle, table.style)
+        x_pos: List[float] = [left + (width - sum(col_widths)) / 2.0]
+        for col_width in col_widths:
+            x_pos.append(x_pos[-1] + col_width)
+        y_pos: List[float] = [top]
+        for row_height in row_heights:
+            y_pos.append(y_pos[-1] - row_height)
+        cells = self.cell_boxes(table, len(row_heights), len(col_widths))
+        key: Tuple = ('table', col_widths, row_heights,
+                      tuple(tuple(box.background for box in row) for row in cells))
+        if style is not None:
+            key += (style.grid_colour, style.grid_width, style.border_colour,
+                    style.border_width)
+        self.draw_static(canv, key, lambda: self.draw_table_chrome(
+            canv, style, cells, col_widths, row_heights), x_pos[0], y_pos[-1])
+        valign = VerticalAlignment.BOTTOM
+        if style is not None:
+            valign = style.vertical_align
+        for row, data_row in enumerate(table.data):
+            for col, cell in enumerate(data_row):
+                items: Sequence[DG.Paragraph]
+                if isinstance(cell, DG.Paragraph):
+                    items = [cell]
+                else:
+                    items = cast(Sequence[DG.Paragraph], cell)
+                if not items:
+                    continue
+                padding = cells[row][col].padding
+                key = ('cell',
+                       tuple((para.text, self.style_key(para.style)) for para in items),
+                       col_widths[col], row_heights[row],
+                       tuple(pad.points() for pad in padding), valign)
+                self.draw_reused(canv, key, partial(
+                    self.draw_cell, canv, items, padding, valign,
+                    col_widths[col], row_heights[row]), x_pos[col], y_pos[row + 1])
+
+    def draw_table_chrome(self, canv: canvas.Canvas, style: Optional[TableStyle],
+                          cells: List[List[CellBox]], col_widths: Sequence[float],
+                          row_heights: Sequence[float]) -> None:
+        """
+        Draw the cell backgrounds, grid and border of a table, with
+        the bottom left corner of the table at (0, 0)
+        """
+        x_pos: List[float] = [0]
+        for col_width in col_widths:
+            x_pos.append(x_pos[-1] + col_width)
+        y_pos: List[float] = [sum(row_heights)]
+        for row_height in row_heights:
+            y_pos.append(y_pos[-1] - row_height)
+        for row, boxes in enumerate(cells):
+            for col, box in enumerate(boxes):
+                if box.background is None:
+                    continue
+                canv.setFillColor(self.translate_colour(box.background))
+                canv.rect(x_pos[col], y_pos[row + 1], col_widths[col],
+                          row_heights[row], stroke=0, fill=1)
+        if style is not None and style.grid_colour is not None:
+            canv.setLineWidth(style.grid_width)
+            canv.setStrokeColor(self.translate_colour(style.grid_colour))
+            lines = [(x, y_pos[0], x, y_pos[-1]) for x in x_pos]
+            lines += [(x_pos[0], y, x_pos[-1], y) for y in y_pos]
+            canv.lines(lines)
+        if style is not None and style.border_colour is not None:
+            canv.setLineWidth(style.border_width)
+            canv.setStrokeColor(self.translate_colour(style.border_colour))
+            canv.rect(x_pos[0], y_pos[-1], x_pos[-1] - x_pos[0],
+                      y_pos[0] - y_pos[-1], stroke=1, fill=0)
+
+    def draw_reused(self, canv: canvas.Canvas, key: Tuple,
+                    draw: Callable[[], None], x_pos: float, y_pos: float) -> None:
+        """
+        Draw something that is often repeated in a document, such as
+        the contents of a table cell, with (0, 0) moved to (x_pos, y_pos).
+        "key" must uniquely identify what draw() produces.
+        """
+        code = self._code_cache.get(key)
+        if code is None:
+            code = self.capture(canv, draw)
+            self._code_cache.put(key, code)
+        self.place(canv, code, x_pos, y_pos)
+
+    def draw_static(self, canv: canvas.Canvas, key: Tuple,
+                    draw: Callable[[], None], x_pos: float, y_pos: float) -> None:
+        """
+        Draw something that is the same in every ticket, such as the
+        grid of a table, with (0, 0) moved to (x_pos, y_pos).
+        "key" must uniquely identify what draw() produces.
+        """
+        self.draw_reused(canv, key, draw, x_pos, y_pos)
+
+    @staticmethod
+    def capture(canv: canvas.Canvas, draw: Callable[[], None]) -> str:
+        """
+        Get the PDF operators produced by draw(), without adding them
+        to the current page
+        """
+        #pylint: disable=protected-access
+        start = len(canv._code)
+        draw()
+        code = '\n'.join(canv._code[start:])
+        del canv._code[start:]
+        return code
+
+    @staticmethod
+    def place(canv: canvas.Canvas, code: str, x_pos: float, y_pos: float) -> None:
+        """
+        Add PDF operators produced by capture() to the current page,
+        with (0, 0) moved to (x_pos, y_pos)
+        """
+        canv.addLiteral(f'q 1 0 0 1 {fp_str(x_pos)} {fp_str(y_pos)} cm\n{code}\nQ')
+
+    def cell_boxes(self, table: DG.Table, rows: int,
+                   cols: int) -> List[List[CellBox]]:
+        """
+        find the background and padding of every cell in a table.
+        As with platypus, a negative row or column counts back from the
+        end of the table.
+        """
+        background: Optional[Colour] = None
+        padding = self.CELL_PADDING
+        if table.style is not None:
+            background = table.style.background
+            if table.style.padding is not None:
+                padding = table.style.padding
+        cells = [[CellBox(background, padding) for _ in range(cols)]
+                 for _ in range(rows)]
+        def position(pos: int, size: int) -> int:
+            return pos + size if pos < 0 else pos
+
+        for start, end, cstyle in table._cell_styles:
+            for row in range(max(0, position(start.row, rows)),
+                             min(position(end.row, rows) + 1, rows)):
+                for col in range(max(0, position(start.col, cols)),
+                                 min(position(end.col, cols) + 1, cols)):
+                    box = cells[row][col]
+                    if cstyle.background is not None:
+                        box = box._replace(background=cstyle.background)
+                    if cstyle.padding is not None:
+                        box = box._replace(padding=cstyle.padding)
+                    cells[row][col] = box
+        return cells
+
+    def draw_cell(self, canv: canvas.Canvas, items: Sequence[DG.Paragraph],
+                  padding: Padding, valign: VerticalAlignment, width: float,
+                  height: float) -> None:
+        """
+        Draw the paragraphs of one table cell, with the bottom left
+        corner of the cell at (0, 0).
+        If the text is too tall for the cell, it extends outside of the
+        cell, as it does with platypus, unless self.shrink_to_fit is
+        set, in which case the font size of every paragraph in the cell
+        is reduced until it fits.
+        """
+        inner_width = width - padding.left.points() - padding.right.points()
+        inner_height = height - padding.top.points() - padding.bottom.points()
+        scale = 1.0
+        while True:
+            blocks = [self.fit_paragraph(para, inner_width, scale) for para in items]
+            spacing = [self.para_spacing(para) for para in items]
+            total = sum(block.height for block in blocks)
+            total += sum(before for before, _ in spacing[1:])
+            total += sum(after for _, after in spacing[:-1])
+            smallest = min(cast(DG.ElementStyle, para.style).font_size for para in items)
+            if (not self.shrink_to_fit or total <= inner_height or
+                    smallest * scale <= self.MIN_FONT_SIZE):
+                break
+            scale = max(scale - 0.5 / smallest, self.MIN_FONT_SIZE / smallest)
+        if valign == VerticalAlignment.TOP:
+            y_top = height - padding.top.points()
+        elif valign == VerticalAlignment.BOTTOM:
+            y_top = padding.bottom.points() + total
+        else:
+            y_top = (height + padding.bottom.points() -
+                     padding.top.points() + total) / 2.0
+        x_left = padding.left.points()
+        for index, (block, (before, after)) in enumerate(zip(blocks, spacing)):
+            if index > 0:
+                y_top -= before
+            canv.setFillColor(self.translate_colour(block.colour or Colour('black')))
+            for line in block.lines:
+                canv.setFont(line.font, line.font_size)
+                canv.drawString(x_left + line.x_offset, y_top - line.baseline,
+                                line.text)
+            y_top -= block.height + after
+
+    @staticmethod
+    def para_spacing(para: DG.Paragraph) -> Tuple[float, float]:
+        """space before and after a paragraph"""
+        assert para.style is not None
+        if para.style.padding is None:
+            return (0, 0)
+        return (para.style.padding.top.points(),
+                para.style.padding.bottom.points())
+
+    def fit_paragraph(self, para: DG.Paragraph, width: float,
+                      scale: float = 1.0) -> TextBlock:
+        """
+        Split the text of a paragraph into lines that fit within the
+        given width, with the font size multiplied by "scale".
+        The result is kept in the layout cache, as the same paragraph
+        is often used in many tickets.
+        """
+        key = ('fit', para.text, self.style_key(para.style), width, scale)
+        block = self.layout_cache.get(key)
+        if block is None:
+            block = self._fit_paragraph(para, width, scale)
+            self.layout_cache.put(key, block)
+        return block
+
+    def _fit_paragraph(self, para: DG.Paragraph, width: float,
+                       scale: float) -> TextBlock:
+        """
+        Split the text of a paragraph into lines that fit within the
+        given width.
+        Only paragraphs that are entirely bold are supported, any other
+        markup is removed.
+        """
+        style = para.style
+        assert style is not None
+        font = self.FONT
+        text = para.text
+        match = self.BOLD_RE.match(text)
+        if match is not None:
+            font = self.BOLD_FONT
+            text = match.group(1)
+        text = html.unescape(self.TAG_RE.sub('', text))
+        font_size = style.font_size * scale
+        leading = style.leading * scale
+        indent_left: float = 0
+        indent_right: float = 0
+        if style.padding is not None:
+            indent_left = style.padding.left.points()
+            indent_right = style.padding.right.points()
+        avail = width - indent_left - indent_right
+        lines: List[TextLine] = []
+        for index, text_line in enumerate(self.split_lines(text, font, font_size, avail)):
+            line_width = self.string_width(text_line, font, font_size)
+            if style.alignment == HorizontalAlignment.CENTER:
+                x_offset = indent_left + (avail - line_width) / 2.0
+            elif style.alignment == HorizontalAlignment.RIGHT:
+                x_offset = indent_left + avail - line_width
+            else:
+                x_offset = indent_left
+            lines.append(TextLine(text_line, font, font_size, x_offset,
+                                  font_size + index * leading))
+        return TextBlock(lines, leading * len(lines), style.colour)
+
+    @classmethod
+    def split_lines(cls, text: str, font: str, font_size: float,
+                    width: float) -> List[str]:
+        """
+        Split text into lines that fit within the given width, in the
+        same way as a platypus Paragraph. Newer versions of reportlab
+        allow the spaces in a line to shrink by rl_config.spaceShrinkage
+        (a proportion of the width of a space).
+        A word that is wider than the width is put on a line of its own.
+        """
+        shrinkage = getattr(rl_config, 'spaceShrinkage', 0.0)
+        space = cls.string_width(' ', font, font_size)
+        lines: List[str] = []
+        words: List[str] = []
+        line_width = -space
+        for word in text.split():
+            new_width = line_width + space + cls.string_width(word, font, font_size)
+            if words and new_width > width + shrinkage * space * len(words):
+                lines.append(' '.join(words))
+                words = []
+                new_width -= line_width + space
+            words.append(word)
+            line_width = new_width
+        if words:
+            lines.append(' '.join(words))
+        return lines
+
+    @staticmethod
+    def string_width(text: str, font: str, font_size: float) -> float:
+        """width (in points) of a string of text"""
+        return pdfmetrics.stringWidth(text, font, font_size)
+
+
+class FormPDFGenerator(CanvasPDFGenerator):
+    """
+    Converts a Document into a PDF file, where the parts of a page
+    that are repeated many times are only stored once in the file.
+    Images, horizontal lines and the backgrounds and grid of each table
+    are drawn once as a PDF form XObject. Every use of them just refers
+    to that form, so only the text of each ticket is added to each page.
+    This makes PDF files of tickets smaller, and quicker for a printer
+    to process.
+    The text of table cells is not put into forms, because every form
+    that a page uses adds an entry to the resources of that page, which
+    is larger than the text itself.
+    """
+
+    # prefix of the name of each form XObject
+    FORM_PREFIX = 'MBFrame'
+
+    def __init__(self, shrink_to_fit: bool = False):
+        super(FormPDFGenerator, self).__init__(shrink_to_fit)
+        # name of the form used for each static item in the current document
+        self._forms: Dict[Tuple, str] = {}
+
+    def render(self, filename: str, document: DG.Document,
+               progress: Progress) -> None:
+        """
+        Renders the given document as a PDF file.
+        """
+        self._forms.clear()
+        super(FormPDFGenerator, self).render(filename, document, progress)
+
+    #pylint: disable=too-many-arguments
+    def draw_element(self, canv: canvas.Canvas, elt: DG.Element, left: float,
+                     bottom: float, width: float, height: float) -> None:
+        """
+        Draw one element, horizontally centred in the space from "left"
+        to "left + width"
+        """
+        key: Optional[Tuple] = None
+        if isinstance(elt, DG.Image):
+            key = ('image', str(elt.filename), elt.width.points())
+        elif isinstance(elt, DG.HorizontalLine):
+            assert elt.style is not None
+            dash: Optional[Tuple] = None
+            if elt.dash is not None:
+                dash = tuple(length.points() for length in elt.dash)
+            key = ('hline', elt.width.points_or_relative(), elt.thickness.points(),
+                   elt.style.colour, dash, self.line_spacing(elt))
+        if key is None:
+            super(FormPDFGenerator, self).draw_element(
+                canv, elt, left, bottom, width, height)
+            return
+        self.draw_static(canv, key + (width, height), partial(
+            super(FormPDFGenerator, self).draw_element, canv, elt, 0, 0,
+            width, height), left, bottom)
+
+    def draw_static(self, canv: canvas.Canvas, key: Tuple,
+                    draw: Callable[[], None], x_pos: float, y_pos: float) -> None:
+        """
+        Draw something that is the same in every ticket, by using a
+        form XObject that is only drawn the first time that it is used
+        in this document.
+        """
+        name = self._forms.get(key)
+        if name is None:
+            name = f'{self.FORM_PREFIX}{len(self._forms)}'
+            # the form is drawn relative to (0, 0), which might be
+            # anywhere on the page, so its bounding box must be large
+            # enough to not clip any part of the drawing
+            page_width, page_height = canv._pagesize #pylint: disable=protected-access
+            canv.beginForm(name, lowerx=-page_width, lowery=-page_height,
+                           upperx=page_width, uppery=page_height)
+            draw()
+            canv.endForm()
+            self._forms[key] = name
+        canv.saveState()
+        canv.translate(x_pos, y_pos)
+        canv.doForm(name)
+        canv.restoreState()
@@ -11,7 +11,9 @@ Each Document is made up of one or more elements. An element can be:
 
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import Any, Collection, Dict, Iterable, List, NamedTuple, Optional, Union, cast
+from typing import (
+    Any, Collection, Dict, Iterable, Iterator, List, NamedTuple, Optional, Union, cast
+)
 
 from musicbingo.docgen.colour import Colour
 from musicbingo.docgen.sizes import PageSizes, INCH, Dimension, RelaxedDimension
@@ -249,6 +251,88 @@ class Document:
             retval[key] = value
         return retval
 
+    @property
+    def num_pages(self) -> Optional[int]:
+        """
+        the number of pages returned by pages(), or None if not known
+        """
+        return 1 + sum(1 for elt in self._elements[:-1] if isinstance(elt, PageBreak))
+
+    def pages(self) -> Iterator[List[Element]]:
+        """
+        Split the elements of this document into pages.
+        Each page is a list of elements that ends with a PageBreak,
+        apart from the last page. A DocumentGenerator will start a new
+        page if a page does not fit on one page.
+        """
+        return self.split_pages(self._elements)
+
+    @staticmethod
+    def split_pages(elements: Iterable[Element]) -> Iterator[List[Element]]:
+        """split a sequence of elements at each PageBreak"""
+        page: List[Element] = []
+        for elt in elements:
+            page.append(elt)
+            if isinstance(elt, PageBreak):
+                yield page
+                page = []
+        if page:
+            yield page
+
+class StreamingDocument(Document):
+    """
+    Represents a document whose elements are created while it is being
+    rendered, rather than being stored in the document.
+    This allows a very large document to be rendered one page at a
+    time, without keeping all of its elements in memory. As the
+    elements are only created once, a StreamingDocument can only be
+    rendered once (unless as_dict() has been used).
+    """
+    def __init__(self, pagesize: PageSizes, elements: Iterable[Element],
+                 num_pages: Optional[int] = None, **kwargs):
+        """
+        elements - the elements of the document, such as a generator
+        num_pages - how many pages the elements will produce (optional)
+        **kwargs - the margins and title of the document
+        """
+        super(StreamingDocument, self).__init__(pagesize, **kwargs)
+        self._source = iter(elements)
+        self._num_pages = num_pages
+
+    def append(self, element: Element):
+        """the elements of a StreamingDocument cannot be changed"""
+        raise ValueError("Can't append to a StreamingDocument")
+
+    @property
+    def num_pages(self) -> Optional[int]:
+        """
+        the number of pages returned by pages(), or None if not known
+        """
+        return self._num_pages
+
+    def pages(self) -> Iterator[List[Element]]:
+        """
+        Split the elements of this document into pages, creating the
+        elements of each page when that page is requested.
+        """
+        for page in self.split_pages(self._source):
+            for elt in page:
+                if not isinstance(elt, Element):
+                    raise ValueError(f"Invalid element: {elt}")
+            yield page
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        convert document into a dictionary.
+        This creates every element of the document, which are kept so
+        that the document can still be rendered afterwards.
+        """
+        elements = [elt for page in self.pages() for elt in page]
+        self._source = iter(elements)
+        retval = super(StreamingDocument, self).as_dict()
+        retval['elements'] = [elt.as_dict() for elt in elements]
+        return retval
+
 class DocumentGenerator(ABC):
     """
     Interface for translating a Document into a document file.
@@ -258,3 +342,13 @@ class DocumentGenerator(ABC):
                progress: Progress) -> None:
         """Render the given document"""
         raise NotImplementedError()
+
+    @staticmethod
+    def report_page(progress: Progress, page: int,
+                    num_pages: Optional[int]) -> None:
+        """report that rendering of page number "page" has started"""
+        if num_pages:
+            progress.text = f'Page {page}/{num_pages}'
+            progress.pct = 100.0 * float(page - 1) / float(num_pages)
+        else:
+            progress.text = f'Page {page}'
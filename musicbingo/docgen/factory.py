@@ -11,6 +11,9 @@ GENERATORS: Dict[str, Type[DocumentGenerator]] = {}
 try:
     from musicbingo.docgen.pdfgen import PDFGenerator
     GENERATORS['pdf'] = PDFGenerator
+    from musicbingo.docgen.canvasgen import CanvasPDFGenerator, FormPDFGenerator
+    GENERATORS['pdf-canvas'] = CanvasPDFGenerator
+    GENERATORS['pdf-forms'] = FormPDFGenerator
 except ImportError as err:
     print(err)
 
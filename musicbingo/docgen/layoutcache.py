@@ -0,0 +1,12 @@
+"""
+Bounded cache used to re-use the results of laying out text, such as
+translated styles and the line breaks of a paragraph.
+"""
+
+from musicbingo.lrucache import LRUCache
+
+class LayoutCache(LRUCache):
+    """
+    Least recently used cache of layout results.
+    The size of the cache is limited by the number of items it contains.
+    """
@@ -4,13 +4,17 @@ A DocumentGenerator that will produce PDF files.
 It uses the reportlab library to produce the PDF documents.
 """
 
-from typing import Callable, Dict, Iterable, List, Optional, Tuple, Type, Union, cast
+from typing import (
+    Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple, Type,
+    Union, cast
+)
 
 from reportlab import platypus, lib # type: ignore
 
 from musicbingo.progress import Progress
 from musicbingo.docgen.colour import Colour
 from musicbingo.docgen import documentgenerator as DG
+from musicbingo.docgen.layoutcache import LayoutCache
 from musicbingo.docgen.styles import HorizontalAlignment, Padding, TableStyle
 from musicbingo.docgen.sizes import Dimension
 
@@ -21,6 +25,55 @@ Flowable = Union[platypus.Image, platypus.Paragraph, platypus.Spacer,
 # function prototype for each render_something() function
 RENDER_FUNC = Callable[[Union[DG.Element, Iterable]], Flowable]
 
+class CachedParagraph(platypus.Paragraph):
+    """
+    A platypus Paragraph that re-uses the parsed text and the line
+    breaks of previous paragraphs with the same text and style.
+    """
+    def __init__(self, text: str, style: lib.styles.ParagraphStyle,
+                 cache: LayoutCache, key: Hashable) -> None:
+        self._cache = cache
+        self._key = key
+        frags = cache.get(('frags', key))
+        super(CachedParagraph, self).__init__(text, style, frags=frags)
+        if frags is None:
+            cache.put(('frags', key), self.frags)
+
+    def wrap(self, availWidth, availHeight):
+        """calculate the line breaks, if not already known for this width"""
+        key = ('wrap', self._key, availWidth)
+        layout = self._cache.get(key)
+        if layout is None:
+            result = super(CachedParagraph, self).wrap(availWidth, availHeight)
+            if self.blPara is not None:
+                self._cache.put(key, (self.blPara, self._wrapWidths, self.height))
+            return result
+        if availWidth < platypus.paragraph._FUZZ: #pylint: disable=protected-access
+            return 0, 0x7fffffff
+        self.width = availWidth
+        #pylint: disable=attribute-defined-outside-init
+        self.blPara, self._wrapWidths, self.height = layout
+        return self.width, self.height
+
+class FlowableStream(list):
+    """
+    The list of flowables given to platypus when building a document.
+    Platypus removes each flowable from the front of the list when it
+    is placed on a page. The list only contains one page of flowables
+    at a time, the next page is added when the list becomes empty.
+    """
+    def __init__(self, pages: Iterator[List[Flowable]]) -> None:
+        super(FlowableStream, self).__init__()
+        self._pages = pages
+
+    def __len__(self) -> int:
+        while not super(FlowableStream, self).__len__():
+            try:
+                self.extend(next(self._pages))
+            except StopIteration:
+                return 0
+        return super(FlowableStream, self).__len__()
+
 class PDFGenerator(DG.DocumentGenerator):
     """
     Converts a Document into a PDF file.
@@ -33,7 +86,13 @@ class PDFGenerator(DG.DocumentGenerator):
         HorizontalAlignment.JUSTIFY: lib.enums.TA_JUSTIFY,
     }
 
+    # maximum number of translated styles and paragraph layouts to keep
+    LAYOUT_CACHE_SIZE: int = 4096
+
     def __init__(self):
+        # translated styles and paragraph layouts, which are kept between
+        # documents
+        self.layout_cache = LayoutCache(self.LAYOUT_CACHE_SIZE)
         self.renderers: Dict[Type, RENDER_FUNC] = {
             DG.Box: self.render_box,
             DG.HorizontalLine: self.render_horiz_line,
@@ -51,14 +110,17 @@ class PDFGenerator(DG.DocumentGenerator):
         # pagesize is a tuple of (width, height)
         # see reportlab.lib.pagesizes for detains
         doc = self.render_document(filename, document)
-        elements: List[Flowable] = []
-        num_elts = float(len(document._elements))
-        for index, elt in enumerate(document._elements):
-            progress.pct = 100.0 * float(index) / num_elts
-            elements.append(self.renderers[type(elt)](elt))
-        doc.build(elements)
+        doc.build(FlowableStream(self.render_pages(document, progress)))
         progress.pct = 100.0
 
+    def render_pages(self, document: DG.Document,
+                     progress: Progress) -> Iterator[List[Flowable]]:
+        """Convert each page of a Document into Platypus objects"""
+        num_pages = document.num_pages
+        for number, page in enumerate(document.pages(), start=1):
+            self.report_page(progress, number, num_pages)
+            yield [self.renderers[type(elt)](elt) for elt in page]
+
     @staticmethod
     def render_document(filename: str,
                         document: DG.Document) -> platypus.BaseDocTemplate:
@@ -98,7 +160,8 @@ class PDFGenerator(DG.DocumentGenerator):
         assert isinstance(para, DG.Paragraph)
         assert para.style is not None
         pstyle = self.translate_element_style(para.style)
-        return platypus.Paragraph(para.text, pstyle)
+        return CachedParagraph(para.text, pstyle, self.layout_cache,
+                               (para.text, self.style_key(para.style)))
 
     @staticmethod
     def render_spacer(spacer: DG.Spacer) -> Flowable:
@@ -170,8 +233,32 @@ class PDFGenerator(DG.DocumentGenerator):
                               colWidths=col_widths,
                               rowHeights=row_heights, style=tstyles)
 
+    @staticmethod
+    def style_key(style: Optional[DG.ElementStyle]) -> Tuple:
+        """the properties of a style that change how a paragraph looks"""
+        if style is None:
+            return ()
+        padding: Tuple = ()
+        if style.padding is not None:
+            padding = tuple(pad.points() for pad in style.padding)
+        return (style.name, style.colour, style.background, style.alignment,
+                style.font_size, style.leading, padding)
+
     def translate_element_style(self, style: DG.ElementStyle) -> lib.styles.ParagraphStyle:
-        """Convert an ElementStyle into Reportlab version"""
+        """
+        Convert an ElementStyle into Reportlab version.
+        The translated styles are cached, as the same ElementStyle is
+        normally used for many paragraphs.
+        """
+        key = ('style', self.style_key(style))
+        pstyle = self.layout_cache.get(key)
+        if pstyle is None:
+            pstyle = self._translate_element_style(style)
+            self.layout_cache.put(key, pstyle)
+        return pstyle
+
+    def _translate_element_style(self, style: DG.ElementStyle) -> lib.styles.ParagraphStyle:
+        """Convert an ElementStyle into a new Reportlab ParagraphStyle"""
         space_after: float = 0
         space_before: float = 0
         left_indent: float = 0
@@ -213,9 +300,32 @@ class PDFGenerator(DG.DocumentGenerator):
         Produce Reportlab format table styling.
         Converts all of the styling information in a table to the
         list of style commands used by Reportlab tables.
+        The commands are cached, as every table in a set of Bingo
+        tickets has the same styling.
         """
         if table.style is None:
             return []
+        key = ('table', self.table_style_key(cast(TableStyle, table.style)),
+               first_row, last_row, num_cols, table.heading is not None,
+               table.footer is not None,
+               tuple((start, end, self.style_key(cstyle))
+                     for start, end, cstyle in table._cell_styles))
+        commands = self.layout_cache.get(key)
+        if commands is None:
+            commands = self._translate_table_style(table, first_row,
+                                                   last_row, num_cols)
+            self.layout_cache.put(key, commands)
+        return list(commands)
+
+    def table_style_key(self, style: TableStyle) -> Tuple:
+        """the properties of a TableStyle that change how a table looks"""
+        return (self.style_key(style), style.border_colour,
+                style.border_width, style.grid_colour, style.grid_width,
+                style.vertical_align, self.style_key(style.heading_style),
+                self.style_key(style.footer_style))
+
+    def _translate_table_style(self, table: DG.Table, first_row: int,
+                               last_row: int, num_cols: int) -> List[Tuple]:
         style = cast(TableStyle, table.style)
         result: List[Tuple] = self.translate_element_style_for_table(
             style, (0, 0), (-1, -1), None)
@@ -235,13 +345,89 @@ class PDFGenerator(DG.DocumentGenerator):
             result += self.translate_element_style_for_table(
                 style.footer_style, (0, -1), (num_cols - 1, -1),
                 table.style)
+        backgrounds: List[Tuple] = []
         for start, end, cstyle in table._cell_styles:
             start = DG.CellPos(col=start.col, row=(start.row + first_row))
             end = DG.CellPos(col=end.col, row=(end.row + first_row))
-            result += self.translate_element_style_for_table(
-                cstyle, start, end, table.style)
+            for cmd in self.translate_element_style_for_table(
+                    cstyle, start, end, table.style):
+                if cmd[0] == 'BACKGROUND':
+                    backgrounds.append(cmd)
+                else:
+                    result.append(cmd)
+        num_rows = last_row + (0 if table.footer is None else 1)
+        result += self.merge_cell_backgrounds(backgrounds, first_row,
+                                              last_row, num_cols, num_rows)
         return result
 
+    @staticmethod
+    def merge_cell_backgrounds(backgrounds: List[Tuple], first_row: int,
+                               last_row: int, num_cols: int,
+                               num_rows: Optional[int] = None) -> List[Tuple]:
+        """
+        Reduce the number of BACKGROUND commands that are needed to
+        colour the cells of a table.
+        Rows (or columns) of cells are converted into a single
+        COLBACKGROUNDS (or ROWBACKGROUNDS) command, using the shortest
+        repeating sequence of colours, and adjacent rows (or columns)
+        that are the same are combined. A Bingo ticket with a
+        checkerboard pattern only needs one command per row, instead
+        of one command per cell. Whichever of the rows, columns or the
+        original commands has the fewest commands is used.
+        Negative cell positions count back from the last column or from
+        the last row of the table (num_rows, which defaults to last_row).
+        """
+        if num_rows is None:
+            num_rows = last_row
+        grid: List[List[Optional[lib.colors.Color]]] = [
+            [None] * num_cols for _ in range(last_row - first_row)]
+        for _, start, end, colour in backgrounds:
+            start = (start[0] + num_cols if start[0] < 0 else start[0],
+                     start[1] + num_rows if start[1] < 0 else start[1])
+            end = (end[0] + num_cols if end[0] < 0 else end[0],
+                   end[1] + num_rows if end[1] < 0 else end[1])
+            if (not isinstance(colour, lib.colors.Color) or
+                    min(start[0], start[1] - first_row) < 0 or
+                    end[0] >= num_cols or end[1] >= last_row):
+                # gradients and cells outside the body of the table
+                # are left alone
+                return backgrounds
+            for row in range(start[1] - first_row, end[1] - first_row + 1):
+                for col in range(start[0], end[0] + 1):
+                    grid[row][col] = colour
+
+        def cycle(colours: List) -> Tuple:
+            for period in range(1, len(colours)):
+                if all(colours[idx] == colours[idx % period]
+                       for idx in range(period, len(colours))):
+                    return tuple(colours[:period])
+            return tuple(colours)
+
+        def spans(lines: List[List], command: str, pos: Callable) -> List[Tuple]:
+            result: List[Tuple] = []
+            start = 0
+            while start < len(lines):
+                end = start
+                while end + 1 < len(lines) and lines[end + 1] == lines[start]:
+                    end += 1
+                colours = cycle(lines[start])
+                if len(colours) == 1:
+                    if colours[0] is not None:
+                        result.append(('BACKGROUND', pos(start, 0),
+                                       pos(end, -1), colours[0]))
+                else:
+                    result.append((command, pos(start, 0), pos(end, -1), colours))
+                start = end + 1
+            return result
+
+        by_row = spans(grid, 'COLBACKGROUNDS',
+                       lambda row, col: (col, row + first_row))
+        columns = [list(column) for column in zip(*grid)]
+        by_col = spans(columns, 'ROWBACKGROUNDS',
+                       lambda col, row: (col, (first_row if row == 0 else
+                                               last_row - 1)))
+        return min(backgrounds, by_row, by_col, key=len)
+
     def translate_element_style_for_table(
             self, style: DG.ElementStyle, start: Tuple[int, int],
             end: Tuple[int, int],
@@ -17,10 +17,10 @@ import copy
 import datetime
 import json
 import math
-import random
 import re
-import secrets
-from typing import Dict, List, Optional, Sequence, Set, Tuple
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy # type: ignore
 
 from musicbingo.assets import Assets
 from musicbingo.directory import Directory
@@ -32,8 +32,8 @@ from musicbingo.docgen.styles import HorizontalAlignment, VerticalAlignment
 from musicbingo.docgen.styles import ElementStyle, TableStyle, Padding
 from musicbingo.mp3.editor import MP3Editor, MP3FileWriter
 from musicbingo.options import GameMode, Options
-from musicbingo.primes import PRIME_NUMBERS
 from musicbingo.progress import Progress
+from musicbingo.securerandom import SecureRandom, UniqueSampler
 from musicbingo.song import Duration, Metadata, Song
 
 # pylint: disable=too-few-public-methods
@@ -45,6 +45,7 @@ class BingoTicket:
         self.card_id = card_id
         self.card_tracks: List[Song] = []
         self.ticket_number: Optional[int] = None
+        self.win_point: Optional[int] = None
 
     def box_colour_style(self, col: int, row: int) -> Colour:
         """Get the background colour for a given bingo ticket"""
@@ -74,7 +75,7 @@ class GameGenerator:
             alignment=HorizontalAlignment.CENTER,
             fontSize=12,
             leading=12,
-            padding=Padding(bottom=(4.0/72.0)),
+            padding=Padding(bottom=4.0/72.0),
         ),
         'track-heading': ElementStyle(
             name='track-heading',
@@ -133,7 +134,6 @@ class GameGenerator:
 
     MIN_CARDS: int = 15 # minimum number of cards in a game
     MIN_SONGS: int = 17  # 17 songs allows 136 combinations
-    MAX_SONGS: int = len(PRIME_NUMBERS)
 
     def __init__(self, options: Options, mp3_editor: MP3Editor,
                  doc_gen: DG.DocumentGenerator,
@@ -144,6 +144,8 @@ class GameGenerator:
         self.progress = progress
         self.game_songs: List[Song] = []
         self.used_card_ids: Set[int] = set()
+        self.rand = SecureRandom()
+        self._samplers: Dict[Tuple[Tuple[int, ...], int], UniqueSampler] = {}
 
     def generate(self, songs: List[Song]) -> None:
         """
@@ -152,6 +154,8 @@ class GameGenerator:
         """
         self.check_options(self.options, songs)
         self.game_songs = songs
+        self.rand = SecureRandom()
+        self._samplers.clear()
         if not self.assign_song_ids(self.game_songs):
             raise ValueError('Failed to assign song IDs - '+\
                              'maybe not enough tracks in the game?')
@@ -198,8 +202,6 @@ class GameGenerator:
         min_songs = int(round(1.5 * options.songs_per_ticket() + 0.5))
         if num_songs < min_songs:
             raise ValueError(f'At least {min_songs} songs are required')
-        if num_songs > cls.MAX_SONGS:
-            raise ValueError(f'Maximum number of songs is {cls.MAX_SONGS}')
         if options.number_of_cards < cls.MIN_CARDS:
             raise ValueError(f'At least {cls.MIN_CARDS} tickets are required')
         max_cards = cls.combinations(num_songs, options.songs_per_ticket())
@@ -293,55 +295,68 @@ class GameGenerator:
 
     @staticmethod
     def assign_song_ids(songs: Sequence[Song]) -> bool:
-        """assigns prime numbers to all of the songs in the game.
-        Returns True if successfull and false if there are too many
-        songs.
+        """assigns a unique bit to all of the songs in the game.
+        The card_id of each ticket is the bitwise OR of the song_id
+        of every song on that ticket.
+        Returns True if successfull.
         """
-        if len(songs) > len(PRIME_NUMBERS):
-            print("Exceeded the {0} song limit".format(len(PRIME_NUMBERS)))
-            return False
         for index, song in enumerate(songs):
-            song.song_id = PRIME_NUMBERS[index]
+            song.song_id = 1 << index
         return True
 
     def select_songs_for_ticket(self, songs: List[Song],
                                 card: BingoTicket, num_tracks: int) -> None:
         """select the songs for a bingo ticket ensuring that it is unique"""
-        valid_card = False
-        picked_indices: Set[int] = set()
-        card.card_tracks = []
-        card.card_id = 1
-        while not valid_card and not self.progress.abort:
-            valid_index = False
-            index = 0
-            while not valid_index:
-                index = secrets.randbelow(len(songs))
-                valid_index = index not in picked_indices
-            card.card_tracks.append(songs[index])
-            card.card_id = card.card_id * songs[index].song_id
-            picked_indices.add(index)
-            if len(card.card_tracks) == num_tracks:
-                valid_card = True
-                if card.card_id in self.used_card_ids:
-                    valid_card = False
-                    picked_indices = set()
-                    card.card_tracks = []
-                    card.card_id = 1
-                if valid_card:
-                    self.used_card_ids.add(card.card_id)
+        sampler = self.combination_sampler(songs, num_tracks)
+        while not self.progress.abort:
+            if sampler.remaining == 0:
+                raise ValueError('Unable to generate a unique ticket - ' +
+                                 'all combinations of songs have been used')
+            card.card_tracks = self.unrank_songs(songs, num_tracks, sampler.next())
+            self.rand.shuffle(card.card_tracks)
+            card.win_point = None
+            card.card_id = 0
+            for song in card.card_tracks:
+                card.card_id |= song.song_id
+            if card.card_id not in self.used_card_ids:
+                self.used_card_ids.add(card.card_id)
+                return
+
+    def combination_sampler(self, songs: Sequence[Song],
+                            select: int) -> UniqueSampler:
+        """
+        Get the sampler used for choosing 'select' songs from 'songs'.
+        The sampler picks unique ranks from the range of all possible
+        combinations, so a combination of songs is never picked twice.
+        """
+        key = (tuple(song.ref_id for song in songs), select)
+        try:
+            return self._samplers[key]
+        except KeyError:
+            pass
+        sampler = UniqueSampler(self.rand, self.combinations(len(songs), select))
+        self._samplers[key] = sampler
+        return sampler
+
+    @classmethod
+    def unrank_songs(cls, songs: Sequence[Song], select: int,
+                     rank: int) -> List[Song]:
+        """Get the combination of 'select' songs that has the given rank"""
+        return [songs[idx] for idx in cls.unrank_combination(
+            rank, len(songs), select)]
 
     def should_include_artist(self, track: Song) -> bool:
         """Check if the artist name should be shown"""
         return self.options.include_artist and not re.match(
             r'various\s+artist', track.artist, re.IGNORECASE)
 
-    def render_bingo_ticket(self, card: BingoTicket, doc: DG.Document) -> None:
+    def render_bingo_ticket(self, card: BingoTicket) -> Iterator[DG.Element]:
         """
-        Render a Bingo ticket into the specified Document.
+        Create the elements of a Bingo ticket.
         Each ticket has the Music Bingo logo followed by a
         table.
         """
-        doc.append(self.options.palette.logo_image("6.2in"))
+        yield self.options.palette.logo_image("6.2in")
 
         pstyle = self.TEXT_STYLES['ticket-cell']
         data: List[DG.TableRow] = []
@@ -383,7 +398,7 @@ class GameGenerator:
                     DG.CellPos(col=box_col, row=box_row),
                     DG.CellPos(col=box_col, row=box_row),
                     background=card.box_colour_style(box_col, box_row))
-        doc.append(table)
+        yield table
 
     def generate_track_listing(self, tracks: List[Song]) -> None:
         """generate a PDF version of the track order in the game"""
@@ -479,8 +494,11 @@ class GameGenerator:
 
         cards = copy.copy(cards)
         cards.sort(key=lambda card: card.ticket_number, reverse=False)
+        self.get_when_tickets_win(
+            tracks, [card for card in cards if card.win_point is None])
         for card in cards:
-            win_point = self.get_when_ticket_wins(tracks, card)
+            assert card.win_point is not None
+            win_point = card.win_point
             song = tracks[win_point - 1]
             data.append([
                 DG.Paragraph(f'{card.ticket_number}', pstyle),
@@ -512,37 +530,53 @@ class GameGenerator:
     def generate_at_point(self, tracks: List[Song], amount: int,
                           from_end: int) -> List[BingoTicket]:
         """generate an 'amount' number of bingo tickets that will win
-        at the specified amount from the end
+        at the specified amount from the end.
+        Rather than generating random tickets until one happens to win
+        at the correct point, each ticket is constructed by using the
+        track at the winning position plus songs_per_ticket()-1 tracks
+        chosen from the tracks that are played before it. This gives
+        the same distribution of tickets as picking random tickets and
+        discarding those that win at a different point.
         """
-        count = 0
+        win_point = len(tracks) - from_end
+        winning_track = tracks[win_point - 1]
+        earlier_tracks = tracks[:win_point - 1]
+        num_tracks = self.options.songs_per_ticket()
+        sampler = self.combination_sampler(earlier_tracks, num_tracks - 1)
         cards: List[BingoTicket] = []
-        while count < amount:
-            card = BingoTicket(self.options)
-            self.select_songs_for_ticket(tracks, card,
-                                         self.options.songs_per_ticket())
+        while len(cards) < amount:
             if self.progress.abort:
                 return cards
-            win_point = self.get_when_ticket_wins(tracks, card)
-            if win_point != (len(tracks) - from_end):
-                self.used_card_ids.remove(card.card_id)
-            else:
+            if sampler.remaining == 0:
+                raise ValueError(f'Unable to generate {amount} tickets ' +
+                                 f'that win at track {win_point}')
+            card = BingoTicket(self.options)
+            card.card_tracks = self.unrank_songs(earlier_tracks, num_tracks - 1,
+                                                 sampler.next())
+            card.card_tracks.append(winning_track)
+            self.rand.shuffle(card.card_tracks)
+            card.card_id = 0
+            for song in card.card_tracks:
+                card.card_id |= song.song_id
+            if card.card_id not in self.used_card_ids:
+                self.used_card_ids.add(card.card_id)
+                card.win_point = win_point
                 cards.append(card)
-                count = count + 1
         return cards
 
-    @staticmethod
-    def randrange(start, end):
+    def randrange(self, start: int, end: int) -> int:
         """a version of random.randrange() that uses a better random number generator.
-        This version of randrange() uses the secrets library for a better source of
-        entropy.
+        This version of randrange() uses a cryptographically secure random
+        number generator that is seeded from the secrets library.
         """
-        return start + secrets.randbelow(end - start)
+        return self.rand.randrange(start, end)
 
     def generate_all_cards(self, tracks: List[Song]) -> List[BingoTicket]:
         """generate all the bingo tickets in the game"""
         self.progress.text = 'Calculating cards'
         self.progress.pct = 0.0
         self.used_card_ids.clear()
+        self._samplers.clear()
         cards: List[BingoTicket] = []
         decay_rate = 0.65
         num_on_last = self.options.number_of_cards * decay_rate
@@ -583,7 +617,7 @@ class GameGenerator:
             offset += 1
         increment: float = self.options.number_of_cards / float(amount_to_go)
         start_point: float = 0
-        random.shuffle(good_cards)
+        self.rand.shuffle(good_cards)
         for card in good_cards:
             if self.progress.abort:
                 return cards
@@ -641,75 +675,85 @@ class GameGenerator:
             start_point = start_point + increment
 
     def generate_tickets_pdf(self, cards: List[BingoTicket]) -> None:
-        """generate a PDF file containing all the Bingo tickets"""
-        doc = DG.Document(pagesize=PageSizes.A4,
-                          title=f'{self.options.game_id} - {self.options.title}',
-                          topMargin="0.15in",
-                          rightMargin="0.15in",
-                          bottomMargin="0.15in",
-                          leftMargin="0.15in")
-        page: int = 1
-        num_cards: int = len(cards)
-        cards_per_page: int = 3
+        """
+        generate a PDF file containing all the Bingo tickets.
+        The elements of each page are created as the page is rendered,
+        so the elements of every ticket are never all in memory at the
+        same time.
+        """
+        cards_per_page = self.cards_per_page()
+        num_pages = (len(cards) + cards_per_page - 1) // cards_per_page
+        doc = DG.StreamingDocument(pagesize=PageSizes.A4,
+                                   elements=self.ticket_elements(cards),
+                                   num_pages=num_pages,
+                                   title=f'{self.options.game_id} - {self.options.title}',
+                                   topMargin="0.15in",
+                                   rightMargin="0.15in",
+                                   bottomMargin="0.15in",
+                                   leftMargin="0.15in")
+        filename = str(self.options.bingo_tickets_output_name())
+        self.doc_gen.render(filename, doc, self.progress)
+
+    def cards_per_page(self) -> int:
+        """the number of Bingo tickets on each page"""
         if self.options.rows == 2:
-            cards_per_page = 4
-        elif self.options.rows > 3:
-            cards_per_page = 2
+            return 4
+        if self.options.rows > 3:
+            return 2
+        return 3
+
+    def ticket_elements(self, cards: List[BingoTicket]) -> Iterator[DG.Element]:
+        """create the elements of every Bingo ticket"""
+        page: int = 1
+        cards_per_page = self.cards_per_page()
         id_style = self.TEXT_STYLES['ticket-id']
         title_style = id_style.replace('ticket-title',
                                        alignment=HorizontalAlignment.LEFT)
+        tstyle = TableStyle(name='ticket-id',
+                            borderWidth=0,
+                            gridWidth=0,
+                            verticalAlignment=VerticalAlignment.CENTER)
 
         for count, card in enumerate(cards, start=1):
-            self.progress.text = f'Card {count}/{num_cards}'
-            self.progress.pct = 100.0 * float(count) / float(num_cards)
-            self.render_bingo_ticket(card, doc)
+            yield from self.render_bingo_ticket(card)
             data: List[DG.TableRow] = [[
                 DG.Paragraph(self.options.title, title_style),
                 DG.Paragraph(
                     f"{self.options.game_id} / T{card.ticket_number} / P{page}",
                     id_style),
             ]]
-            tstyle = TableStyle(name='ticket-id',
-                                borderWidth=0,
-                                gridWidth=0,
-                                verticalAlignment=VerticalAlignment.CENTER)
-            table = DG.Table(
+            yield DG.Table(
                 data,
                 colWidths=[Dimension(80), Dimension(80)],
-                rowHeights=[Dimension(f'16pt')],
+                rowHeights=[Dimension('16pt')],
                 style=tstyle)
-            doc.append(table)
             if count % cards_per_page != 0:
-                doc.append(
-                    DG.HorizontalLine('hline', width="100%", thickness="1px",
-                                      colour=Colour('gray'), dash=[2, 2]))
-                doc.append(DG.Spacer(width=0, height="0.08in"))
+                yield DG.HorizontalLine('hline', width="100%", thickness="1px",
+                                        colour=Colour('gray'), dash=[2, 2])
+                yield DG.Spacer(width=0, height="0.08in")
             else:
-                doc.append(DG.PageBreak())
+                yield DG.PageBreak()
                 page += 1
-        filename = str(self.options.bingo_tickets_output_name())
-        self.doc_gen.render(filename, doc, Progress())
 
     def generate_ticket_tracks_file(self, cards: List[BingoTicket]) -> None:
-        """store ticketTracks file used by TicketChecker.py"""
+        """store ticketTracks file used by TicketChecker.py
+        The card_id is written in hex, which allows it to be
+        distinguished from games that used a product of prime numbers
+        as the card_id.
+        """
         filename = self.options.ticket_checker_output_name()
         with filename.open('wt') as ttf:
             for card in cards:
-                ttf.write(f"{card.ticket_number}/{card.card_id}\n")
+                ttf.write(f"{card.ticket_number}/{card.card_id:#x}\n")
 
     def gen_track_order(self) -> List[Song]:
         """generate a random order of tracks for the game"""
         assert len(self.game_songs) > 0
         list_copy = copy.copy(self.game_songs)
         if not self.options.mode == GameMode.QUIZ:
-            random.shuffle(list_copy, self.rand_float)
+            self.rand.shuffle(list_copy)
         return list_copy
 
-    @staticmethod
-    def rand_float() -> float:
-        """generate a random number using the secrets library"""
-        return float(secrets.randbelow(1000)) / 1000.0
-
     @staticmethod
     def get_when_ticket_wins(tracks: List[Song], ticket: BingoTicket) -> int:
         """get the point at which the given ticket will win, given the
@@ -727,6 +771,42 @@ class GameGenerator:
             raise ValueError(f'ticket never wins, missing {card_track_ids}')
         return last_song
 
+    @staticmethod
+    def get_when_tickets_win(tracks: List[Song],
+                             tickets: Sequence[BingoTicket]) -> List[int]:
+        """get the point at which each of the given tickets will win,
+        given the specified order.
+        Every song in the game has its own song_id bit, so a position
+        array indexed by that bit gives the position (counting from 1)
+        of each track in the game. Each ticket is converted into a row
+        of the bits of its tracks, and the win point of each ticket is
+        the maximum position in its row. The result is also stored in
+        the win_point property of each ticket.
+        """
+        if not tickets:
+            return []
+        if not tracks:
+            raise ValueError('ticket never wins, the game has no tracks')
+        track_bits = numpy.array([song.song_id.bit_length() - 1 for song in tracks],
+                                 dtype=numpy.int64)
+        ticket_bits = numpy.array([[track.song_id.bit_length() - 1
+                                    for track in ticket.card_tracks]
+                                   for ticket in tickets], dtype=numpy.int64)
+        if track_bits.min() < 0 or ticket_bits.min() < 0:
+            raise ValueError('song_id has not been assigned')
+        # position zero marks a song that is not in the game
+        positions = numpy.zeros(max(track_bits.max(), ticket_bits.max()) + 1,
+                                dtype=numpy.int64)
+        positions[track_bits] = numpy.arange(1, len(tracks) + 1)
+        ticket_positions = positions[ticket_bits]
+        if not ticket_positions.all():
+            missing = ticket_bits[ticket_positions == 0][0]
+            raise ValueError(f'ticket never wins, missing song_id 1<<{missing}')
+        win_points: List[int] = ticket_positions.max(axis=1).tolist()
+        for ticket, win_point in zip(tickets, win_points):
+            ticket.win_point = win_point
+        return win_points
+
     def save_game_tracks_json(self, tracks: List[Song]) -> None:
         """saves the track listing to gameTracks.json"""
         filename = self.options.game_info_output_name()
@@ -734,7 +814,8 @@ class GameGenerator:
         with filename.open('w') as jsf:
             marshalled: List[Dict] = []
             for track in tracks:
-                track_dict = track.marshall(exclude=['ref_id', 'filename', 'index'])
+                track_dict = track.marshall(exclude=['ref_id', 'filename', 'index',
+                                                     'title_key', 'artist_key'])
                 track_dict['filepath'] = str(track_dict['filepath'])
                 # remove top level "Clips" directory to make filepath
                 # relative to "Clips" directory
@@ -751,7 +832,29 @@ class GameGenerator:
         """
         if select > total:
             return 0
-        return int(math.factorial(total)/(math.factorial(select)*math.factorial(total-select)))
+        return math.factorial(total) // (math.factorial(select) *
+                                         math.factorial(total - select))
+
+    @classmethod
+    def unrank_combination(cls, rank: int, total: int, select: int) -> List[int]:
+        """convert a rank into a combination.
+        Uses the combinatorial number system to convert a number in the
+        range [0, combinations(total, select)) into a unique selection of
+        'select' items from 'total' items. Returns the indexes of the
+        selected items, in descending order.
+        """
+        result: List[int] = []
+        candidate = total
+        for size in range(select, 0, -1):
+            candidate -= 1
+            count = cls.combinations(candidate, size)
+            while count > rank:
+                # C(n-1, k) = C(n, k) * (n - k) / n
+                count = count * (candidate - size) // candidate
+                candidate -= 1
+            result.append(candidate)
+            rank -= count
+        return result
 
 def main(args: Sequence[str]) -> int:
     """used for testing game generation without needing to use the GUI"""
@@ -767,8 +870,9 @@ def main(args: Sequence[str]) -> int:
         options.game_id = datetime.date.today().strftime("%y-%m-%d")
     progress = TextProgress()
     mp3parser = MP3Factory.create_parser()
-    mp3editor = MP3Factory.create_editor()
-    pdf = DocumentFactory.create_generator('pdf')
+    mp3editor = MP3Factory.create_editor(workers=options.decode_workers,
+                                         lookahead=options.decode_lookahead)
+    pdf = DocumentFactory.create_generator(options.doc_generator)
     clips = Directory(None, 0, options.clips(), mp3parser, progress)
     clips.search()
     gen = GameGenerator(options, mp3editor, pdf, progress)
@@ -15,11 +15,9 @@ generated for use in a Bingo game.
 from __future__ import print_function
 import datetime
 from pathlib import Path
-import json
-import os
-import secrets
 import sys
-from typing import Any, Callable, Dict, List, Optional, Set, Type, cast
+import threading
+from typing import Any, Callable, List, Optional, Sequence, Set, Tuple, Type, cast
 
 import tkinter as tk # pylint: disable=import-error
 import tkinter.messagebox # pylint: disable=import-error
@@ -30,10 +28,14 @@ import tkinter.ttk # pylint: disable=import-error
 from musicbingo.assets import Assets
 from musicbingo.directory import Directory
 from musicbingo.generator import GameGenerator
-from musicbingo.mp3 import MP3Parser
+from musicbingo.mp3 import MP3Factory, MP3Parser
 from musicbingo.options import GameMode, Options
+from musicbingo.playhistory import PlayHistory
 from musicbingo.progress import Progress
 from musicbingo.song import Metadata, Song
+from musicbingo.songindex import SongIndex
+from musicbingo.songsampler import SongSampler
+from musicbingo.watcher import ChangeAction, DirectoryWatcher
 
 from .actionpanel import ActionPanel, ActionPanelCallbacks
 from .clipspanel import GenerateClipsPanel
@@ -67,10 +69,14 @@ class MainApp(ActionPanelCallbacks):
         self._sort_by_title_option = True
         self.clips: Directory = Directory(None, 0, Path(''), NullMP3Parser(),
                                           Progress())
-        self.poll_id = None
+        self.poll_id: Optional[str] = None
+        self.watcher: Optional[DirectoryWatcher] = None
+        self.watcher_poll_id: Optional[str] = None
         self.dest_directory: str = ''
         self.threads: List[BackgroundWorker] = []
-        self.previous_games_songs: Set[int] = set() # uses hash of song
+        self.history: Optional[PlayHistory] = None
+        # uses PlayHistory.song_key() of each song
+        self.previous_games_songs: Set[str] = set()
         self.base_game_id: str = datetime.date.today().strftime("%y-%m-%d")
 
         self.main = tk.Frame(root_elt, bg=Panel.NORMAL_BACKGROUND)
@@ -103,7 +109,8 @@ class MainApp(ActionPanelCallbacks):
         root_elt.config(menu=self.menu)
 
         self.available_songs_panel = SongsPanel(self.main, self.options,
-                                                self.add_selected_songs_to_game)
+                                                self.add_selected_songs_to_game,
+                                                searchable=True, lazy=True)
         self.action_panel = ActionPanel(self.main, self)
         self.selected_songs_panel = SelectedSongsPanel(self.main,
                                                        self.options,
@@ -152,40 +159,47 @@ class MainApp(ActionPanelCallbacks):
 
     def generate_unique_game_id(self):
         """Create unique game ID.
-        Checks the "./Bingo Games" directory to make sure that the
-        generated game ID does not already exist
+        Checks the play history and the "./Bingo Games" directory to
+        make sure that the generated game ID does not already exist
         """
         game_num = 1
         game_id = lambda num: f"{self.base_game_id}-{num}"
-        self.previous_games_songs.clear()
-        #clashes: Set[str] = set()
-        games_dest = self.options.game_destination_dir()
-        for subdir in [Path(x[0]) for x in os.walk(games_dest)]:
-            if subdir == games_dest:
-                continue
-            if subdir.name.startswith(game_id(game_num)):
-                self.load_previous_game_songs(subdir)
-                #clashes.append(subdir.name)
-        while self.options.game_destination_dir(game_id(game_num)).exists():
+        history = self.open_play_history()
+        used_ids = history.game_ids(self.base_game_id)
+        while (game_id(game_num) in used_ids or
+               self.options.game_destination_dir(game_id(game_num)).exists()):
             game_num += 1
         self.game_panel.set_game_id(game_id(game_num))
-        self.action_panel.set_num_previous_songs(len(self.previous_games_songs))
+        self.load_previous_game_songs()
 
-    def load_previous_game_songs(self, gamedir: Path) -> None:
+    def open_play_history(self) -> PlayHistory:
         """
-        Load all the songs from a previous game.
-        The previous_games_songs set is updated with
-        every song in a previous game. This is then used when
-        adding random tracks to a game to attempt to avoid adding
-        duplicates
+        Open the database of songs used in previous games.
+        Games that were generated before the database was created are
+        imported the first time that it is used.
         """
-        filename = gamedir / self.options.games_tracks_filename
-        if not filename.exists():
-            return
-        with filename.open('r') as gt_file:
-            for index, song in enumerate(json.load(gt_file), 1):
-                song = Song(None, index, Metadata(**song))
-                self.previous_games_songs.add(hash(song))
+        filename = self.options.play_history_filename()
+        if self.history is None or self.history.filename != filename:
+            if self.history is not None:
+                self.history.close()
+            self.history = PlayHistory(filename)
+            self.history.import_games(self.options.games_directory(),
+                                      self.options.game_name_template,
+                                      self.options.game_tracks_filename)
+        return self.history
+
+    def load_previous_game_songs(self) -> None:
+        """
+        Load all the songs from recent previous games.
+        The previous_games_songs set is updated with the identity of
+        every song used in the games selected by the exclude_games and
+        exclude_days options. This is then used when adding random
+        tracks to a game to attempt to avoid adding duplicates
+        """
+        history = self.open_play_history()
+        self.previous_games_songs = history.recent_songs(
+            self.options.library.exclude_games, self.options.library.exclude_days)
+        self.action_panel.set_num_previous_songs(len(self.previous_games_songs))
 
     def ask_select_source_directory(self):
         """Ask user for clip source directory.
@@ -195,6 +209,7 @@ class MainApp(ActionPanelCallbacks):
         if not chosen:
             return
         self.options.clip_directory = chosen
+        self.stop_watching_clips_directory()
         self.available_songs_panel.clear()
         self.search_clips_directory()
 
@@ -223,23 +238,22 @@ class MainApp(ActionPanelCallbacks):
             self.selected_songs_panel.add_song(song)
 
     def add_random_songs_to_game(self, amount: int = 5) -> None:
-        """add random songs (if available) to the game list"""
-        selections = self.available_songs_panel.selections(False)
-        songs: Dict[int, Song] = {}
-        already_chosen = self.selected_songs_panel.get_song_ids()
-        for song in selections:
-            if (hash(song) not in self.previous_games_songs and
-                    song.ref_id not in already_chosen):
-                songs[song.ref_id] = song
-        todo = min(len(songs), amount)
-        ref_ids: List[int] = list(songs.keys())
-        while songs and todo > 0:
-            ref_id = secrets.choice(ref_ids)
-            ref_ids.remove(ref_id)
-            song = songs[ref_id]
+        """
+        add random songs (if available) to the game list.
+        If songs have been selected in the available songs panel, only
+        those songs are used.
+        """
+        songs: Sequence[Song] = self.available_songs_panel.selections(True)
+        if not songs:
+            songs = self.clips.get_songs(self.clips.ref_id)
+        sampler = SongSampler(songs)
+        chosen = sampler.sample(amount,
+                                exclude_ids=self.selected_songs_panel.get_song_ids(),
+                                exclude_keys=self.previous_games_songs,
+                                distinct_artists=self.options.library.distinct_artists)
+        for song in chosen:
             self.available_songs_panel.hide_song(song)
             self.selected_songs_panel.add_song(song)
-            todo -= 1
 
     def remove_song_from_game(self):
         """
@@ -326,11 +340,60 @@ class MainApp(ActionPanelCallbacks):
         This function is called from the main thread
         """
         if result is not None:
-            self.clips = cast(Directory, result)
+            self.clips, song_index = cast(Tuple[Directory, SongIndex], result)
+            self.available_songs_panel.set_search_index(song_index)
         self.add_available_songs_to_treeview()
         self.info_panel.text = ''
         self.info_panel.pct = 0
         self.enable_panels()
+        if self.options.library.watch and result is not None:
+            self.stop_watching_clips_directory()
+            self.watcher = DirectoryWatcher(self.clips, MP3Factory.create_parser())
+            self.watcher.start()
+            self._poll_watcher()
+
+    def stop_watching_clips_directory(self) -> None:
+        """stop the background thread that checks for new songs"""
+        if self.watcher is not None:
+            # the watcher might be part way through parsing an MP3 file,
+            # so wait for it to finish using a separate thread, rather
+            # than blocking the GUI
+            self.watcher.stop(wait=False)
+            threading.Thread(target=self.watcher.close, daemon=True).start()
+            self.watcher = None
+        if self.watcher_poll_id is not None:
+            self.root.after_cancel(self.watcher_poll_id)
+            self.watcher_poll_id = None
+
+    def _poll_watcher(self) -> None:
+        """
+        Apply any changes found by the DirectoryWatcher to the available
+        songs panel.
+        """
+        if self.watcher is None:
+            return
+        song_index = self.available_songs_panel.search_index
+        for action, item in self.watcher.apply_changes():
+            if song_index is not None:
+                if action == ChangeAction.ADD_SONG:
+                    song_index.add(cast(Song, item))
+                elif action == ChangeAction.ADD_DIRECTORY:
+                    song_index.add_directory(cast(Directory, item))
+                elif action == ChangeAction.REMOVE_SONG:
+                    song_index.remove(cast(Song, item))
+                else:
+                    song_index.remove_directory(cast(Directory, item))
+            if action in (ChangeAction.ADD_SONG, ChangeAction.ADD_DIRECTORY):
+                self.available_songs_panel.add_item(item)
+                continue
+            try:
+                if isinstance(item, Directory):
+                    self.available_songs_panel.remove_directory(item)
+                else:
+                    self.available_songs_panel.remove_song(item)
+            except KeyError:
+                pass
+        self.watcher_poll_id = self.root.after(1000, self._poll_watcher)
 
     def start_background_worker(self, worker: Type[BackgroundWorker],
                                 finalise: Callable[["BackgroundWorker"], None],
@@ -2,8 +2,13 @@
 Panels used for both available songs and songs in game
 """
 
+from collections import deque
 from functools import partial
-from typing import Callable, Dict, List, Set, Tuple, Union, cast
+import time
+from typing import (
+    Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple,
+    Union, cast
+)
 
 import tkinter as tk # pylint: disable=import-error
 import tkinter.ttk # pylint: disable=import-error
@@ -12,6 +17,7 @@ from musicbingo.directory import Directory
 from musicbingo.gui.panel import Panel
 from musicbingo.options import GameMode, Options
 from musicbingo.song import Duration, Song
+from musicbingo.songindex import SongIndex
 
 #pylint: disable=too-many-instance-attributes
 class SongsPanel(Panel):
@@ -22,9 +28,18 @@ class SongsPanel(Panel):
     FOOTER_TEMPLATE = r"{num_songs} songs available ({duration})"
     COLUMNS = ("filename", "title", "artist", "album", "duration",)
     DISPLAY_COLUMNS = ('title', 'artist',)
+    # time (in milliseconds) to wait after a key press before searching
+    SEARCH_DELAY = 150
+    # maximum time (in seconds) to spend adding items to the tree before
+    # letting Tk process other events
+    BATCH_TIME = 0.02
+    # prefix of the ID of the item shown below a directory that has not
+    # been opened, so that the directory can be opened
+    PLACEHOLDER = 'placeholder-'
 
     def __init__(self, main: tk.Frame, options: Options,
-                 double_click: Callable[[List[Song]], None]) -> None:
+                 double_click: Callable[[List[Song]], None],
+                 searchable: bool = False, lazy: bool = False) -> None:
         super(SongsPanel, self).__init__(main)
         self.inner = tk.Frame(self.frame)
         self.options = options
@@ -34,6 +49,27 @@ class SongsPanel(Panel):
         self._data: Dict[int, Union[Directory, Song]] = {}
         self._hidden: Set[int] = set()
         self._sorting: Tuple[str, bool] = ('', True)
+        # ID of the parent tree item of every Song and Directory
+        self._tree_parent: Dict[int, str] = {}
+        # items detached because they do not match the search query
+        self._filtered: Set[int] = set()
+        # ref_id of every song that matches the search query
+        self._matches: Optional[Set[int]] = None
+        # ref_id of every song and directory that matches the search query
+        self._visible: Optional[Set[int]] = None
+        # when lazy is True, the contents of a directory are only added to
+        # the tree when the directory is opened
+        self.lazy = lazy
+        # directories whose contents have been given to add_directory()
+        self._roots: Set[int] = set()
+        # directories whose contents have been (or are queued to be)
+        # added to the tree
+        self._populated: Set[int] = set()
+        self._pending: Deque[Tuple[str, Deque[Union[Song, Directory]]]] = deque()
+        self._pending_after: Optional[str] = None
+        self.search_index: Optional[SongIndex] = None
+        self.search_text = tk.StringVar(self.frame, value='')
+        self._search_after: Optional[str] = None
         scrollbar = tk.Scrollbar(self.inner)
         self.tree = tkinter.ttk.Treeview(
             self.inner, columns=self.COLUMNS,
@@ -54,9 +90,16 @@ class SongsPanel(Panel):
             self.frame, text='', padx=5, bg=self.NORMAL_BACKGROUND,
             fg="#FFF", font=(self.TYPEFACE, 14))
         self.tree.bind("<Double-1>", self.double_click)
+        if lazy:
+            self.tree.bind("<<TreeviewOpen>>", self._on_open)
         self.tree.pack(side=tk.LEFT)
         scrollbar.pack(side=tk.LEFT, fill=tk.Y)
         self.title.pack(side=tk.TOP, pady=10)
+        if searchable:
+            search_entry = tk.Entry(self.frame, font=(self.TYPEFACE, 14),
+                                    textvariable=self.search_text)
+            self.search_text.trace_add("write", self._on_search_changed) # type: ignore
+            search_entry.pack(side=tk.TOP, fill=tk.X, padx=5)
         self.inner.pack(side=tk.TOP, pady=10)
         self.footer.pack(side=tk.BOTTOM)
 
@@ -70,34 +113,170 @@ class SongsPanel(Panel):
 
     def add_directory(self, directory: Directory) -> None:
         """Add directory contents to the TreeView widget"""
-        self._add_directory(directory, '')
+        self._roots.add(directory.ref_id)
+        if self.lazy:
+            self._register(directory)
+            self._populate(directory)
+        else:
+            self._add_directory(directory, '')
         self._update_footer()
 
+    def _register(self, item: Union[Song, Directory]) -> None:
+        """
+        Record a Song, or a Directory and all of its contents, as being in
+        this panel, without adding them to the tree
+        """
+        self._data[item.ref_id] = item
+        if isinstance(item, Directory):
+            for sub_dir in item.subdirectories:
+                self._register(sub_dir)
+            for song in item.songs:
+                self._register(song)
+        else:
+            self._duration += int(item.duration)
+            self._num_songs += 1
+
+    def _populate(self, directory: Directory) -> None:
+        """queue the contents of a directory to be added to the tree"""
+        if directory.ref_id in self._populated:
+            return
+        self._populated.add(directory.ref_id)
+        if directory.ref_id in self._roots:
+            parent = ''
+        else:
+            parent = str(directory.ref_id)
+            if self.tree.exists(self.PLACEHOLDER + parent):
+                self.tree.delete(self.PLACEHOLDER + parent)
+        items: List[Union[Song, Directory]] = []
+        items += directory.subdirectories
+        items += directory.songs
+        column, reverse = self._sorting
+        if column:
+            # same order as produced by _sort_level()
+            if directory.subdirectories:
+                column = 'filename'
+            items.sort(key=lambda item: item.sort_key(column), reverse=reverse)
+        self._pending.append((parent, deque(items)))
+        if self._pending_after is None:
+            self._pending_after = self.frame.after(1, self._add_pending)
+
+    def _add_pending(self) -> None:
+        """
+        Add queued items to the tree, until BATCH_TIME has elapsed.
+        If there are still items in the queue, another call is scheduled
+        so that Tk can process other events in the meantime.
+        """
+        self._pending_after = None
+        deadline = time.perf_counter() + self.BATCH_TIME
+        while self._pending and time.perf_counter() < deadline:
+            parent, items = self._pending[0]
+            if parent and not self.tree.exists(parent):
+                # directory has been removed
+                self._pending.popleft()
+                continue
+            while items and time.perf_counter() < deadline:
+                self._add_item(parent, items.popleft())
+            if not items:
+                self._pending.popleft()
+        if self._pending:
+            self._pending_after = self.frame.after(1, self._add_pending)
+
+    def _add_item(self, parent: str, item: Union[Song, Directory]) -> None:
+        """
+        Add one item to the tree, taking into account hidden songs and the
+        search query
+        """
+        if (item.ref_id not in self._data or item.ref_id in self._tree_parent or
+                item.ref_id in self._hidden):
+            return
+        self._insert(parent, item)
+        if self._visible is not None and item.ref_id not in self._visible:
+            self._filtered.add(item.ref_id)
+            self.tree.detach(str(item.ref_id))
+
+    def _on_open(self, event) -> None: #pylint: disable=unused-argument
+        """called when a directory is opened in the tree"""
+        try:
+            item = self._data[int(self.tree.focus())]
+        except (KeyError, ValueError):
+            return
+        if isinstance(item, Directory):
+            self._populate(item)
+
+    def _children(self, parent: str) -> List[str]:
+        """IDs of the Song and Directory items directly below parent"""
+        return [item_id for item_id in self.tree.get_children(parent)
+                if not item_id.startswith(self.PLACEHOLDER)]
+
+    def _parent_id(self, item: Union[Song, Directory]) -> str:
+        """ID of the tree item that item is, or will be, placed below"""
+        if item._parent is None:
+            return ''
+        ref_id = cast(Directory, item._parent).ref_id
+        if ref_id in self._roots or ref_id not in self._data:
+            return ''
+        return str(ref_id)
+
     def _add_directory(self, directory: Directory, parent: str) -> None:
         """
         Internal API used for adding directory contents to the TreeView widget
         """
         for sub_dir in directory.subdirectories:
-            item_id = self.tree.insert(
-                parent, 'end', str(sub_dir.ref_id),
-                values=(sub_dir.filename, sub_dir.title, '', '', '',),
-                open=False)
+            item_id = self._insert(parent, sub_dir)
             self._add_directory(sub_dir, item_id)
         self._data[directory.ref_id] = directory
         for song in directory.songs:
             self._data[song.ref_id] = song
-            self.tree.insert(parent, 'end', str(song.ref_id),
-                             values=song.pick(self.COLUMNS))
+            self._insert(parent, song)
             self._duration += int(song.duration)
             self._num_songs += 1
 
+    def _insert(self, parent: str, item: Union[Song, Directory]) -> str:
+        """add a tree item for a Song or Directory"""
+        self._tree_parent[item.ref_id] = parent
+        if isinstance(item, Directory):
+            item_id = self.tree.insert(
+                parent, 'end', str(item.ref_id),
+                values=(item.filename, item.title, '', '', '',),
+                open=self._visible is not None and item.ref_id in self._visible)
+            if (self.lazy and item.ref_id not in self._populated and
+                    (item.songs or item.subdirectories)):
+                self.tree.insert(item_id, 'end', self.PLACEHOLDER + item_id)
+            return item_id
+        return self.tree.insert(parent, 'end', str(item.ref_id),
+                                values=item.pick(self.COLUMNS))
+
+    def add_item(self, item: Union[Song, Directory]) -> None:
+        """
+        Add a Song or Directory that has been added to the library.
+        It is placed below the tree item of its parent directory (if
+        that directory is in this panel).
+        """
+        parent = self._parent_id(item)
+        if self.lazy:
+            self._register(item)
+            if not parent or int(parent) in self._populated:
+                self._add_item(parent, item)
+        elif isinstance(item, Directory):
+            item_id = self._insert(parent, item)
+            self._add_directory(item, item_id)
+        else:
+            self._data[item.ref_id] = item
+            self._insert(parent, item)
+            self._duration += int(item.duration)
+            self._num_songs += 1
+        if self._matches is not None:
+            self.apply_filter()
+        self._update_footer()
+
     def add_song(self, song: Song) -> None:
         """Add a song to this panel"""
         self._data[song.ref_id] = song
-        self.tree.insert('', 'end', str(song.ref_id),
-                         values=song.pick(self.COLUMNS))
+        self._insert('', song)
         self._duration += int(song.duration)
         self._num_songs += 1
+        if self._matches is not None:
+            self.apply_filter()
         self._update_footer()
 
     def clear(self):
@@ -108,6 +287,11 @@ class SongsPanel(Panel):
         self._duration = Duration(0)
         self._num_songs = 0
         self._data = {}
+        self._tree_parent = {}
+        self._filtered = set()
+        self._roots = set()
+        self._populated = set()
+        self._pending.clear()
 
     def hide_song(self, song: Song, update: bool = True) -> None:
         """
@@ -116,7 +300,9 @@ class SongsPanel(Panel):
         """
         _ = self._data[song.ref_id]
         self._hidden.add(song.ref_id)
-        self.tree.detach(str(song.ref_id))
+        self._filtered.discard(song.ref_id)
+        if song.ref_id in self._tree_parent:
+            self.tree.detach(str(song.ref_id))
         self._duration -= int(song.duration)
         self._num_songs -= 1
         if update:
@@ -134,18 +320,29 @@ class SongsPanel(Panel):
         @raises KeyError if song not in this panel
         """
         self._hidden.remove(song.ref_id)
-        if song._parent is not None:
-            parent = str(cast(Directory, song._parent).ref_id)
-            if int(parent) not in self._data:
-                parent = ''
+        # a song that has not been added to the tree yet will be added
+        # when its directory is opened
+        parent = self._tree_parent.get(song.ref_id)
+        if parent is None:
+            pass
+        elif self._matches is not None and song.ref_id not in self._matches:
+            # keep it hidden until the search query changes
+            self._filtered.add(song.ref_id)
         else:
-            parent = ''
+            self._restore_item(song, parent)
+        self._duration += int(song.duration)
+        self._num_songs += 1
+        if update:
+            self._update_footer()
+
+    def _restore_item(self, song: Song, parent: str) -> None:
+        """re-attach a hidden song to the tree, in its sorted position"""
         songs: List[Union[Song, Directory]] = []
         if self.tree.exists(parent):
-            songs = [self._data[int(rid)] for rid in self.tree.get_children(parent)]
+            songs = [self._data[int(rid)] for rid in self._children(parent)]
         songs.append(song)
         column, reverse = self._sorting
-        songs.sort(key=lambda s: getattr(s, column), reverse=reverse)
+        songs.sort(key=lambda s: s.sort_key(column), reverse=reverse)
         index: int = 0
         for item in songs:
             if item.ref_id == song.ref_id:
@@ -156,13 +353,7 @@ class SongsPanel(Panel):
         except tk.TclError as err:
             print(err)
             print(song.ref_id, parent, index)
-            self.tree.insert(parent, 'end', str(song.ref_id),
-                             values=song.pick(self.COLUMNS))
-
-        self._duration += int(song.duration)
-        self._num_songs += 1
-        if update:
-            self._update_footer()
+            self._insert(parent, song)
 
     def remove_song(self, song: Song, update: bool = True) -> None:
         """
@@ -170,7 +361,10 @@ class SongsPanel(Panel):
         @raises KeyError if song not in this panel
         """
         del self._data[song.ref_id]
-        self.tree.delete(str(song.ref_id))
+        self._tree_parent.pop(song.ref_id, None)
+        self._filtered.discard(song.ref_id)
+        if self.tree.exists(str(song.ref_id)):
+            self.tree.delete(str(song.ref_id))
         self._duration -= int(song.duration)
         self._num_songs -= 1
         if update:
@@ -183,7 +377,11 @@ class SongsPanel(Panel):
         @raises KeyError if directory not in this panel
         """
         del self._data[directory.ref_id]
-        self.tree.delete(str(directory.ref_id))
+        self._tree_parent.pop(directory.ref_id, None)
+        self._filtered.discard(directory.ref_id)
+        self._populated.discard(directory.ref_id)
+        if self.tree.exists(str(directory.ref_id)):
+            self.tree.delete(str(directory.ref_id))
         for sub_dir in directory.subdirectories:
             try:
                 self.remove_directory(sub_dir, False)
@@ -216,6 +414,74 @@ class SongsPanel(Panel):
             duration=Duration(self._duration).format())
         self.footer.config(text=txt)
 
+    def set_search_index(self, index: Optional[SongIndex]) -> None:
+        """set the index used by the search box"""
+        self.search_index = index
+        self.apply_filter()
+
+    def _on_search_changed(self, *args) -> None: #pylint: disable=unused-argument
+        """called when the text in the search box is modified"""
+        if self._search_after is not None:
+            self.frame.after_cancel(self._search_after)
+        self._search_after = self.frame.after(self.SEARCH_DELAY, self.apply_filter)
+
+    def apply_filter(self) -> None:
+        """
+        Only show the songs that match the text in the search box.
+        Only the tree items whose visibility has changed since the
+        previous search are detached or re-attached.
+        """
+        self._search_after = None
+        query = self.search_text.get().strip()
+        hide: Set[int] = set()
+        if self.search_index is None or not query:
+            self._matches = None
+            self._visible = None
+        else:
+            self._matches = self.search_index.search(query)
+            self._visible = visible = set(self._matches)
+            opened: List[Directory] = []
+            for ref_id in self._matches:
+                # make sure every directory above a match is visible
+                chain: List[Directory] = []
+                parent_id = self._parent_id(self._data[ref_id]) if ref_id in self._data else ''
+                while parent_id and int(parent_id) not in visible:
+                    directory = cast(Directory, self._data[int(parent_id)])
+                    visible.add(directory.ref_id)
+                    chain.append(directory)
+                    parent_id = self._parent_id(directory)
+                # outermost directory first, so that it is in the tree
+                # before its contents are added
+                chain.reverse()
+                opened += chain
+            hide = set(self._tree_parent.keys()) - visible - self._hidden
+            for directory in opened:
+                if self.lazy:
+                    self._populate(directory)
+                if directory.ref_id in self._tree_parent:
+                    self.tree.item(str(directory.ref_id), open=True)
+        detach = hide - self._filtered
+        reattach = self._filtered - hide
+        self._filtered = hide
+        if detach:
+            self.tree.detach(*[str(ref_id) for ref_id in detach])
+        self._reattach(reattach)
+
+    def _reattach(self, ref_ids: Iterable[int]) -> None:
+        """
+        re-attach tree items that were detached by apply_filter(), and
+        then sort each level of the tree that has changed
+        """
+        levels: Dict[str, List[int]] = {}
+        for ref_id in ref_ids:
+            levels.setdefault(self._tree_parent[ref_id], []).append(ref_id)
+        column, reverse = self._sorting
+        for parent, items in levels.items():
+            for ref_id in items:
+                self.tree.move(str(ref_id), parent, 'end')
+            if column:
+                self._sort_children(parent, column, reverse)
+
     def sort(self, column: Union[str, Tuple[str]], reverse: bool = False) -> None:
         """
         Sort whole tree.
@@ -239,21 +505,25 @@ class SongsPanel(Panel):
         Sort specified directory level and then any children of that
         level.
         """
-        # create tuple of the value of selected column + its ID for
-        # each item at this level of the tree
         has_children = False
-        pairs: List[Tuple[str, str]] = []
-        for ref_id in self.tree.get_children(parent):
-            value = Song.clean(self.tree.set(ref_id, column)).lower()
-            pairs.append((value, ref_id,))
-            children = self.tree.get_children(ref_id)
+        for ref_id in self._children(parent):
+            children = self._children(ref_id)
             if children:
                 self._sort_level(ref_id, column, reverse)
                 has_children = True
 
         if has_children and column != 'filename':
             return
+        self._sort_children(parent, column, reverse)
 
+    def _sort_children(self, parent: str, column: str, reverse: bool) -> None:
+        """sort the items that are directly below parent"""
+        # create tuple of the sort key of selected column + its ID for
+        # each item at this level of the tree
+        pairs: List[Tuple[str, str]] = [
+            (self._data[int(ref_id)].sort_key(column), ref_id,)
+            for ref_id in self._children(parent)
+        ]
         pairs.sort(reverse=reverse)
 
         # rearrange items into sorted positions
@@ -275,7 +545,7 @@ class SongsPanel(Panel):
             if focus_elt:
                 ref_ids = [focus_elt]
             else:
-                ref_ids = self.tree.get_children()
+                ref_ids = self._children('')
         selections: List[Song] = []
         for rid in map(int, ref_ids):
             item = self._data[rid]
@@ -288,7 +558,7 @@ class SongsPanel(Panel):
     def all_songs(self) -> List[Song]:
         """get list of all songs in this panel"""
         songs: List[Song] = []
-        for rid in map(int, self.tree.get_children()):
+        for rid in map(int, self._children('')):
             item = self._data[rid]
             if isinstance(item, Directory):
                 songs += cast(Directory, item).get_songs(rid)
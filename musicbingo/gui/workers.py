@@ -12,10 +12,13 @@ from musicbingo.clips import ClipGenerator
 from musicbingo.directory import Directory
 from musicbingo.docgen import DocumentFactory
 from musicbingo.generator import GameGenerator
+from musicbingo.libraryindex import LibraryIndex
 from musicbingo.mp3 import MP3Factory
 from musicbingo.options import GameMode, Options
+from musicbingo.playhistory import PlayHistory
 from musicbingo.progress import Progress
 from musicbingo.song import Duration, Song
+from musicbingo.songindex import SongIndex
 
 class BackgroundWorker(ABC):
     """Base class for work that is performed in a background thread"""
@@ -43,7 +46,10 @@ class BackgroundWorker(ABC):
 
 
 class SearchForClips(BackgroundWorker):
-    """worker for running Directory.search()"""
+    """
+    worker for running Directory.search() and building the SongIndex
+    used by the search box
+    """
 
     #pylint: disable=arguments-differ
     def run(self, clipdir: Path) -> None:  # type: ignore
@@ -53,12 +59,21 @@ class SearchForClips(BackgroundWorker):
         This function runs in its own thread
         """
         mp3parser = MP3Factory.create_parser()
+        index = LibraryIndex(self.options.library_index_filename())
         clips = Directory(None, 1, clipdir, mp3parser,
-                          self.progress)
+                          self.progress, index)
         self.progress.text = 'Searching for clips'
         self.progress.pct = 0.0
-        clips.search()
-        self.result = clips
+        try:
+            clips.parallel_search()
+        finally:
+            # the index is used by DirectoryWatcher when in watch mode
+            if not self.options.library.watch:
+                index.close()
+        self.progress.text = 'Indexing songs'
+        song_index = SongIndex()
+        song_index.add_directory(clips)
+        self.result = (clips, song_index)
 
 class GenerateBingoGame(BackgroundWorker):
     """worker for generating a bingo game"""
@@ -68,8 +83,10 @@ class GenerateBingoGame(BackgroundWorker):
         """
         Creates MP3 file and PDF files.
         """
-        mp3editor = MP3Factory.create_editor()
-        docgen = DocumentFactory.create_generator('pdf')
+        mp3editor = MP3Factory.create_editor(
+            workers=self.options.decode_workers,
+            lookahead=self.options.decode_lookahead)
+        docgen = DocumentFactory.create_generator(self.options.doc_generator)
         gen = GameGenerator(self.options, mp3editor, docgen,
                             self.progress)
         try:
@@ -77,6 +94,11 @@ class GenerateBingoGame(BackgroundWorker):
             if self.progress.abort:
                 self.progress.text = 'Aborted generation'
             elif self.options.mode == GameMode.BINGO:
+                history = PlayHistory(self.options.play_history_filename())
+                try:
+                    history.add_game(self.options.game_id, game_songs)
+                finally:
+                    history.close()
                 self.progress.text = f"Finished Generating Bingo Game: {self.options.game_id}"
             else:
                 self.progress.text = "Finished Generating Bingo Quiz"
@@ -93,7 +115,9 @@ class GenerateClips(BackgroundWorker):
         """Generate all clips for all selected Songs
         This function runs in its own thread
         """
-        mp3editor = MP3Factory.create_editor()
+        mp3editor = MP3Factory.create_editor(
+            workers=self.options.decode_workers,
+            lookahead=self.options.decode_lookahead)
         gen = ClipGenerator(self.options, mp3editor, self.progress)
         self.result = gen.generate(songs)
 
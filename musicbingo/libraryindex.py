@@ -0,0 +1,280 @@
+"""
+Index of the metadata of every MP3 file in the song library, stored in
+an SQLite database.
+"""
+
+import json
+import os
+from pathlib import Path
+import sqlite3
+import threading
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from musicbingo.song import Duration, Metadata, Song
+
+class DirectoryListing(NamedTuple):
+    """
+    The contents of a directory, as recorded by update_directory().
+    Each song and sub-directory is stored with its position in the
+    directory.
+    """
+    songs: Dict[str, Tuple[int, Metadata]]
+    subdirectories: Dict[str, int]
+
+class LibraryIndex:
+    """
+    Stores the Metadata of every MP3 file that has been parsed.
+    Each entry is keyed by the file's path, size and modification time,
+    so that a file that is replaced is parsed again.
+    Titles and artists are stored after being normalised by
+    Song.normalise(), along with their sort keys, so that loading a song
+    from the index does not need to clean up its title again.
+    The modification time and contents of every directory is also
+    recorded, so that a directory that has not changed can be loaded
+    without listing its contents or checking any of its files.
+    It is safe to use the index from multiple threads.
+    """
+
+    # version number of the current database schema
+    VERSION: int = 3
+
+    SCHEMA = [
+        '''CREATE TABLE IF NOT EXISTS songs (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            artist TEXT NOT NULL,
+            album TEXT NOT NULL,
+            duration INTEGER NOT NULL
+        )''',
+        # directories whose songs.json cache has already been imported
+        '''CREATE TABLE IF NOT EXISTS json_imports (
+            path TEXT PRIMARY KEY
+        )''',
+        '''CREATE TABLE IF NOT EXISTS directories (
+            path TEXT PRIMARY KEY,
+            mtime_ns INTEGER NOT NULL,
+            entry_count INTEGER NOT NULL
+        )''',
+    ]
+
+    # changes needed to convert a database from each older version
+    MIGRATIONS: Dict[int, List[str]] = {
+        0: [
+            "ALTER TABLE songs ADD COLUMN directory TEXT NOT NULL DEFAULT ''",
+            'CREATE INDEX IF NOT EXISTS songs_directory ON songs (directory)',
+        ],
+        1: [
+            "ALTER TABLE songs ADD COLUMN title_key TEXT NOT NULL DEFAULT ''",
+            "ALTER TABLE songs ADD COLUMN artist_key TEXT NOT NULL DEFAULT ''",
+        ],
+        2: [
+            # JSON encoded positions of the songs and sub-directories
+            "ALTER TABLE directories ADD COLUMN listing TEXT NOT NULL DEFAULT ''",
+        ],
+    }
+
+    def __init__(self, filename: Path) -> None:
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(filename), check_same_thread=False)
+        with self._lock:
+            for sql in self.SCHEMA:
+                self._conn.execute(sql)
+            self._upgrade()
+            self._conn.commit()
+
+    def _upgrade(self) -> None:
+        """convert the database schema to the current version"""
+        version = self._conn.execute('PRAGMA user_version').fetchone()[0]
+        if version >= self.VERSION:
+            return
+        while version < self.VERSION:
+            for sql in self.MIGRATIONS[version]:
+                self._conn.execute(sql)
+            version += 1
+        rows = self._conn.execute("SELECT path FROM songs WHERE directory=''").fetchall()
+        self._conn.executemany('UPDATE songs SET directory=? WHERE path=?',
+                               [(str(Path(path).parent), path) for path, in rows])
+        rows = self._conn.execute(
+            "SELECT path, title, artist FROM songs WHERE title_key=''").fetchall()
+        updates = []
+        for path, title, artist in rows:
+            mdata = Song.normalise(Metadata(title=title, artist=artist))
+            updates.append((mdata.title, mdata.artist, mdata.title_key,
+                            mdata.artist_key, path))
+        self._conn.executemany(
+            'UPDATE songs SET title=?, artist=?, title_key=?, artist_key=? ' +
+            'WHERE path=?', updates)
+        self._conn.execute(f'PRAGMA user_version={self.VERSION}')
+
+    def lookup(self, filename: Path, fstats: os.stat_result) -> Optional[Metadata]:
+        """
+        Find the metadata of an MP3 file.
+        Returns None if the file is not in the index, or it has changed
+        since it was added to the index.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT title, artist, album, duration, title_key, artist_key ' +
+                'FROM songs WHERE path=? AND size=? AND mtime_ns=?',
+                (str(filename), fstats.st_size, fstats.st_mtime_ns)).fetchone()
+        if row is None:
+            return None
+        return self._metadata(filename, *row)
+
+    @staticmethod
+    def _metadata(filename: Path, title: str, artist: str, album: str,
+                  duration: int, title_key: str, artist_key: str) -> Metadata:
+        """create a Metadata object from one row of the songs table"""
+        return Metadata(title=title, artist=artist, album=album,
+                        duration=Duration(duration), filename=filename.name,
+                        filepath=filename, title_key=title_key,
+                        artist_key=artist_key)
+
+    def directory_listing(self, directory: Path,
+                          mtime_ns: int) -> Optional[DirectoryListing]:
+        """
+        Get the contents of a directory, if it has the same modification
+        time as when update_directory() was last called for it.
+        Returns None if the directory has changed, or is not in the index.
+        Only the directory's own entries are checked, not the contents
+        of its sub-directories. A file that is modified without being
+        replaced does not change its directory, so is not detected.
+        """
+        dirname = str(directory)
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT mtime_ns, listing FROM directories WHERE path=?',
+                (dirname,)).fetchone()
+            if row is None or row[0] != mtime_ns or not row[1]:
+                return None
+            rows = self._conn.execute(
+                'SELECT path, title, artist, album, duration, title_key, ' +
+                'artist_key FROM songs WHERE directory=?', (dirname,)).fetchall()
+        try:
+            listing = json.loads(row[1])
+        except ValueError:
+            return None
+        metadata = {Path(item[0]).name: self._metadata(Path(item[0]), *item[1:])
+                    for item in rows}
+        songs: Dict[str, Tuple[int, Metadata]] = {}
+        for name, position in listing['songs'].items():
+            if name not in metadata:
+                return None
+            songs[name] = (position, metadata[name])
+        return DirectoryListing(songs=songs, subdirectories=listing['subdirectories'])
+
+    def update_directory(self, directory: Path, mtime_ns: int,
+                         entry_count: int, songs: Dict[str, int],
+                         subdirectories: Dict[str, int]) -> None:
+        """
+        Record the current state of a directory.
+        "songs" and "subdirectories" give the position in the directory
+        of each song and sub-directory, keyed by filename.
+        Any songs in this directory that are not in "songs" are removed
+        from the index, as are all directories below this directory that
+        are not in "subdirectories".
+        """
+        dirname = str(directory)
+        prefix = dirname + os.sep
+        # every path that starts with prefix is less than this
+        prefix_end = dirname + chr(ord(os.sep) + 1)
+        keep_songs = {str(directory / name) for name in songs}
+        keep_dirs = set(subdirectories)
+        listing = json.dumps({'songs': songs, 'subdirectories': subdirectories})
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO directories ' +
+                '(path, mtime_ns, entry_count, listing) VALUES (?, ?, ?, ?)',
+                (dirname, mtime_ns, entry_count, listing))
+            rows = self._conn.execute('SELECT path FROM songs WHERE directory=?',
+                                      (dirname,)).fetchall()
+            self._conn.executemany('DELETE FROM songs WHERE path=?',
+                                   [row for row in rows if row[0] not in keep_songs])
+            for table, column in [('songs', 'directory'), ('directories', 'path')]:
+                rows = self._conn.execute(
+                    f'SELECT DISTINCT {column} FROM {table} ' +
+                    f'WHERE {column} >= ? AND {column} < ?',
+                    (prefix, prefix_end)).fetchall()
+                removed = [row for row in rows
+                           if row[0][len(prefix):].split(os.sep)[0] not in keep_dirs]
+                self._conn.executemany(f'DELETE FROM {table} WHERE {column}=?', removed)
+
+    def store(self, filename: Path, fstats: os.stat_result,
+              metadata: Metadata) -> None:
+        """add or replace the metadata of an MP3 file"""
+        metadata = Song.normalise(metadata)
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO songs ' +
+                '(path, size, mtime_ns, title, artist, album, duration, directory, ' +
+                'title_key, artist_key) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (str(filename), fstats.st_size, fstats.st_mtime_ns,
+                 metadata.title, metadata.artist, metadata.album,
+                 int(metadata.duration), str(filename.parent),
+                 metadata.title_key, metadata.artist_key))
+
+    def import_json_cache(self, directory: Path, cache_filename: str) -> None:
+        """
+        Add the contents of an old songs.json cache file to the index.
+        Each cache file is only imported once. A cache file that cannot
+        be read is reported and skipped, so the songs in that directory
+        are parsed instead.
+        """
+        dirname = str(directory)
+        with self._lock:
+            row = self._conn.execute('SELECT path FROM json_imports WHERE path=?',
+                                     (dirname,)).fetchone()
+        if row is not None:
+            return
+        cache_file = directory / cache_filename
+        if cache_file.exists():
+            try:
+                with cache_file.open('r', encoding='utf-8') as cfn:
+                    contents = json.load(cfn)
+                self._import_json_items(directory, contents)
+            except (OSError, ValueError, KeyError, TypeError, AttributeError) as err:
+                print(f'Error importing {cache_file}: {err}')
+        with self._lock:
+            self._conn.execute('INSERT INTO json_imports (path) VALUES (?)',
+                               (dirname,))
+
+    def _import_json_items(self, directory: Path, contents: List[Dict]) -> None:
+        """add the songs from a songs.json cache file to the index"""
+        for item in contents:
+            filename = directory / item['filename']
+            try:
+                fstats = os.stat(str(filename))
+            except OSError:
+                continue
+            mdata = Song.normalise(Metadata(
+                title=item['title'], artist=item['artist'],
+                title_key=item.get('title_key', ''),
+                artist_key=item.get('artist_key', '')))
+            with self._lock:
+                self._conn.execute(
+                    'INSERT OR IGNORE INTO songs ' +
+                    '(path, size, mtime_ns, title, artist, album, duration, ' +
+                    'directory, title_key, artist_key) ' +
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (str(filename), fstats.st_size, fstats.st_mtime_ns,
+                     mdata.title, mdata.artist, item.get('album', ''),
+                     int(item.get('duration', 0)), str(directory),
+                     mdata.title_key, mdata.artist_key))
+
+    def commit(self) -> None:
+        """write all changes to the database file"""
+        with self._lock:
+            self._conn.commit()
+
+    def close(self) -> None:
+        """commit any changes and close the database"""
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM songs').fetchone()[0]
@@ -0,0 +1,103 @@
+"""
+Bounded in-memory cache that removes the least recently used items
+"""
+
+from collections import OrderedDict
+import threading
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+class LRUCache:
+    """
+    Least recently used cache that records how often it was able to
+    provide a value.
+    The size of the cache is limited by the total size of the items it
+    contains. By default every item has a size of one, so the limit is
+    the number of items, or a function can be provided that calculates
+    the size of each item.
+    When the cache is full, the items that have not been used for the
+    longest time are removed.
+    It is safe to use the cache from multiple threads.
+    """
+
+    def __init__(self, max_size: int,
+                 sizeof: Optional[Callable[[Any], int]] = None) -> None:
+        if max_size < 1:
+            raise ValueError(f'Invalid cache size {max_size}')
+        self.max_size = max_size
+        self.sizeof = sizeof
+        self.hits: int = 0
+        self.misses: int = 0
+        self._size: int = 0
+        self._lock = threading.Lock()
+        self._items = OrderedDict() # type: OrderedDict[Hashable, Tuple[Any, int]]
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """get an item from the cache, or None if not in the cache"""
+        with self._lock:
+            try:
+                value, _ = self._items[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """
+        Add an item to the cache.
+        Items that are larger than the whole cache are not stored.
+        """
+        size = 1 if self.sizeof is None else self.sizeof(value)
+        if size > self.max_size:
+            return
+        with self._lock:
+            self._remove(key)
+            self._items[key] = (value, size)
+            self._size += size
+            while self._size > self.max_size:
+                _, (_, old_size) = self._items.popitem(last=False)
+                self._size -= old_size
+
+    def remove(self, key: Hashable) -> None:
+        """remove an item from the cache (if present)"""
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key: Hashable) -> None:
+        """remove an item from the cache, caller must hold the lock"""
+        try:
+            _, size = self._items.pop(key)
+            self._size -= size
+        except KeyError:
+            pass
+
+    def clear(self) -> None:
+        """remove every item and reset the statistics"""
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+            self.hits = 0
+            self.misses = 0
+
+    @property
+    def size(self) -> int:
+        """total size of all items in the cache"""
+        return self._size
+
+    @property
+    def hit_rate(self) -> float:
+        """percentage of calls to get() that found the item in the cache"""
+        total = self.hits + self.misses
+        if total == 0:
+            return 0.0
+        return 100.0 * self.hits / float(total)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __repr__(self) -> str:
+        return (f'{self.__class__.__name__}(items={len(self)}, ' +
+                f'size={self._size}/{self.max_size}, ' +
+                f'hits={self.hits}, misses={self.misses}, ' +
+                f'hit_rate={self.hit_rate:0.1f}%)')
@@ -0,0 +1,22 @@
+"""
+In-memory cache of decoded audio
+"""
+
+from pydub import AudioSegment # type: ignore
+
+from musicbingo.lrucache import LRUCache
+
+class DecodeCache(LRUCache):
+    """
+    Least recently used cache of decoded audio.
+    The size of the cache is limited by the total number of bytes of
+    the audio it contains, rather than by the number of items.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        super(DecodeCache, self).__init__(max_bytes, sizeof=self.audio_size)
+
+    @staticmethod
+    def audio_size(seg: AudioSegment) -> int:
+        """number of bytes used by the samples of the given audio"""
+        return len(seg.raw_data)
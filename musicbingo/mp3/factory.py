@@ -1,6 +1,6 @@
 """factory method for creating an MP3 engine"""
 
-from typing import List, Optional, Type
+from typing import Any, List, Optional, Type
 
 from musicbingo.mp3.editor import MP3Editor
 from musicbingo.mp3.parser import MP3Parser
@@ -24,11 +24,13 @@ class MP3Factory:
     """Class for creating MP3Editor and MP3Parser instances"""
 
     @classmethod
-    def create_editor(cls, editor: Optional[str] = None) -> MP3Editor:
+    def create_editor(cls, editor: Optional[str] = None,
+                      **kwargs: Any) -> MP3Editor:
         """
         Create an MP3Editor.
         If editor==None, the factory will pick the first one that
         is supported.
+        Any keyword arguments are passed to the constructor of the editor.
         """
         editor_class: Optional[Type[MP3Editor]] = None
         if editor is None:
@@ -41,7 +43,7 @@ class MP3Factory:
                     break
         if editor_class is None:
             raise NotImplementedError(f'Unknown editor {editor}')
-        return editor_class()
+        return editor_class(**kwargs)
 
     @classmethod
     def create_parser(cls, parser: Optional[str] = None) -> MP3Parser:
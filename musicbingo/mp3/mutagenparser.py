@@ -2,10 +2,11 @@
 Implementation of the MP3Parser interface using mutagen
 """
 
-import io
 from pathlib import Path
 
+from mutagen import MutagenError # type: ignore
 from mutagen.easyid3 import EasyID3 # type: ignore
+from mutagen.mp3 import MP3 # type: ignore
 from pydub import AudioSegment # type: ignore
 
 from musicbingo.mp3.parser import MP3Parser
@@ -19,16 +20,15 @@ class MutagenParser(MP3Parser):
         """Extract the metadata from an MP3 file"""
         #print(filename)
         try:
-            mp3_data = io.BytesIO(open(filename, 'rb').read())
-        except IOError as err:
-            raise InvalidMP3Exception(err)
-        mp3info = EasyID3(mp3_data)
+            mp3info = MP3(str(filename), ID3=EasyID3)
+        except (IOError, MutagenError) as err:
+            raise InvalidMP3Exception(err) from err
         try:
             artist = mp3info["artist"]
             title = mp3info["title"]
         except KeyError as err:
             raise InvalidMP3Exception(
-                f"File: {filename.name} does not both title and artist info")
+                f"File: {filename.name} does not both title and artist info") from err
         if len(artist) == 0 or len(title) == 0:
             raise InvalidMP3Exception(
                 f"File: {filename.name} does not both title and artist info")
@@ -42,8 +42,26 @@ class MutagenParser(MP3Parser):
             metadata["album"] = str(mp3info["album"][0])
         except KeyError:
             metadata["album"] = filename.parent.name
-        del mp3info
-        mp3_data.seek(0)
         # duration is in milliseconds
-        metadata["duration"] = len(AudioSegment.from_mp3(mp3_data))
+        metadata["duration"] = self.duration(filename, mp3info)
+        del mp3info
         return Metadata(**metadata) # type: ignore
+
+    @staticmethod
+    def duration(filename: Path, mp3info: MP3) -> int:
+        """
+        Get the duration (in milliseconds) of an MP3 file.
+        mutagen calculates the duration from the MPEG frame headers and
+        the Xing/VBRI/LAME header (if present), which only needs the
+        start of the audio data to be read. If mutagen is not confident
+        in its result (or could not find any MPEG frames), the file is
+        decoded to find its duration.
+        """
+        info = mp3info.info
+        if info is not None and info.length > 0 and not info.sketchy:
+            return int(round(info.length * 1000.0))
+        try:
+            return len(AudioSegment.from_file(str(filename), format="mp3",
+                                              codec="mp3"))
+        except Exception as err: # pylint: disable=broad-except
+            raise InvalidMP3Exception(err) from err
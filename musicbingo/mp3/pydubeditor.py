@@ -2,7 +2,14 @@
 Implementation of the MP3Engine interface using mutagen and pydub
 """
 
-from typing import Optional
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import itertools
+import os
+import subprocess
+import tempfile
+import threading
+from typing import Deque, Dict, Generator, Hashable, IO, List, Optional
 
 from pydub import AudioSegment, playback, utils # type: ignore
 
@@ -12,70 +19,204 @@ try:
 except ImportError:
     USE_PYAUDIO = False
 
+from musicbingo.mp3.cache import DecodeCache
 from musicbingo.mp3.editor import MP3Editor, MP3File, MP3FileWriter
+from musicbingo.mp3.exceptions import InvalidMP3Exception
 from musicbingo.progress import Progress
 from musicbingo.song import Song
 
 class PydubEditor(MP3Editor):
     """MP3Editor implementation using pydub"""
+
+    # format of the PCM audio produced when decoding an MP3 file
+    SAMPLE_RATE: int = 44100
+    CHANNELS: int = 2
+    SAMPLE_WIDTH: int = 2
+
+    # amount of audio (in milliseconds) to decode before the start of a
+    # clip, so that the MP3 decoder has the frames that the first frame
+    # of the clip depends upon (the "bit reservoir")
+    PREROLL: int = 100
+
+    # default maximum amount of decoded audio to keep in memory
+    DEFAULT_CACHE_SIZE: int = 64 * 1024 * 1024
+
+    def __init__(self, cache_size: int = DEFAULT_CACHE_SIZE,
+                 streaming: bool = True, workers: Optional[int] = None,
+                 lookahead: Optional[int] = None) -> None:
+        """
+        cache_size - maximum number of bytes of decoded audio to keep,
+                     so that repeated clips (such as the transition
+                     between songs) are only decoded once
+        streaming - if True, each clip is passed directly to the MP3
+                    encoder as soon as it has been decoded, rather than
+                    creating the complete output in memory
+        workers - number of clips to decode at the same time
+                  (None or 0 for the number of CPUs)
+        lookahead - maximum number of clips to decode ahead of the clip
+                    that is being added to the output file
+                    (None or 0 for twice the number of workers)
+        """
+        self.cache = DecodeCache(cache_size)
+        self.streaming = streaming
+        if not workers:
+            workers = os.cpu_count() or 1
+        self.workers = max(1, workers)
+        if not lookahead:
+            lookahead = 2 * self.workers
+        self.lookahead = max(1, lookahead)
+        # sections that are currently being decoded, so that a section
+        # that is requested again before it is in the cache (such as the
+        # transition between songs) is only decoded once
+        self._in_flight: Dict[Hashable, Future] = {}
+        self._in_flight_lock = threading.Lock()
+
     def _generate(self, destination: MP3FileWriter,
                   progress: Progress) -> None:
         """generate output file, combining all input files"""
+        dest_dir = destination.filename.parent
+        if not dest_dir.exists():
+            dest_dir.mkdir(parents=True)
+        if self.streaming:
+            self._generate_streaming(destination, progress)
+        else:
+            self._generate_in_memory(destination, progress)
+
+    def _generate_in_memory(self, destination: MP3FileWriter,
+                            progress: Progress) -> None:
+        """
+        generate output file by combining all input files in memory
+        and then encoding the result
+        """
         output: Optional[AudioSegment] = None
         num_files = float(len(destination._files))
-        for index, mp3file in enumerate(destination._files, 1):
-            progress.pct = 50.0 * index / num_files
-            progress.text = f'Adding {mp3file.filename.name}'
-            if progress.abort:
-                return
-            seg = AudioSegment.from_mp3(str(mp3file.filename))
-            if mp3file.start is not None:
-                if mp3file.end is not None:
-                    seg = seg[mp3file.start:mp3file.end]
+        segments = self._decode_ahead(destination._files)
+        try:
+            for index, mp3file in enumerate(destination._files, 1):
+                progress.pct = 50.0 * index / num_files
+                progress.text = f'Adding {mp3file.filename.name}'
+                if progress.abort:
+                    return
+                seg = next(segments)
+                if output is None:
+                    output = seg
                 else:
-                    seg = seg[mp3file.start:]
-            elif mp3file.end is not None:
-                seg = seg[:mp3file.end]
-            if mp3file.headroom is not None:
-                seg = seg.normalize(mp3file.headroom)
-            if output is None:
-                output = seg
-            else:
-                output += seg
-        tags = None
-        if destination._metadata is not None:
-            tags = {
-                "artist": Song.clean(destination._metadata.artist),
-                "title": Song.clean(destination._metadata.title)
-            }
-            if destination._metadata.album:
-                tags["album"] = Song.clean(destination._metadata.album)
+                    output += seg
+        finally:
+            segments.close()
         assert output is not None
         progress.text = f'Encoding MP3 file "{destination.filename.name}"'
         progress.pct = 50.0
         if progress.abort:
             return
-        dest_dir = destination.filename.parent
-        if not dest_dir.exists():
-            dest_dir.mkdir(parents=True)
         output.export(str(destination.filename), format="mp3",
-                      bitrate=destination.bitrate, tags=tags)
+                      bitrate=destination.bitrate,
+                      tags=self._tags(destination))
         progress.pct = 100.0
 
+    def _generate_streaming(self, destination: MP3FileWriter,
+                            progress: Progress) -> None:
+        """
+        generate output file by passing each input file to an ffmpeg
+        process that encodes the output file.
+        The complete output is never held in memory. At most
+        self.lookahead decoded input files are waiting to be encoded,
+        in addition to the decoded files kept in self.cache. Use
+        workers=1 to only decode one file at a time.
+        """
+        cmd: List[str] = [
+            AudioSegment.converter, '-nostdin', '-v', 'error', '-y',
+            '-f', 's16le', '-ar', str(self.SAMPLE_RATE),
+            '-ac', str(self.CHANNELS), '-i', '-',
+            '-f', 'mp3', '-b:a', destination.bitrate,
+        ]
+        tags = self._tags(destination)
+        if tags is not None:
+            cmd += ['-id3v2_version', '3']
+            for key, value in tags.items():
+                cmd += ['-metadata', f'{key}={value}']
+        cmd.append(str(destination.filename))
+        num_files = float(len(destination._files))
+        segments = self._decode_ahead(destination._files)
+        with tempfile.TemporaryFile() as errors, \
+                self._start_encoder(cmd, errors) as proc:
+            stdin = proc.stdin
+            assert stdin is not None
+            try:
+                for index, mp3file in enumerate(destination._files):
+                    progress.pct = 100.0 * index / num_files
+                    progress.text = f'Adding {mp3file.filename.name}'
+                    if progress.abort:
+                        break
+                    seg = next(segments)
+                    stdin.write(seg.raw_data)
+                    del seg
+                else:
+                    progress.text = f'Encoding MP3 file "{destination.filename.name}"'
+                    stdin.close()
+                    if proc.wait() == 0:
+                        progress.pct = 100.0
+                        return
+            except BrokenPipeError:
+                # ffmpeg has stopped, the reason is reported below
+                pass
+            except BaseException:
+                self._abort_encoder(proc, destination)
+                raise
+            finally:
+                segments.close()
+            self._abort_encoder(proc, destination)
+            if progress.abort:
+                return
+            errors.seek(0)
+            message = errors.read().decode('utf-8', errors='replace')
+            raise InvalidMP3Exception(
+                f'Failed to encode {destination.filename}: {message}')
+
+    @staticmethod
+    def _start_encoder(cmd: List[str], errors: IO[bytes]) -> subprocess.Popen:
+        """start the ffmpeg process that will encode the output file"""
+        try:
+            return subprocess.Popen(cmd, stdin=subprocess.PIPE,
+                                    stdout=subprocess.DEVNULL,
+                                    stderr=errors)
+        except OSError as err:
+            raise InvalidMP3Exception(
+                f'Failed to start MP3 encoder: {err}') from err
+
+    @staticmethod
+    def _abort_encoder(proc: subprocess.Popen,
+                       destination: MP3FileWriter) -> None:
+        """stop the ffmpeg encoder and delete the partial output file"""
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+        if proc.stdin is not None:
+            try:
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
+        try:
+            destination.filename.unlink()
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _tags(destination: MP3FileWriter) -> Optional[Dict[str, str]]:
+        """get the ID3 tags to add to the output file"""
+        if destination._metadata is None:
+            return None
+        tags = {
+            "artist": Song.clean(destination._metadata.artist),
+            "title": Song.clean(destination._metadata.title)
+        }
+        if destination._metadata.album:
+            tags["album"] = Song.clean(destination._metadata.album)
+        return tags
+
     def play(self, mp3file: MP3File, progress: Progress) -> None:
         """play the specified mp3 file"""
-        global USE_PYAUDIO # pylint: disable=global-statement
-
-        seg = AudioSegment.from_mp3(str(mp3file.filename))
-        if mp3file.start is not None:
-            if mp3file.end is not None:
-                seg = seg[mp3file.start:mp3file.end]
-            else:
-                seg = seg[mp3file.start:]
-        elif mp3file.end is not None:
-            seg = seg[:mp3file.end]
-        if mp3file.headroom is not None:
-            seg = seg.normalize(mp3file.headroom)
+        seg = self._decode(mp3file)
         if USE_PYAUDIO:
             self.play_with_pyaudio(seg, progress)
         else:
@@ -83,6 +224,125 @@ class PydubEditor(MP3Editor):
             # provide an easy way to abort playback
             playback.play(seg)
 
+    def _decode_ahead(self, files: List[MP3File]) -> Generator[AudioSegment, None, None]:
+        """
+        Decode each of the given files, returning them in order.
+        The decoding is performed by ffmpeg child processes, so a pool
+        of threads is used to keep up to self.workers of them running
+        at the same time, up to self.lookahead files ahead of the file
+        that is currently being used.
+        """
+        if self.workers == 1:
+            for mp3file in files:
+                yield self._decode(mp3file)
+            return
+        todo = iter(files)
+        pending: Deque[Future] = deque()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            try:
+                for mp3file in itertools.islice(todo, self.lookahead):
+                    pending.append(pool.submit(self._decode, mp3file))
+                while pending:
+                    seg = pending.popleft().result()
+                    for mp3file in itertools.islice(todo, 1):
+                        pending.append(pool.submit(self._decode, mp3file))
+                    yield seg
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def _decode(self, mp3file: MP3File) -> AudioSegment:
+        """
+        Decode the section of an MP3 file selected by mp3file.start and
+        mp3file.end, using the cache if this section has already been
+        decoded. If another thread is already decoding this section,
+        its result is used.
+        """
+        key = self._cache_key(mp3file)
+        with self._in_flight_lock:
+            seg = self.cache.get(key)
+            if seg is not None:
+                return seg
+            future = self._in_flight.get(key)
+            owner = future is None
+            if future is None:
+                future = Future()
+                self._in_flight[key] = future
+        if not owner:
+            return future.result()
+        try:
+            seg = self._decode_file(mp3file)
+            self.cache.put(key, seg)
+            future.set_result(seg)
+        except BaseException as err:
+            future.set_exception(err)
+            raise
+        finally:
+            with self._in_flight_lock:
+                del self._in_flight[key]
+        return seg
+
+    @staticmethod
+    def _cache_key(mp3file: MP3File) -> Hashable:
+        """
+        Create the key used to store a decoded section of an MP3 file.
+        The modification time of the file is included, so that a file
+        that is changed after being decoded is not taken from the cache.
+        """
+        try:
+            mtime = os.stat(str(mp3file.filename)).st_mtime_ns
+        except OSError:
+            mtime = 0
+        return (str(mp3file.filename), mtime, mp3file.start, mp3file.end,
+                mp3file.headroom)
+
+    def _decode_file(self, mp3file: MP3File) -> AudioSegment:
+        """
+        Decode the section of an MP3 file selected by mp3file.start and
+        mp3file.end.
+        ffmpeg is asked to seek to shortly before the start position
+        and to stop once it has decoded the requested duration, so only
+        the required part of the file is decoded. The PREROLL audio
+        before the start position is decoded and then discarded, as the
+        first few frames decoded after a seek are not valid.
+        """
+        cmd: List[str] = [AudioSegment.converter, '-nostdin', '-v', 'error']
+        start = 0
+        preroll = 0
+        if mp3file.start is not None:
+            start = max(0, int(mp3file.start))
+            seek = max(0, start - self.PREROLL)
+            preroll = start - seek
+            if seek > 0:
+                cmd += ['-ss', self._seconds(seek)]
+        cmd += ['-i', str(mp3file.filename)]
+        if preroll > 0:
+            cmd += ['-ss', self._seconds(preroll)]
+        if mp3file.end is not None:
+            cmd += ['-t', self._seconds(max(0, int(mp3file.end) - start))]
+        cmd += ['-f', 's16le', '-acodec', 'pcm_s16le',
+                '-ar', str(self.SAMPLE_RATE), '-ac', str(self.CHANNELS), '-']
+        try:
+            proc = subprocess.run(cmd, stdout=subprocess.PIPE,
+                                  stderr=subprocess.PIPE, check=True)
+        except (OSError, subprocess.CalledProcessError) as err:
+            msg = str(err)
+            stderr = getattr(err, 'stderr', b'')
+            if stderr:
+                msg = stderr.decode('utf-8', errors='replace')
+            raise InvalidMP3Exception(
+                f'Failed to decode {mp3file.filename}: {msg}') from err
+        seg = AudioSegment(data=proc.stdout, sample_width=self.SAMPLE_WIDTH,
+                           frame_rate=self.SAMPLE_RATE, channels=self.CHANNELS)
+        if mp3file.headroom is not None:
+            seg = seg.normalize(mp3file.headroom) # pylint: disable=no-member
+        return seg
+
+    @staticmethod
+    def _seconds(millis: int) -> str:
+        """convert milliseconds into a time value for use by ffmpeg"""
+        return f'{millis / 1000.0:.3f}'
+
     @staticmethod
     def play_with_pyaudio(seg: AudioSegment, progress: Progress) -> None:
         """use pyaudio library to play audio segment"""
@@ -15,8 +15,41 @@ class GameMode(IntEnum):
     QUIZ = auto()
     CLIP = auto()
 
+class LibraryOptions:
+    """
+    Options for the index of the song library and for the history of
+    the songs used in previous games
+    """
+
+    # names of the options, which are also their command line names
+    FIELDS = ('library_index', 'watch', 'play_history', 'exclude_games',
+              'exclude_days', 'distinct_artists')
+
+    def __init__(self,
+                 library_index: str = 'library.db',
+                 watch: bool = False,
+                 play_history: str = 'play_history.db',
+                 exclude_games: int = 0,
+                 exclude_days: int = 1,
+                 distinct_artists: bool = False) -> None:
+        self.library_index = library_index
+        self.watch = watch
+        self.play_history = play_history
+        self.exclude_games = exclude_games
+        self.exclude_days = exclude_days
+        self.distinct_artists = distinct_artists
+
+    def _asdict(self) -> Dict[str, Any]:
+        """convert LibraryOptions to a dictionary"""
+        return {key: getattr(self, key) for key in self.FIELDS}
+
+    def __repr__(self) -> str:
+        args = ', '.join(f'{key}={value!r}' for key, value in self._asdict().items())
+        return f'LibraryOptions({args})'
+
 class Options(argparse.Namespace):
     """Options used by GameGenerator"""
+    #pylint: disable=too-many-locals
     def __init__(self,
                  games_dest: str = "Bingo Games",
                  game_name_template: str = r'Game-{game_id}',
@@ -24,6 +57,7 @@ class Options(argparse.Namespace):
                  game_id: str = "",
                  title: str = "",
                  clip_directory: str = 'Clips',
+                 library: Optional[LibraryOptions] = None,
                  new_clips_dest: str = 'NewClips',
                  clip_start: str = "01:00",
                  clip_duration: int = 30,
@@ -33,6 +67,9 @@ class Options(argparse.Namespace):
                  mode: GameMode = GameMode.BINGO,
                  create_index: bool = False,
                  page_order: bool = True,
+                 doc_generator: str = 'pdf',
+                 decode_workers: int = 0,
+                 decode_lookahead: int = 0,
                  columns: int = 5,
                  rows: int = 3
                  ) -> None:
@@ -43,6 +80,9 @@ class Options(argparse.Namespace):
         self.game_id = game_id
         self.title = title
         self.clip_directory = clip_directory
+        if library is None:
+            library = LibraryOptions()
+        self.library = library
         self.new_clips_dest = new_clips_dest
         self.clip_start = clip_start
         self.clip_duration = clip_duration
@@ -52,6 +92,9 @@ class Options(argparse.Namespace):
         self.mode = mode
         self.create_index = create_index
         self.page_order = page_order
+        self.doc_generator = doc_generator
+        self.decode_workers = decode_workers
+        self.decode_lookahead = decode_lookahead
         self.columns = columns
         self.rows = rows
 
@@ -79,15 +122,33 @@ class Options(argparse.Namespace):
         basedir = Path(__file__).parents[1]
         return basedir / clip_dir
 
-    def game_destination_dir(self, game_id: Optional[str] = None) -> Path:
-        """Output directory for a Bingo game"""
+    def library_index_filename(self) -> Path:
+        """Filename of the database that stores the metadata of every song"""
+        filename = Path(self.library.library_index)
+        if not filename.is_absolute():
+            filename = Path.cwd() / filename
+        return filename
+
+    def play_history_filename(self) -> Path:
+        """Filename of the database that records the songs used in each game"""
+        filename = Path(self.library.play_history)
+        if not filename.is_absolute():
+            filename = self.games_directory() / filename
+        return filename
+
+    def games_directory(self) -> Path:
+        """Directory that contains every Bingo game"""
         games_dest = Path(self.games_dest)
         if not games_dest.is_absolute():
             games_dest = Path.cwd() / games_dest
+        return games_dest
+
+    def game_destination_dir(self, game_id: Optional[str] = None) -> Path:
+        """Output directory for a Bingo game"""
         if game_id is None:
             game_id = self.game_id
         dirname = self.game_name_template.format(game_id=game_id)
-        return games_dest / dirname
+        return self.games_directory() / dirname
 
     def mp3_output_name(self) -> Path:
         """Filename of MP3 file when generating a game"""
@@ -152,6 +213,21 @@ class Options(argparse.Namespace):
         parser.add_argument(
             "--title", dest="title", nargs='?',
             help="Title for the Bingo game [%(default)s]")
+        parser.add_argument(
+            "--library_index", nargs='?',
+            help="Database file used to store details of every song [%(default)s]")
+        parser.add_argument(
+            "--play_history", nargs='?',
+            help="Database file used to store the songs used in each game [%(default)s]")
+        parser.add_argument(
+            "--exclude_games", type=int,
+            help="Avoid songs used in this many previous games, 0 for all games [%(default)d]")
+        parser.add_argument(
+            "--exclude_days", type=int,
+            help="Avoid songs used in games from this many days, 0 for all days [%(default)d]")
+        parser.add_argument(
+            "--distinct_artists", action="store_true",
+            help="Avoid choosing random songs by the same artist [%(default)s]")
         parser.add_argument(
             "--new_clips", dest="new_clips_dest", nargs='?',
             help="Directory to store new song clips [%(default)s]")
@@ -184,18 +260,33 @@ class Options(argparse.Namespace):
         parser.add_argument(
             "--ticket-order", dest="page_order", action="store_false",
             help="Sort Bingo tickets in output by ticket number [%(default)s]")
+        parser.add_argument(
+            "--doc_generator", choices=['pdf', 'pdf-canvas', 'pdf-forms'],
+            help="Document generator used to create PDF files [%(default)s]")
+        parser.add_argument(
+            "--decode_workers", type=int,
+            help="Number of clips to decode at the same time, 0 for one per CPU [%(default)d]")
+        parser.add_argument(
+            "--decode_lookahead", type=int,
+            help="Maximum number of clips to decode ahead, 0 for twice the workers [%(default)d]")
         parser.add_argument(
             "--rows", type=int, choices=[2, 3, 4, 5],
             help="Number of rows for each Bingo ticket create [%(default)d]")
         parser.add_argument(
             "--columns", type=int, choices=[2, 3, 4, 5, 6, 7],
             help="Number of columns for each Bingo ticket create [%(default)d]")
+        parser.add_argument(
+            "--watch", action="store_true",
+            help="Watch the clip directory for added and removed songs")
         parser.add_argument(
             "clip_directory", nargs='?',
             help="Directory to search for Songs [%(default)s]")
         result = Options()
-        parser.set_defaults(**result._asdict())
+        parser.set_defaults(**result._asdict(), **result.library._asdict())
         parser.parse_args(args, namespace=result) # type: ignore
+        # move the library options into their own structure
+        result.library = LibraryOptions(**{
+            key: result.__dict__.pop(key) for key in LibraryOptions.FIELDS})
         return result
 
     def _asdict(self) -> Dict[str, Any]:
@@ -203,7 +294,7 @@ class Options(argparse.Namespace):
         retval = {
         }
         for key, value in self.__dict__.items():
-            if value is None:
+            if value is None or isinstance(value, LibraryOptions):
                 continue
             retval[key] = value
         return retval
@@ -0,0 +1,177 @@
+"""
+Index of the songs used in every Bingo game that has been generated,
+stored in an SQLite database.
+"""
+
+import datetime
+import json
+from pathlib import Path
+import sqlite3
+import threading
+from typing import Iterable, List, Optional, Set, Tuple, Union
+
+from musicbingo.song import Metadata, Song
+
+class PlayHistory:
+    """
+    Records which songs were used in each game, and when that game was
+    generated.
+    Songs are identified by their normalised artist and title, rather
+    than by their filename and duration, so that a song that has been
+    moved or re-encoded is still recognised as having been played.
+    It is safe to use the history from multiple threads.
+    """
+
+    SCHEMA = [
+        '''CREATE TABLE IF NOT EXISTS games (
+            game_id TEXT PRIMARY KEY,
+            played TEXT NOT NULL
+        )''',
+        'CREATE INDEX IF NOT EXISTS games_played ON games (played)',
+        '''CREATE TABLE IF NOT EXISTS plays (
+            game_id TEXT NOT NULL,
+            song_key TEXT NOT NULL,
+            PRIMARY KEY (game_id, song_key)
+        )''',
+        # games directories whose gameTracks.json files have been imported
+        '''CREATE TABLE IF NOT EXISTS imports (
+            path TEXT PRIMARY KEY
+        )''',
+    ]
+
+    def __init__(self, filename: Path) -> None:
+        self.filename = filename
+        self._lock = threading.Lock()
+        if not filename.parent.exists():
+            filename.parent.mkdir(parents=True)
+        self._conn = sqlite3.connect(str(filename), check_same_thread=False)
+        with self._lock:
+            for sql in self.SCHEMA:
+                self._conn.execute(sql)
+            self._conn.commit()
+
+    @staticmethod
+    def song_key(song: Union[Song, Metadata]) -> str:
+        """the identity of a song, which does not depend upon its file"""
+        if isinstance(song, Metadata):
+            song = Song.normalise(song)
+        return f'{song.artist_key}\t{song.title_key}'
+
+    def add_game(self, game_id: str, songs: Iterable[Union[Song, Metadata]],
+                 played: Optional[datetime.date] = None) -> None:
+        """record the songs used in a game"""
+        if played is None:
+            played = datetime.date.today()
+        keys = {self.song_key(song) for song in songs}
+        with self._lock:
+            self._conn.execute('DELETE FROM plays WHERE game_id=?', (game_id,))
+            self._conn.execute(
+                'INSERT OR REPLACE INTO games (game_id, played) VALUES (?, ?)',
+                (game_id, played.isoformat()))
+            self._conn.executemany(
+                'INSERT INTO plays (game_id, song_key) VALUES (?, ?)',
+                [(game_id, key) for key in keys])
+            self._conn.commit()
+
+    def import_games(self, games_dest: Path, name_template: str,
+                     tracks_filename: str) -> None:
+        """
+        Add every game in games_dest to the history, using the
+        gameTracks.json file of each game.
+        Each games directory is only imported once, so that games that
+        were generated before the history existed are included without
+        needing to scan the games directory every time. Any
+        gameTracks.json file that cannot be loaded is skipped.
+        """
+        dirname = str(games_dest)
+        with self._lock:
+            row = self._conn.execute('SELECT path FROM imports WHERE path=?',
+                                     (dirname,)).fetchone()
+        if row is not None:
+            return
+        prefix, _, suffix = name_template.partition('{game_id}')
+        if games_dest.exists():
+            for gamedir in games_dest.iterdir():
+                filename = gamedir / tracks_filename
+                if not filename.exists():
+                    continue
+                game_id = gamedir.name
+                if (game_id.startswith(prefix) and game_id.endswith(suffix) and
+                        len(game_id) > len(prefix) + len(suffix)):
+                    game_id = game_id[len(prefix):len(game_id) - len(suffix)]
+                try:
+                    songs = self._load_tracks(filename)
+                    played = datetime.date.fromtimestamp(filename.stat().st_mtime)
+                except (OSError, ValueError, TypeError, AttributeError) as err:
+                    print(f'Error importing game: {filename} - {err}')
+                    continue
+                self.add_game(game_id, songs, played)
+        with self._lock:
+            self._conn.execute('INSERT INTO imports (path) VALUES (?)',
+                               (dirname,))
+            self._conn.commit()
+
+    @staticmethod
+    def _load_tracks(filename: Path) -> List[Metadata]:
+        """
+        Load the songs of a game from its gameTracks.json file.
+        Fields that are not in Metadata are ignored, as older versions
+        used different fields (e.g. "songId").
+        """
+        with filename.open('r', encoding='utf-8') as gt_file:
+            items = json.load(gt_file)
+        fields = set(Metadata._fields)
+        return [Metadata(**{key: value for key, value in item.items() if key in fields})
+                for item in items]
+
+    def recent_songs(self, games: int = 0, days: int = 0) -> Set[str]:
+        """
+        Find the song_key of every song used in the most recent "games"
+        games that were generated in the last "days" days (including
+        today). A value of zero means no limit.
+        """
+        sql = 'SELECT game_id FROM games'
+        params: List[Union[int, str]] = []
+        if days > 0:
+            since = datetime.date.today() - datetime.timedelta(days=days - 1)
+            sql += ' WHERE played >= ?'
+            params.append(since.isoformat())
+        if games > 0:
+            sql += ' ORDER BY played DESC, rowid DESC LIMIT ?'
+            params.append(games)
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT DISTINCT song_key FROM plays ' +
+                f'WHERE game_id IN ({sql})', params).fetchall()
+        return {row[0] for row in rows}
+
+    def last_played(self, song: Union[Song, Metadata]) -> Optional[Tuple[str, datetime.date]]:
+        """find the most recent game that used the given song"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT games.game_id, played FROM plays ' +
+                'JOIN games ON games.game_id = plays.game_id ' +
+                'WHERE song_key=? ORDER BY played DESC, games.rowid DESC LIMIT 1',
+                (self.song_key(song),)).fetchone()
+        if row is None:
+            return None
+        return (row[0], datetime.datetime.strptime(row[1], '%Y-%m-%d').date())
+
+    def game_ids(self, prefix: str = '') -> Set[str]:
+        """get the ID of every game whose ID starts with prefix"""
+        pattern = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT game_id FROM games WHERE game_id LIKE ? ESCAPE '\\'",
+                (pattern + '%',)).fetchall()
+        return {row[0] for row in rows}
+
+    def close(self) -> None:
+        """close the database"""
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM games').fetchone()[0]
@@ -0,0 +1,141 @@
+"""
+Cryptographically secure random number generator that is seeded once
+and then produces its random numbers in batches.
+"""
+
+import hashlib
+import secrets
+from typing import Any, Dict, List, MutableSequence, Optional
+
+import numpy # type: ignore
+
+class SecureRandom:
+    """
+    Random number generator using SHAKE-256 as a stream cipher.
+    The generator is seeded once from the secrets library and then
+    produces a stream of random bytes in large blocks, rather than
+    asking the operating system for more entropy for every number.
+    """
+
+    SEED_SIZE: int = 32
+    BLOCK_SIZE: int = 64 * 1024
+
+    def __init__(self, seed: Optional[bytes] = None) -> None:
+        if seed is None:
+            seed = secrets.token_bytes(self.SEED_SIZE)
+        self._seed = seed
+        self._counter: int = 0
+        self._block: bytes = b''
+        self._pos: int = 0
+
+    def random_bytes(self, length: int) -> bytes:
+        """get the next "length" bytes from the random stream"""
+        chunks: List[bytes] = []
+        while length > 0:
+            if self._pos >= len(self._block):
+                self._next_block()
+            chunk = self._block[self._pos:self._pos + length]
+            self._pos += len(chunk)
+            length -= len(chunk)
+            chunks.append(chunk)
+        return b''.join(chunks)
+
+    def _next_block(self) -> None:
+        """generate the next block of the random stream"""
+        shake = hashlib.shake_256()
+        shake.update(self._seed)
+        shake.update(self._counter.to_bytes(8, 'little'))
+        self._block = shake.digest(self.BLOCK_SIZE) # pylint: disable=too-many-function-args
+        self._pos = 0
+        self._counter += 1
+
+    def randbelow(self, limit: int) -> int:
+        """
+        Return a random int in the range [0, limit).
+        Unlike below(), limit can be of any size
+        """
+        if limit <= 0:
+            raise ValueError(f'Invalid limit {limit}')
+        num_bits = limit.bit_length()
+        num_bytes = (num_bits + 7) // 8
+        shift = 8 * num_bytes - num_bits
+        while True:
+            value = int.from_bytes(self.random_bytes(num_bytes), 'little') >> shift
+            if value < limit:
+                return value
+
+    def randrange(self, start: int, end: int) -> int:
+        """Return a random int in the range [start, end)"""
+        return start + self.randbelow(end - start)
+
+    def below(self, limits: Any) -> numpy.ndarray:
+        """
+        Return an array of random ints, where each item is in the
+        range [0, limits[i]).
+        Values that would produce a biased result when using the
+        modulus of a 64 bit random number are replaced.
+        """
+        limits = numpy.asarray(limits, dtype=numpy.uint64)
+        if limits.size == 0:
+            return limits
+        max_value = numpy.uint64(0xFFFFFFFFFFFFFFFF)
+        # 2**64 % limits, calculated without needing a 65 bit number
+        excess = (max_value % limits + numpy.uint64(1)) % limits
+        threshold = max_value - excess
+        values = self._uint64_array(limits.size)
+        rejected = values > threshold
+        while rejected.any():
+            values[rejected] = self._uint64_array(int(rejected.sum()))
+            rejected = values > threshold
+        return values % limits
+
+    def _uint64_array(self, length: int) -> numpy.ndarray:
+        """create an array of random unsigned 64 bit values"""
+        return numpy.frombuffer(self.random_bytes(8 * length),
+                                dtype='<u8').astype(numpy.uint64)
+
+    def shuffle(self, items: MutableSequence[Any]) -> None:
+        """Shuffle a list in place, using the Fisher-Yates algorithm"""
+        num_items = len(items)
+        if num_items < 2:
+            return
+        offsets = self.below(numpy.arange(num_items, 1, -1, dtype=numpy.uint64))
+        for idx, offset in enumerate(offsets.tolist()):
+            pos = idx + offset
+            items[idx], items[pos] = items[pos], items[idx]
+
+
+class UniqueSampler:
+    """
+    Draws unique random numbers in the range [0, population), one at a
+    time.
+    Uses an incremental partial Fisher-Yates shuffle, so every call to
+    next() takes a bounded amount of time, even when almost all of the
+    numbers in the range have already been drawn.
+    """
+    def __init__(self, rand: SecureRandom, population: int) -> None:
+        self.rand = rand
+        self.population = population
+        self._drawn: int = 0
+        # _swapped records the items that have been moved by the shuffle
+        self._swapped: Dict[int, int] = {}
+
+    def next(self) -> int:
+        """
+        Get the next random number.
+        @raises ValueError if every number has already been drawn
+        """
+        if self._drawn >= self.population:
+            raise ValueError(f'All {self.population} values have been used')
+        idx = self._drawn
+        pos = idx + self.rand.randbelow(self.population - idx)
+        result = self._swapped.pop(pos, pos)
+        if pos != idx:
+            self._swapped[pos] = self._swapped.pop(idx, idx)
+        self._drawn += 1
+        return result
+
+    @property
+    def remaining(self) -> int:
+        """number of values that have not yet been drawn"""
+        return self.population - self._drawn
@@ -2,9 +2,15 @@
 classes to represent a song and the metadata associated with it
 """
 
+from array import array
 import re
 from pathlib import Path
-from typing import Iterable, List, NamedTuple, Optional, SupportsInt, Tuple, Union
+import sys
+import threading
+from typing import (
+    Any, Dict, Generic, Iterable, List, NamedTuple, Optional, SupportsInt,
+    Tuple, TypeVar, Union, overload
+)
 
 class Duration(SupportsInt):
     """Duration of a song (in milliseconds)"""
@@ -57,7 +63,7 @@ class Metadata(NamedTuple):
     artist: str
     """the artist credited with the song"""
     album: str = ''
-    """a prime number used during game generation"""
+    """a unique bit used during game generation"""
     song_id: int = 0
     """duration of song (in milliseconds)"""
     duration: Duration = Duration(0)
@@ -67,58 +73,287 @@ class Metadata(NamedTuple):
     filename: str = ''
     """location of the MP3 file (name with path)"""
     filepath: Optional[Path] = None
+    """key used when sorting by title (empty if not yet calculated)"""
+    title_key: str = ''
+    """key used when sorting by artist (empty if not yet calculated)"""
+    artist_key: str = ''
 
 class HasParent:
     """interface used for classes that have a parent-child relationship"""
+    __slots__ = ('_parent',)
+
     def __init__(self, parent: Optional["HasParent"] = None):
         self._parent = parent
 
 #pylint: disable=too-many-instance-attributes
+class SongTable:
+    """
+    Column based store of the attributes of Song objects.
+    Each Song is a row in the table. Numbers are stored in arrays, the
+    same title, artist, album and filename strings are shared between
+    songs and the path of each song is stored as an index into a list
+    of directories plus a filename, so that a library of many thousands
+    of songs does not need a Python object for every attribute of every
+    song.
+    Rows are re-used once the Song that owns them has been deleted.
+    It is safe to use the table from multiple threads.
+    """
+
+    # the columns that contain strings
+    TEXT_COLUMNS = ('title', 'artist', 'album', 'filename', 'basename',
+                    'title_key', 'artist_key')
+
+    def __init__(self) -> None:
+        # RLock because a Song can be deleted by the garbage collector
+        # while the lock is held
+        self._lock = threading.RLock()
+        self.ref_id = array('q')
+        self.duration = array('q')
+        self.directory = array('l')
+        # song_id can be larger than 64 bits and start_time can be a string
+        self.song_id: List[int] = []
+        self.start_time: List[Union[int, str]] = []
+        self.title: List[str] = []
+        self.artist: List[str] = []
+        self.album: List[str] = []
+        self.filename: List[str] = []
+        self.title_key: List[str] = []
+        self.artist_key: List[str] = []
+        # the filename part of the song's filepath
+        self.basename: List[str] = []
+        self.directories: List[Path] = []
+        self._directory_index: Dict[Path, int] = {}
+        self._free: List[int] = []
+
+    def add(self) -> int:
+        """allocate a new row, returns the index of the row"""
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+            self.ref_id.append(0)
+            self.duration.append(0)
+            self.directory.append(-1)
+            self.song_id.append(0)
+            self.start_time.append(0)
+            for name in self.TEXT_COLUMNS:
+                getattr(self, name).append('')
+            return len(self.ref_id) - 1
+
+    def release(self, row: int) -> None:
+        """return a row to the table, so that it can be re-used"""
+        with self._lock:
+            for name in self.TEXT_COLUMNS:
+                getattr(self, name)[row] = ''
+            self.start_time[row] = 0
+            self.song_id[row] = 0
+            self.directory[row] = -1
+            self._free.append(row)
+
+    def set_value(self, row: int, name: str, value: Any) -> None:
+        """Set one value in a row"""
+        with self._lock:
+            getattr(self, name)[row] = value
+
+    def set_text(self, row: int, name: str, value: str) -> None:
+        """
+        Set one string in a row.
+        The strings are interned, as titles, artists and albums are
+        repeated many times in a typical song library.
+        """
+        value = sys.intern(value)
+        with self._lock:
+            getattr(self, name)[row] = value
+
+    def set_filepath(self, row: int, filepath: Optional[Path]) -> None:
+        """Set the directory and basename of a row"""
+        with self._lock:
+            if filepath is None:
+                self.directory[row] = -1
+                self.basename[row] = ''
+            else:
+                self.directory[row] = self.directory_id(filepath.parent)
+                self.basename[row] = sys.intern(filepath.name)
+
+    def directory_id(self, directory: Path) -> int:
+        """get the index of a directory, adding it if not already present"""
+        with self._lock:
+            try:
+                return self._directory_index[directory]
+            except KeyError:
+                pass
+            self.directories.append(directory)
+            self._directory_index[directory] = len(self.directories) - 1
+            return len(self.directories) - 1
+
+    def __len__(self) -> int:
+        """number of rows that are in use"""
+        return len(self.ref_id) - len(self._free)
+
+ColumnT = TypeVar('ColumnT')
+
+class _Column(Generic[ColumnT]):
+    """
+    Descriptor for an attribute of Song that is stored in a column of
+    the SongTable.
+    If in_key is True, changing the attribute changes the hash of the
+    Song.
+    """
+    def __init__(self, name: str, in_key: bool) -> None:
+        self.name = name
+        self.in_key = in_key
+
+    @overload
+    def __get__(self, song: None, owner: type) -> "_Column[ColumnT]":
+        ...
+
+    @overload
+    def __get__(self, song: "Song", owner: type) -> ColumnT:
+        ...
+
+    def __get__(self, song, owner):
+        if song is None:
+            return self
+        return getattr(song.table, self.name)[song._row]
+
+    def __set__(self, song: "Song", value: ColumnT) -> None:
+        song.table.set_value(song._row, self.name, value)
+        if self.in_key:
+            song._hash = None
+
+class _TextColumn(_Column[str]):
+    """
+    Descriptor for an attribute of Song that is stored in a column of
+    strings in the SongTable.
+    If sort_key is set, it is the name of the column that is updated
+    with the collation key of the new value.
+    """
+    def __init__(self, name: str, in_key: bool,
+                 sort_key: Optional[str] = None) -> None:
+        super(_TextColumn, self).__init__(name, in_key)
+        self.sort_key = sort_key
+
+    def __set__(self, song: "Song", value: str) -> None:
+        song.table.set_text(song._row, self.name, value)
+        if self.sort_key is not None:
+            song.table.set_text(song._row, self.sort_key, Song.collation_key(value))
+        if self.in_key:
+            song._hash = None
+
 class Song(HasParent):
     """
     Represents one Song.
     'Song' objects are objects which possess a title,  artist,
     and a filepath to the file
+    The attributes of each Song are stored in a row of Song.table.
     Arguments:
     parent   -- Directory that contains this song
     ref_id   -- unique ID for referring to the track in a list
     title    -- the title of the Song
     artist   -- the artist credited with the song
-    song_id  -- a prime number used during game generation (optional)
+    song_id  -- a unique bit used during game generation (optional)
     duration -- duration of song (in milliseconds)
     filepath -- location of the MP3 file
     """
+    __slots__ = ('_row', '_hash')
+
     FEAT_RE = re.compile(r'[\[(](feat[.\w]*|ft\.?)[)\]]', re.IGNORECASE)
     DROP_RE = re.compile(r'\s*[\[(](clean|[\w\s]+ ' +
                          r'(edit|mix|remix)|edit|explicit|remastered[ \d]*|' +
                          r'live|main title|mono|([\d\w"]+ single|album|single)' +
                          r' version)[)\]]\s*', re.IGNORECASE)
 
+    # the attributes of a Song, in the order used by marshall()
+    FIELDS = ('ref_id', 'title', 'artist', 'album', 'song_id', 'duration',
+              'start_time', 'filename', 'filepath', 'title_key', 'artist_key')
+
+    table = SongTable()
+
+    ref_id = _Column[int]('ref_id', False)
+    title = _TextColumn('title', True, 'title_key')
+    artist = _TextColumn('artist', True, 'artist_key')
+    album = _TextColumn('album', False)
+    song_id = _Column[int]('song_id', False)
+    duration = _Column[int]('duration', True)
+    start_time = _Column[Union[int, str]]('start_time', False)
+    filename = _TextColumn('filename', True)
+    title_key = _TextColumn('title_key', False)
+    artist_key = _TextColumn('artist_key', False)
+
     def __init__(self, parent: Optional[HasParent], ref_id: int,
                  metadata: Metadata) -> None:
         super(Song, self).__init__(parent)
+        self._hash: Optional[int] = None
+        self._row: int = self.table.add()
         self.ref_id = ref_id
-        self.title: str = ''
-        self.artist: str = ''
-        self.album: str = ''
-        self.song_id: int = 0
-        self.duration: int = 0
-        self.start_time: int = 0
-        self.filename: str = ''
-        self.filepath: Optional[Path] = None
-        for key, value in metadata._asdict().items():
-            setattr(self, key, value)
-        self.title = self._correct_title(self.title.split('[')[0])
-        self.artist = self._correct_title(self.artist)
-
-    def _correct_title(self, title: str) -> str:
+        metadata = self.normalise(metadata)
+        # use the table directly, as the sort keys have already been
+        # calculated
+        for name in ['title', 'artist', 'title_key', 'artist_key']:
+            self.table.set_text(self._row, name, getattr(metadata, name))
+        self.album = metadata.album
+        self.song_id = metadata.song_id
+        self.duration = int(metadata.duration)
+        self.start_time = metadata.start_time
+        self.filename = metadata.filename
+        self.filepath = metadata.filepath
+
+    def __del__(self) -> None:
+        row = getattr(self, '_row', None)
+        if row is not None:
+            self.table.release(row)
+
+    def __reduce__(self) -> Tuple[type, Tuple[Optional[HasParent], int, Metadata]]:
+        """
+        Used by the copy and pickle modules.
+        Each copy of a Song needs its own row of the table, as the row
+        is released when the Song is deleted, so a copy is created from
+        the metadata of this Song rather than by copying its slots.
+        """
+        return (Song, (self._parent, self.ref_id, self.metadata()))
+
+    def metadata(self) -> Metadata:
+        """get the metadata of this Song"""
+        return Metadata(**self.marshall(exclude=['ref_id']))
+
+    @property
+    def filepath(self) -> Optional[Path]:
+        """location of the MP3 file"""
+        directory = self.table.directory[self._row]
+        if directory < 0:
+            return None
+        return self.table.directories[directory] / self.table.basename[self._row]
+
+    @filepath.setter
+    def filepath(self, value: Optional[Path]) -> None:
+        self.table.set_filepath(self._row, None if value is None else Path(value))
+        self._hash = None
+
+    @classmethod
+    def normalise(cls, metadata: Metadata) -> Metadata:
+        """
+        Remove cruft from the title and artist and calculate their sort
+        keys. Does nothing if the metadata has already been normalised.
+        """
+        if metadata.title_key:
+            return metadata
+        title = cls._correct_title(metadata.title.split('[')[0])
+        artist = cls._correct_title(metadata.artist)
+        return metadata._replace(title=title, artist=artist,
+                                 title_key=cls.collation_key(title),
+                                 artist_key=cls.collation_key(artist))
+
+    @classmethod
+    def _correct_title(cls, title: str) -> str:
         """Try to remove 'cruft' from title or artist.
         Tries to remove things like '(radio edit)' or '(single version)'
         from song titles, as they are not useful and can make the text
         too long to fit within a Bingo square
         """
-        title = re.sub(self.DROP_RE, '', title)
-        return re.sub(self.FEAT_RE, 'ft.', title)
+        # both patterns need a bracket to match
+        if '(' not in title and '[' not in title:
+            return title
+        title = re.sub(cls.DROP_RE, '', title)
+        return re.sub(cls.FEAT_RE, 'ft.', title)
 
     def find(self, ref_id: int) -> Optional["Song"]:
         """Find a Song by its ref_id"""
@@ -131,12 +366,22 @@ class Song(HasParent):
         retval = {}
         if exclude is None:
             exclude = []
-        for key, value in self.__dict__.items():
-            if key[0] == '_' or key in exclude or value is None:
+        for key in self.FIELDS:
+            if key in exclude:
                 continue
-            retval[key] = value
+            value = getattr(self, key)
+            if value is not None:
+                retval[key] = value
         return retval
 
+    def sort_key(self, column: str) -> str:
+        """get the key used when sorting songs by the given attribute"""
+        if column == 'title':
+            return self.title_key
+        if column == 'artist':
+            return self.artist_key
+        return self.collation_key(str(getattr(self, column, '')))
+
     def pick(self, props: Iterable[str]) -> Tuple:
         """select "props" attributes from this Song"""
         items = [getattr(self, name) for name in props]
@@ -151,12 +396,17 @@ class Song(HasParent):
         return ''.join(filter(lambda c: c.isalnum() or c in Song.SAFE_CHARS,
                               list(text)))
 
+    @staticmethod
+    def collation_key(text: str) -> str:
+        """key used when sorting text that is shown to the user"""
+        return Song.clean(text).lower()
+
 
     def __len__(self):
         return 1
 
     def __str__(self):
-        if self.song_id is not None:
+        if self.song_id:
             song_id = f' song_id={self.song_id}'
         else:
             song_id = ''
@@ -172,4 +422,6 @@ class Song(HasParent):
         return isinstance(other, Song) and self.__key() == other.__key()
 
     def __hash__(self):
-        return hash(self.__key())
+        if self._hash is None:
+            self._hash = hash(self.__key())
+        return self._hash
@@ -0,0 +1,160 @@
+"""
+In-memory full text index of the songs in a song library
+"""
+
+from bisect import bisect_left, bisect_right
+from collections import Counter
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from musicbingo.directory import Directory
+from musicbingo.song import Song
+
+class SongIndex:
+    """
+    Inverted index of the words in the title, artist, album and filename
+    of every song, used to find songs by a search query.
+    Each word in a query matches any word in a song that starts with
+    that word. If nothing starts with a query word, the words that have
+    the most trigrams in common with it are used instead, so that
+    spelling mistakes still find a song.
+    The results of a search are the ref_id values of every song that
+    matches all of the words in the query.
+    """
+
+    FIELDS = ('title', 'artist', 'album', 'filename')
+    WORD_RE = re.compile(r'\w+')
+    # minimum proportion of trigrams that must be shared by two words
+    # for them to be considered similar
+    SIMILARITY: float = 0.3
+    # approximate cost of checking the words of one song, relative to
+    # the cost of adding one song to a set
+    FILTER_COST: int = 8
+
+    def __init__(self, songs: Optional[Iterable[Song]] = None) -> None:
+        self._postings: Dict[str, Set[int]] = {}
+        self._trigrams: Dict[str, Set[str]] = {}
+        self._song_words: Dict[int, Set[str]] = {}
+        # all words, in sorted order, for finding words by their prefix
+        self._words: List[str] = []
+        self._words_valid: bool = True
+        if songs is not None:
+            for song in songs:
+                self.add(song)
+
+    @classmethod
+    def tokenise(cls, text: str) -> List[str]:
+        """split text into lower case words"""
+        return cls.WORD_RE.findall(text.lower())
+
+    @staticmethod
+    def trigrams(word: str) -> Set[str]:
+        """get every three letter sequence in a word"""
+        padded = f' {word} '
+        return {padded[idx:idx + 3] for idx in range(len(padded) - 2)}
+
+    def add_directory(self, directory: Directory) -> None:
+        """add every song in a directory and its sub-directories"""
+        for sub_dir in directory.subdirectories:
+            self.add_directory(sub_dir)
+        for song in directory.songs:
+            self.add(song)
+
+    def remove_directory(self, directory: Directory) -> None:
+        """remove every song in a directory and its sub-directories"""
+        for sub_dir in directory.subdirectories:
+            self.remove_directory(sub_dir)
+        for song in directory.songs:
+            self.remove(song)
+
+    def add(self, song: Song) -> None:
+        """add (or replace) one song in the index"""
+        if song.ref_id in self._song_words:
+            self.remove(song)
+        words: Set[str] = set()
+        for field in self.FIELDS:
+            words.update(self.tokenise(str(getattr(song, field))))
+        self._song_words[song.ref_id] = words
+        for word in words:
+            try:
+                self._postings[word].add(song.ref_id)
+            except KeyError:
+                self._postings[word] = {song.ref_id}
+                self._words_valid = False
+                for tri in self.trigrams(word):
+                    self._trigrams.setdefault(tri, set()).add(word)
+
+    def remove(self, song: Song) -> None:
+        """remove one song from the index"""
+        for word in self._song_words.pop(song.ref_id, set()):
+            postings = self._postings[word]
+            postings.discard(song.ref_id)
+            if postings:
+                continue
+            del self._postings[word]
+            self._words_valid = False
+            for tri in self.trigrams(word):
+                self._trigrams[tri].discard(word)
+
+    def search(self, query: str, fuzzy: bool = True) -> Set[int]:
+        """
+        Find every song that matches all of the words in query.
+        Returns a set of ref_id values.
+        """
+        terms = set(self.tokenise(query))
+        if not terms:
+            return set(self._song_words.keys())
+        # start with the term that matches the fewest songs
+        candidates: List[Tuple[int, Set[str], List[Set[int]]]] = []
+        for term in terms:
+            words = self.prefix_words(term)
+            if not words and fuzzy:
+                words = self.similar_words(term)
+            postings = [self._postings[word] for word in words]
+            candidates.append((sum(map(len, postings)), set(words), postings))
+        candidates.sort(key=lambda item: item[0])
+        result = self._union(candidates[0][2])
+        for size, matching, postings in candidates[1:]:
+            if not result:
+                break
+            if len(result) * self.FILTER_COST < size:
+                # cheaper to check the songs that are left than to
+                # combine all of the postings of this term
+                result = {ref_id for ref_id in result
+                          if not matching.isdisjoint(self._song_words[ref_id])}
+            else:
+                result.intersection_update(self._union(postings))
+        return result
+
+    @staticmethod
+    def _union(postings: List[Set[int]]) -> Set[int]:
+        """combine a list of sets of ref_id values"""
+        result: Set[int] = set()
+        for posting in postings:
+            result.update(posting)
+        return result
+
+    def prefix_words(self, prefix: str) -> List[str]:
+        """find every word that starts with prefix"""
+        if not self._words_valid:
+            self._words = sorted(self._postings.keys())
+            self._words_valid = True
+        start = bisect_left(self._words, prefix)
+        end = bisect_right(self._words, prefix + chr(0x10ffff), lo=start)
+        return self._words[start:end]
+
+    def similar_words(self, term: str) -> List[str]:
+        """find words that have similar trigrams to term"""
+        term_tris = self.trigrams(term)
+        shared: Counter = Counter()
+        for tri in term_tris:
+            shared.update(self._trigrams.get(tri, ()))
+        result: List[str] = []
+        for word, count in shared.items():
+            union = len(term_tris) + len(self.trigrams(word)) - count
+            if count >= self.SIMILARITY * union:
+                result.append(word)
+        return result
+
+    def __len__(self) -> int:
+        return len(self._song_words)
@@ -0,0 +1,66 @@
+"""
+Chooses random songs from a library, while avoiding songs that have
+already been used.
+"""
+
+from typing import Callable, Container, List, Optional, Sequence, Set
+
+from musicbingo.playhistory import PlayHistory
+from musicbingo.securerandom import SecureRandom, UniqueSampler
+from musicbingo.song import Song
+
+class SongSampler:
+    """
+    Draws random songs, without replacement, from a sequence of songs.
+    The songs are drawn using an incremental Fisher-Yates shuffle of
+    their positions in the sequence, so the sequence is never copied
+    and each draw takes a constant amount of time. Songs that are
+    excluded are skipped when they are drawn, which means that choosing
+    k songs takes O(k) expected time, as long as most of the songs in
+    the sequence are not excluded.
+    """
+
+    def __init__(self, songs: Sequence[Song],
+                 rand: Optional[SecureRandom] = None) -> None:
+        self.songs = songs
+        if rand is None:
+            rand = SecureRandom()
+        self.rand = rand
+
+    #pylint: disable=too-many-arguments
+    def sample(self, amount: int, exclude_ids: Container[int] = frozenset(),
+               exclude_keys: Container[str] = frozenset(),
+               distinct_artists: bool = False,
+               accept: Optional[Callable[[Song], bool]] = None) -> List[Song]:
+        """
+        Choose up to "amount" different songs.
+        Songs whose ref_id is in exclude_ids, or whose
+        PlayHistory.song_key() is in exclude_keys, are never chosen. If
+        accept is provided, only songs for which it returns True are
+        chosen.
+        If distinct_artists is True, songs by an artist that has already
+        been chosen are only used if there are not enough songs by other
+        artists.
+        """
+        sampler = UniqueSampler(self.rand, len(self.songs))
+        chosen: List[Song] = []
+        artists: Set[str] = set()
+        # songs that were skipped because their artist was already chosen
+        repeats: List[Song] = []
+        while len(chosen) < amount and sampler.remaining:
+            song = self.songs[sampler.next()]
+            if song.ref_id in exclude_ids:
+                continue
+            if exclude_keys and PlayHistory.song_key(song) in exclude_keys:
+                continue
+            if accept is not None and not accept(song):
+                continue
+            if distinct_artists:
+                if song.artist_key in artists:
+                    if len(repeats) < amount:
+                        repeats.append(song)
+                    continue
+                artists.add(song.artist_key)
+            chosen.append(song)
+        chosen += repeats[:amount - len(chosen)]
+        return chosen
@@ -21,6 +21,10 @@ class MockRandom(Random):
         """implements secrets.randbelow()"""
         return self.randint(0, max_value - 1)
 
+    def token_bytes(self, nbytes: int) -> bytes:
+        """implements secrets.token_bytes()"""
+        return self.getrandbits(8 * nbytes).to_bytes(nbytes, 'little')
+
 def main():
     """print output from using MockRandom class"""
     mock_rand = MockRandom()
@@ -0,0 +1,295 @@
+"""
+tests of the PDF generator that draws directly onto a canvas
+"""
+
+from pathlib import Path
+import re
+import shutil
+import tempfile
+from typing import List, Tuple
+import unittest
+from unittest import mock
+
+from reportlab.pdfgen import canvas # type: ignore
+
+from musicbingo.docgen import documentgenerator as DG
+from musicbingo.docgen.canvasgen import CanvasPDFGenerator, FormPDFGenerator
+from musicbingo.docgen.colour import Colour
+from musicbingo.docgen.factory import DocumentFactory
+from musicbingo.docgen.pdfgen import PDFGenerator
+from musicbingo.docgen.sizes import PageSizes
+from musicbingo.docgen.styles import HorizontalAlignment, VerticalAlignment
+from musicbingo.docgen.styles import ElementStyle, Padding, TableStyle
+from musicbingo.progress import Progress
+
+class TestCanvasPDFGenerator(unittest.TestCase):
+    """tests of the direct-canvas PDF generator"""
+
+    CELL_STYLE = ElementStyle(name='ticket-cell', colour='black',
+                              alignment=HorizontalAlignment.CENTER,
+                              fontSize=12, leading=12,
+                              padding=Padding(bottom=4.0/72.0))
+
+    def setUp(self):
+        """called before each test"""
+        self.tmpdir = Path(tempfile.mkdtemp())
+        self.extra_files = Path(__file__).parents[2] / "Extra-Files"
+
+    def tearDown(self):
+        """called after each test"""
+        shutil.rmtree(str(self.tmpdir))
+
+    def ticket_table(self, number: int) -> DG.Table:
+        """create a table that looks like a Bingo ticket"""
+        data: List[DG.TableRow] = []
+        for row in range(3):
+            data.append([
+                [DG.Paragraph(f'Song {row * 5 + col + number}', self.CELL_STYLE),
+                 DG.Paragraph(f'<b>Artist {row}</b>', self.CELL_STYLE)]
+                for col in range(5)
+            ])
+        tstyle = TableStyle(name='bingo-card', borderColour=Colour('black'),
+                            borderWidth=2.0, gridColour=Colour('black'),
+                            gridWidth=0.5,
+                            verticalAlignment=VerticalAlignment.CENTER)
+        table = DG.Table(data, colWidths=["1.54in"] * 5,
+                         rowHeights=["0.97in"] * 3, style=tstyle)
+        for row in range(3):
+            for col in range(5):
+                colour = 'white' if (row + col) & 1 else 'blue'
+                table.style_cells(DG.CellPos(col=col, row=row),
+                                  DG.CellPos(col=col, row=row),
+                                  background=Colour(colour))
+        return table
+
+    def test_factory(self):
+        """Check that the generator can be created by DocumentFactory"""
+        self.assertIsInstance(DocumentFactory.create_generator('pdf-canvas'),
+                              CanvasPDFGenerator)
+        self.assertIsInstance(DocumentFactory.create_generator('pdf-forms'),
+                              FormPDFGenerator)
+
+    def test_fit_paragraph(self):
+        """Check that text is split into centred lines"""
+        pdfgen = CanvasPDFGenerator()
+        para = DG.Paragraph('A song with a title that is too long', self.CELL_STYLE)
+        block = pdfgen.fit_paragraph(para, 100)
+        self.assertGreater(len(block.lines), 1)
+        self.assertAlmostEqual(block.height, 12.0 * len(block.lines))
+        for line in block.lines:
+            self.assertEqual(line.font, CanvasPDFGenerator.FONT)
+            width = pdfgen.string_width(line.text, line.font, line.font_size)
+            self.assertLessEqual(width, 100)
+            self.assertAlmostEqual(line.x_offset, (100 - width) / 2.0)
+        block = pdfgen.fit_paragraph(DG.Paragraph('<b>Queen &amp; Bowie</b>',
+                                                  self.CELL_STYLE), 100)
+        self.assertEqual(len(block.lines), 1)
+        self.assertEqual(block.lines[0].text, 'Queen & Bowie')
+        self.assertEqual(block.lines[0].font, CanvasPDFGenerator.BOLD_FONT)
+
+    def tickets_document(self) -> DG.Document:
+        """create a document containing two pages of Bingo tickets"""
+        doc = DG.Document(pagesize=PageSizes.A4, topMargin="0.15in",
+                          rightMargin="0.15in", bottomMargin="0.15in",
+                          leftMargin="0.15in", title='Tickets')
+        for number in range(4):
+            doc.append(DG.Image(self.extra_files / 'logo_banner.jpg',
+                                width="6.2in", height="0.47in"))
+            doc.append(self.ticket_table(number))
+            if number == 1:
+                doc.append(DG.PageBreak())
+            else:
+                doc.append(DG.HorizontalLine('hline', width="100%", thickness="1px",
+                                             colour=Colour('gray'), dash=[2, 2]))
+                doc.append(DG.Spacer(width=0, height="0.08in"))
+        doc.append(DG.PageBreak())
+        return doc
+
+    def test_render_tickets(self):
+        """Check drawing pages of tickets, re-using the drawing of each grid"""
+        doc = self.tickets_document()
+        filename = self.tmpdir / 'tickets.pdf'
+        pdfgen = CanvasPDFGenerator()
+        with mock.patch.object(PDFGenerator, 'render') as mock_render:
+            pdfgen.render(str(filename), doc, Progress())
+            mock_render.assert_not_called()
+        contents = filename.read_bytes()
+        self.assertEqual(len(re.findall(rb'/Type /Page\b', contents)), 2)
+        # one grid, plus one entry for each different cell, where each
+        # row of the four tickets contains eight different songs
+        self.assertEqual(len(pdfgen._code_cache), 1 + 3 * 8)
+
+    def test_render_forms(self):
+        """Check that the logo, lines and grid are only stored once"""
+        filename = self.tmpdir / 'tickets.pdf'
+        pdfgen = FormPDFGenerator()
+        pdfgen.render(str(filename), self.tickets_document(), Progress())
+        contents = filename.read_bytes()
+        self.assertEqual(len(re.findall(rb'/Type /Page\b', contents)), 2)
+        # one form each for the logo, the dashed line and the grid
+        self.assertEqual(len(re.findall(rb'/Subtype /Form\b', contents)), 3)
+        self.assertEqual(len(pdfgen._code_cache), 3 * 8)
+        # the forms are re-created for each document
+        pdfgen.render(str(filename), self.tickets_document(), Progress())
+        contents = filename.read_bytes()
+        self.assertEqual(len(re.findall(rb'/Subtype /Form\b', contents)), 3)
+
+    def test_render_streaming_document(self):
+        """Check drawing the pages of a StreamingDocument as they are created"""
+        doc = self.tickets_document()
+        pages = list(doc.pages())
+        created: List[int] = []
+
+        def elements():
+            for number, page in enumerate(pages, start=1):
+                created.append(number)
+                yield from page
+
+        stream = DG.StreamingDocument(doc.pagesize, elements(), num_pages=len(pages),
+                                      topMargin="0.15in", rightMargin="0.15in",
+                                      bottomMargin="0.15in", leftMargin="0.15in")
+        progress = Progress()
+        reports: List[Tuple[str, List[int]]] = []
+        progress.on_change_text = lambda text: reports.append((text, list(created)))
+        filename = self.tmpdir / 'tickets.pdf'
+        with mock.patch.object(PDFGenerator, 'render') as mock_render:
+            CanvasPDFGenerator().render(str(filename), stream, progress)
+            mock_render.assert_not_called()
+        self.assertEqual(reports, [('Page 1/2', [1]), ('Page 2/2', [1, 2])])
+        contents = filename.read_bytes()
+        self.assertEqual(len(re.findall(rb'/Type /Page\b', contents)), 2)
+
+    def test_streaming_fallback(self):
+        """Check that a StreamingDocument can be rendered by PDFGenerator"""
+        paras = [DG.Paragraph('Track listing', self.CELL_STYLE),
+                 DG.PageBreak(), DG.Paragraph('Page 2', self.CELL_STYLE)]
+        stream = DG.StreamingDocument(PageSizes.A4, iter(paras))
+        filename = self.tmpdir / 'listing.pdf'
+        CanvasPDFGenerator().render(str(filename), stream, Progress())
+        contents = filename.read_bytes()
+        self.assertEqual(len(re.findall(rb'/Type /Page\b', contents)), 2)
+
+    def test_streaming_undrawable_element(self):
+        """
+        Check that no PDF file is created if a later page of a
+        StreamingDocument contains an element that cannot be drawn
+        """
+        doc = self.tickets_document()
+        elements = [elt for page in doc.pages() for elt in page]
+        elements.append(DG.Paragraph('Track listing', self.CELL_STYLE))
+        stream = DG.StreamingDocument(doc.pagesize, iter(elements))
+        filename = self.tmpdir / 'undrawable.pdf'
+        with self.assertRaises(ValueError):
+            CanvasPDFGenerator().render(str(filename), stream, Progress())
+        self.assertEqual(list(self.tmpdir.glob('undrawable.pdf*')), [])
+
+    def test_partial_file_removed(self):
+        """
+        Check that a partially written PDF file is removed, and that an
+        existing file is left alone, if saving the PDF fails
+        """
+        filename = self.tmpdir / 'partial.pdf'
+        filename.write_bytes(b'previous')
+        save = canvas.Canvas.save
+
+        def failing_save(canv):
+            save(canv)
+            raise OSError('disk full')
+
+        with mock.patch.object(canvas.Canvas, 'save', failing_save):
+            with self.assertRaises(OSError):
+                CanvasPDFGenerator().render(str(filename), self.tickets_document(),
+                                            Progress())
+        self.assertEqual(list(self.tmpdir.glob('partial.pdf*')), [filename])
+        self.assertEqual(filename.read_bytes(), b'previous')
+
+    def test_negative_cell_positions(self):
+        """
+        Check that negative cell positions count back from the end of
+        the table
+        """
+        table = self.ticket_table(0)
+        table.style_cells(DG.CellPos(col=0, row=0), DG.CellPos(col=-1, row=-1),
+                          background=Colour('red'))
+        padding = Padding(top=0.1, right=0.1, bottom=0.1, left=0.1)
+        table.style_cells(DG.CellPos(col=1, row=0), DG.CellPos(col=1, row=-1),
+                          padding=padding)
+        table.style_cells(DG.CellPos(col=-2, row=-1), DG.CellPos(col=-2, row=-1),
+                          background=Colour('green'))
+        cells = CanvasPDFGenerator().cell_boxes(table, 3, 5)
+        for row in range(3):
+            for col in range(5):
+                colour = 'red'
+                if (row, col) == (2, 3):
+                    colour = 'green'
+                self.assertEqual(cells[row][col].background, Colour(colour))
+                if col == 1:
+                    self.assertEqual(cells[row][col].padding, padding)
+                else:
+                    self.assertEqual(cells[row][col].padding,
+                                     CanvasPDFGenerator.CELL_PADDING)
+
+    @staticmethod
+    def overflowing_document() -> DG.Document:
+        """create a document with a table cell that is too small for its text"""
+        doc = DG.Document(pagesize=PageSizes.A4)
+        style = ElementStyle(name='cell', colour='black', fontSize=12, leading=12,
+                             alignment=HorizontalAlignment.CENTER)
+        cell = [DG.Paragraph('A very long song title that does not fit into a cell',
+                             style),
+                DG.Paragraph('<b>An Artist With A Long Name</b>', style)]
+        doc.append(DG.Table([[cell]], colWidths=['1in'], rowHeights=['0.5in'],
+                            style=TableStyle(name='overflow')))
+        return doc
+
+    @staticmethod
+    def text_operators(filename: Path) -> List[Tuple[float, str]]:
+        """
+        find the font size and text of every string drawn in an
+        uncompressed PDF file
+        """
+        contents = filename.read_bytes().decode('latin-1')
+        result: List[Tuple[float, str]] = []
+        font_size = 0.0
+        for size, text in re.findall(r'/F\d+ ([\d.]+) Tf|\(((?:[^()\\]|\\.)*)\) Tj',
+                                     contents):
+            if size:
+                font_size = float(size)
+            else:
+                result.append((font_size, text))
+        return result
+
+    def test_overflowing_cell(self):
+        """
+        Check that text that does not fit into a table cell is drawn in
+        the same way as PDFGenerator, unless shrink_to_fit is set
+        """
+        outputs: List[List[Tuple[float, str]]] = []
+        with mock.patch('reportlab.rl_config.pageCompression', 0):
+            for pdfgen in [PDFGenerator(), CanvasPDFGenerator(),
+                           CanvasPDFGenerator(shrink_to_fit=True)]:
+                filename = self.tmpdir / 'overflow.pdf'
+                pdfgen.render(str(filename), self.overflowing_document(), Progress())
+                outputs.append(self.text_operators(filename))
+        platypus = outputs[0]
+        shrunk = outputs[2]
+        self.assertGreater(len(platypus), 4)
+        self.assertEqual(outputs[1], platypus)
+        self.assertEqual(' '.join(text for _, text in shrunk),
+                         ' '.join(text for _, text in platypus))
+        self.assertLess(len(shrunk), len(platypus))
+        for font_size, _ in shrunk:
+            self.assertLess(font_size, 12)
+
+    def test_fallback(self):
+        """Check that other documents are rendered by PDFGenerator"""
+        doc = DG.Document(pagesize=PageSizes.A4)
+        doc.append(DG.Paragraph('Track listing', self.CELL_STYLE))
+        filename = str(self.tmpdir / 'listing.pdf')
+        with mock.patch.object(PDFGenerator, 'render') as mock_render:
+            progress = Progress()
+            CanvasPDFGenerator().render(filename, doc, progress)
+            mock_render.assert_called_once_with(filename, doc, progress)
+
+if __name__ == '__main__':
+    unittest.main()
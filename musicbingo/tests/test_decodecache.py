@@ -0,0 +1,90 @@
+"""
+Unit tests for DecodeCache
+"""
+import threading
+import unittest
+
+from pydub import AudioSegment # type: ignore
+
+from musicbingo.mp3.cache import DecodeCache
+
+def audio(num_bytes: int) -> AudioSegment:
+    """create a silent mono 8-bit AudioSegment of the given size"""
+    return AudioSegment(data=b'\x80' * num_bytes, sample_width=1,
+                        frame_rate=8000, channels=1)
+
+class TestDecodeCache(unittest.TestCase):
+    """tests of the DecodeCache class"""
+
+    def test_hits_and_misses(self):
+        """Check that hits and misses are counted"""
+        cache = DecodeCache(100)
+        self.assertIsNone(cache.get('a'))
+        seg = audio(10)
+        cache.put('a', seg)
+        self.assertIs(cache.get('a'), seg)
+        self.assertIs(cache.get('a'), seg)
+        self.assertEqual(cache.hits, 2)
+        self.assertEqual(cache.misses, 1)
+        self.assertAlmostEqual(cache.hit_rate, 200.0 / 3.0)
+
+    def test_least_recently_used_removed(self):
+        """Check that the byte limit removes the least recently used items"""
+        cache = DecodeCache(100)
+        segs = [audio(40) for _ in range(3)]
+        cache.put('a', segs[0])
+        cache.put('b', segs[1])
+        self.assertIs(cache.get('a'), segs[0])
+        cache.put('c', segs[2])
+        self.assertEqual(cache.size, 80)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('b'))
+        self.assertIs(cache.get('a'), segs[0])
+        self.assertIs(cache.get('c'), segs[2])
+
+    def test_too_large(self):
+        """Check that items larger than the cache are not stored"""
+        cache = DecodeCache(100)
+        seg = audio(40)
+        cache.put('a', seg)
+        cache.put('b', audio(101))
+        self.assertIsNone(cache.get('b'))
+        self.assertIs(cache.get('a'), seg)
+        self.assertEqual(cache.size, 40)
+
+    def test_parallel_use(self):
+        """
+        Check that the size and statistics of the cache remain consistent
+        when it is used by several threads at the same time
+        """
+        cache = DecodeCache(1000)
+        segs = [audio(10 + key) for key in range(50)]
+        num_threads = 8
+        num_loops = 2000
+
+        def worker(offset: int) -> None:
+            for index in range(num_loops):
+                key = (offset + index) % 50
+                if cache.get(key) is None:
+                    cache.put(key, segs[key])
+                if index % 7 == 0:
+                    cache.remove((key + 1) % 50)
+
+        threads = [threading.Thread(target=worker, args=(idx,))
+                   for idx in range(num_threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(cache.hits + cache.misses, num_threads * num_loops)
+        self.assertLessEqual(cache.size, cache.max_size)
+        total = 0
+        for key in range(50):
+            value = cache.get(key)
+            if value is not None:
+                self.assertIs(value, segs[key])
+                total += 10 + key
+        self.assertEqual(cache.size, total)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,226 @@
+"""
+Unit tests for Directory
+"""
+import os
+from pathlib import Path
+import shutil
+import tempfile
+from typing import List, Tuple
+import unittest
+from unittest import mock
+
+from musicbingo.directory import Directory
+from musicbingo.libraryindex import LibraryIndex
+from musicbingo.progress import Progress
+from musicbingo.song import Metadata
+
+from .mock_parser import MockMP3Parser
+
+class TestDirectory(unittest.TestCase):
+    """tests of the Directory class"""
+
+    FILES = ['a.mp3', 'b.mp3', 'sub1/c.mp3', 'sub1/d.mp3', 'sub2/e.mp3',
+             'sub2/deeper/f.mp3', 'notes.txt']
+
+    def setUp(self):
+        """called before each test"""
+        self.tmpdir = Path(tempfile.mkdtemp())
+        testcases = {}
+        for name in self.FILES:
+            filename = self.tmpdir / name
+            if not filename.parent.exists():
+                filename.parent.mkdir(parents=True)
+            filename.write_bytes(b'')
+            testcases[filename.name] = Metadata(
+                title=f'Title {filename.stem}', artist=f'Artist {filename.stem}',
+                album=filename.parent.name, duration=1000, filename=filename.name,
+                filepath=filename)
+        self.parser = MockMP3Parser(testcases)
+
+    def tearDown(self):
+        """called after each test"""
+        shutil.rmtree(str(self.tmpdir))
+
+    def remove_cache_files(self):
+        """remove all songs.json files"""
+        for cache_file in self.tmpdir.glob(f'**/{Directory.cache_filename}'):
+            cache_file.unlink()
+
+    def flatten(self, directory: Directory) -> List[Tuple]:
+        """create a list of all directories and songs"""
+        result: List[Tuple] = [(directory.ref_id, directory.directory.name)]
+        for sub_dir in directory.subdirectories:
+            result += self.flatten(sub_dir)
+        for song in directory.songs:
+            result.append((song.ref_id, song.title, song.artist, song.filename))
+        return result
+
+    def test_parallel_search(self):
+        """Check that parallel_search() and search() find the same songs"""
+        serial = Directory(None, 1, self.tmpdir, self.parser, Progress())
+        serial.search()
+        expected = self.flatten(serial)
+        self.assertEqual(serial.total_length(), 6)
+        self.remove_cache_files()
+        progress = Progress()
+        clips = Directory(None, 1, self.tmpdir, self.parser, progress)
+        clips.parallel_search(workers=3)
+        self.assertEqual(self.flatten(clips), expected)
+        self.assertIn('files/sec', progress.text)
+        # with the cache files present, both should use the cache
+        serial = Directory(None, 1, self.tmpdir, MockMP3Parser({}), Progress())
+        serial.search()
+        cached = Directory(None, 1, self.tmpdir, MockMP3Parser({}), Progress())
+        cached.parallel_search()
+        self.assertEqual(cached.total_length(), 6)
+        self.assertEqual(self.flatten(cached), self.flatten(serial))
+
+    def test_find_and_get_songs(self):
+        """Check lookups using the ref_id index"""
+        clips = Directory(None, 1, self.tmpdir, self.parser, Progress())
+        clips.parallel_search()
+        all_songs = list(clips.get_songs(clips.ref_id))
+        self.assertEqual(len(all_songs), 6)
+        for song in all_songs:
+            self.assertIs(clips.find(song.ref_id), song)
+            self.assertEqual(list(clips.get_songs(song.ref_id)), [song])
+        sub2 = clips.find_directory(self.tmpdir / 'sub2')
+        self.assertIsNotNone(sub2)
+        songs = clips.get_songs(sub2.ref_id)
+        self.assertEqual(sorted(song.filename for song in songs), ['e.mp3', 'f.mp3'])
+        self.assertEqual([song.filename for song in songs[1:]], [songs[1].filename])
+        self.assertEqual(list(sub2.get_songs(sub2.ref_id)), list(songs))
+        # a sub-directory cannot find songs outside of itself
+        song_a = [song for song in all_songs if song.filename == 'a.mp3'][0]
+        self.assertIsNone(sub2.find(song_a.ref_id))
+        self.assertEqual(list(sub2.get_songs(song_a.ref_id)), [])
+        # modifying the tree updates the index
+        sub2.remove_song(sub2.songs[0])
+        self.assertEqual(len(clips.get_songs(clips.ref_id)), 5)
+        self.assertEqual([song.filename for song in clips.get_songs(sub2.ref_id)],
+                         ['f.mp3'])
+
+    def test_library_index(self):
+        """Check that the library index replaces the songs.json files"""
+        Directory(None, 1, self.tmpdir, self.parser, Progress()).search()
+        serial = Directory(None, 1, self.tmpdir, MockMP3Parser({}), Progress())
+        serial.search()
+        expected = self.flatten(serial)
+        dbdir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, str(dbdir))
+        index = LibraryIndex(dbdir / 'library.db')
+        # songs.json files are imported, so nothing needs to be parsed
+        clips = Directory(None, 1, self.tmpdir, MockMP3Parser({}), Progress(), index)
+        clips.parallel_search()
+        self.assertEqual(len(index), 6)
+        self.assertEqual(self.flatten(clips), expected)
+        # a replaced file needs to be parsed again
+        self.remove_cache_files()
+        (self.tmpdir / 'sub1' / 'c.mp3').write_bytes(b'new contents')
+        self.parser.testcases['c.mp3'] = self.parser.testcases['c.mp3']._replace(
+            title='New title')
+        clips = Directory(None, 1, self.tmpdir, self.parser, Progress(), index)
+        clips.search()
+        titles = sorted(song.title for song in clips.get_songs(clips.ref_id))
+        self.assertEqual(titles, ['New title', 'Title a', 'Title b', 'Title d',
+                                  'Title e', 'Title f'])
+        self.assertEqual(list(self.tmpdir.glob(f'**/{Directory.cache_filename}')), [])
+        index.close()
+
+    def test_incremental_search(self):
+        """Check that unchanged directories are loaded from the index"""
+        dbdir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, str(dbdir))
+        index = LibraryIndex(dbdir / 'library.db')
+        clips = Directory(None, 1, self.tmpdir, self.parser, Progress(), index)
+        clips.parallel_search()
+        expected = self.flatten(clips)
+        # nothing has changed, so nothing needs to be parsed
+        clips = Directory(None, 1, self.tmpdir, MockMP3Parser({}), Progress(), index)
+        clips.parallel_search()
+        self.assertEqual(self.flatten(clips), expected)
+        # only the changed directory is checked
+        (self.tmpdir / 'sub1' / 'd.mp3').unlink()
+        (self.tmpdir / 'sub1' / 'g.mp3').write_bytes(b'')
+        shutil.rmtree(str(self.tmpdir / 'sub2' / 'deeper'))
+        # make sure the modification times are different, even on file
+        # systems with a coarse timestamp resolution
+        for name in ['sub1', 'sub2']:
+            mtime = (self.tmpdir / name).stat().st_mtime + 10
+            os.utime(str(self.tmpdir / name), (mtime, mtime))
+        parser = MockMP3Parser({
+            'g.mp3': Metadata(title='Title g', artist='Artist g',
+                              filename='g.mp3', filepath=self.tmpdir / 'sub1' / 'g.mp3'),
+        })
+        clips = Directory(None, 1, self.tmpdir, parser, Progress(), index)
+        clips.parallel_search()
+        titles = sorted(song.title for song in clips.get_songs(clips.ref_id))
+        self.assertEqual(titles, ['Title a', 'Title b', 'Title c', 'Title e', 'Title g'])
+        self.assertEqual(len(index), 5)
+        index.close()
+
+    def test_invalid_json_cache(self):
+        """
+        Check that songs.json files that cannot be imported into the
+        library index are skipped, and their songs are parsed instead
+        """
+        (self.tmpdir / 'sub1' / Directory.cache_filename).write_text('[{"filename": ')
+        (self.tmpdir / 'sub2' / Directory.cache_filename).write_bytes(
+            '[{"filename": "e.mp3", "title": "Caf\u00e9", "artist": "A"}]'.encode('latin-1'))
+        dbdir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, str(dbdir))
+        index = LibraryIndex(dbdir / 'library.db')
+        clips = Directory(None, 1, self.tmpdir, self.parser, Progress(), index)
+        with mock.patch('builtins.print') as mock_print:
+            clips.parallel_search()
+        errors = [call[0][0] for call in mock_print.call_args_list
+                  if call[0][0].startswith('Error importing')]
+        self.assertEqual(len(errors), 2)
+        titles = sorted(song.title for song in clips.get_songs(clips.ref_id))
+        self.assertEqual(titles, ['Title a', 'Title b', 'Title c', 'Title d',
+                                  'Title e', 'Title f'])
+        index.close()
+
+    def test_unchanged_directories_not_listed(self):
+        """
+        Check that the contents of unchanged directories are loaded from
+        the index, without listing the directory or checking its files
+        """
+        dbdir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, str(dbdir))
+        index = LibraryIndex(dbdir / 'library.db')
+        clips = Directory(None, 1, self.tmpdir, self.parser, Progress(), index)
+        clips.parallel_search()
+        expected = self.flatten(clips)
+        sub1 = self.tmpdir / 'sub1'
+        dir_stats = sub1.stat()
+        filename = sub1 / 'c.mp3'
+        with filename.open('r+b') as mp3file:
+            mp3file.write(b'new contents')
+        os.utime(str(sub1), ns=(dir_stats.st_atime_ns, dir_stats.st_mtime_ns))
+        parser = MockMP3Parser({
+            'c.mp3': self.parser.testcases['c.mp3']._replace(title='New title'),
+        })
+        with mock.patch('musicbingo.directory.os.scandir',
+                        side_effect=os.scandir) as scandir:
+            clips = Directory(None, 1, self.tmpdir, parser, Progress(), index)
+            clips.parallel_search()
+        scandir.assert_not_called()
+        self.assertEqual(self.flatten(clips), expected)
+        # once its directory has changed, the modified file is parsed again
+        mtime = dir_stats.st_mtime + 10
+        os.utime(str(sub1), (mtime, mtime))
+        with mock.patch('musicbingo.directory.os.scandir',
+                        side_effect=os.scandir) as scandir:
+            clips = Directory(None, 1, self.tmpdir, parser, Progress(), index)
+            clips.parallel_search()
+        self.assertEqual([call[0][0] for call in scandir.call_args_list], [str(sub1)])
+        titles = sorted(song.title for song in clips.get_songs(clips.ref_id))
+        self.assertEqual(titles, ['New title', 'Title a', 'Title b', 'Title d',
+                                  'Title e', 'Title f'])
+        self.assertEqual([item[0] for item in self.flatten(clips)],
+                         [item[0] for item in expected])
+        index.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -9,7 +9,7 @@ from typing import Dict, List
 import unittest
 from unittest import mock
 
-from musicbingo.generator import GameGenerator
+from musicbingo.generator import BingoTicket, GameGenerator
 from musicbingo.options import Options
 from musicbingo.progress import Progress
 from musicbingo.song import Song, Metadata
@@ -45,16 +45,14 @@ class TestGameGenerator(unittest.TestCase):
         except (Exception) as ex:
             print(ex)
 
-    @mock.patch('musicbingo.generator.random.shuffle')
-    @mock.patch('musicbingo.generator.secrets.randbelow')
-    def test_complete_bingo_game_pipeline(self, mock_randbelow, mock_shuffle):
+    @mock.patch('musicbingo.securerandom.secrets.token_bytes')
+    def test_complete_bingo_game_pipeline(self, mock_token_bytes):
         """Test of complete Bingo game generation"""
         filename = self.fixture_filename("test_complete_bingo_game_pipeline.json")
         with filename.open('r') as jsrc:
             expected = json.load(jsrc)
         mrand = MockRandom()
-        mock_randbelow.side_effect = mrand.randbelow
-        mock_shuffle.side_effect = mrand.shuffle
+        mock_token_bytes.side_effect = mrand.token_bytes
         opts = Options(
             game_id='test-pipeline',
             games_dest=str(self.tmpdir),
@@ -87,6 +85,94 @@ class TestGameGenerator(unittest.TestCase):
         self.assert_dictionary_equal(expected['editor'][mp3_file],
                                      editor.output[mp3_file])
 
+    def test_generate_at_point(self):
+        """Test that generated tickets win at the requested point"""
+        opts = Options(game_id='test-at-point', games_dest=str(self.tmpdir))
+        gen = GameGenerator(opts, MockMP3Editor(), MockDocumentGenerator(),
+                            Progress())
+        tracks = self.songs[:40]
+        self.assertTrue(gen.assign_song_ids(tracks))
+        for from_end in range(5):
+            cards = gen.generate_at_point(tracks, 10, from_end)
+            self.assertEqual(len(cards), 10)
+            for card in cards:
+                self.assertEqual(len(card.card_tracks), opts.songs_per_ticket())
+                self.assertEqual(len(set(card.card_tracks)),
+                                 opts.songs_per_ticket())
+                self.assertEqual(bin(card.card_id).count('1'),
+                                 opts.songs_per_ticket())
+                self.assertEqual(gen.get_when_ticket_wins(tracks, card),
+                                 len(tracks) - from_end)
+        self.assertEqual(len(gen.used_card_ids), 50)
+
+    def test_get_when_tickets_win(self):
+        """Test that all tickets' win points can be calculated in one call"""
+        opts = Options(game_id='test-win-points', games_dest=str(self.tmpdir))
+        gen = GameGenerator(opts, MockMP3Editor(), MockDocumentGenerator(),
+                            Progress())
+        tracks = self.songs[:40]
+        self.assertTrue(gen.assign_song_ids(tracks))
+        cards: List[BingoTicket] = []
+        for _ in range(20):
+            card = BingoTicket(opts)
+            gen.select_songs_for_ticket(tracks, card, opts.songs_per_ticket())
+            cards.append(card)
+        expected = [gen.get_when_ticket_wins(tracks, card) for card in cards]
+        self.assertEqual(gen.get_when_tickets_win(tracks, cards), expected)
+        self.assertEqual([card.win_point for card in cards], expected)
+        missing = cards[0].card_tracks[0]
+        with self.assertRaises(ValueError):
+            gen.get_when_tickets_win([t for t in tracks if t != missing], cards)
+
+    def test_get_when_tickets_win_duplicate_ref_ids(self):
+        """
+        Test that win points are found using the song_id of each track,
+        as the ref_id of songs in different directories can be the same
+        """
+        opts = Options(game_id='test-win-points', games_dest=str(self.tmpdir))
+        gen = GameGenerator(opts, MockMP3Editor(), MockDocumentGenerator(),
+                            Progress())
+        tracks = [Song(None, 1 + index % 3, song.metadata())
+                  for index, song in enumerate(self.songs[:40])]
+        self.assertTrue(gen.assign_song_ids(tracks))
+        cards: List[BingoTicket] = []
+        for _ in range(20):
+            card = BingoTicket(opts)
+            gen.select_songs_for_ticket(tracks, card, opts.songs_per_ticket())
+            cards.append(card)
+        expected = [max(tracks.index(track) + 1 for track in card.card_tracks)
+                    for card in cards]
+        self.assertEqual(gen.get_when_tickets_win(tracks, cards), expected)
+
+    def test_unrank_combination(self):
+        """Test that every rank gives a different combination"""
+        total, select = 9, 4
+        num_combinations = GameGenerator.combinations(total, select)
+        combinations = set()
+        for rank in range(num_combinations):
+            indexes = GameGenerator.unrank_combination(rank, total, select)
+            self.assertEqual(len(indexes), select)
+            self.assertEqual(indexes, sorted(set(indexes), reverse=True))
+            self.assertTrue(all(0 <= idx < total for idx in indexes))
+            combinations.add(tuple(indexes))
+        self.assertEqual(len(combinations), num_combinations)
+
+    def test_select_all_possible_tickets(self):
+        """Test that a game can use every possible combination of songs"""
+        opts = Options(game_id='test-all-tickets', games_dest=str(self.tmpdir))
+        gen = GameGenerator(opts, MockMP3Editor(), MockDocumentGenerator(),
+                            Progress())
+        tracks = self.songs[:17]
+        self.assertTrue(gen.assign_song_ids(tracks))
+        num_combinations = gen.combinations(len(tracks), opts.songs_per_ticket())
+        for _ in range(num_combinations):
+            gen.select_songs_for_ticket(tracks, BingoTicket(opts),
+                                        opts.songs_per_ticket())
+        self.assertEqual(len(gen.used_card_ids), num_combinations)
+        with self.assertRaises(ValueError):
+            gen.select_songs_for_ticket(tracks, BingoTicket(opts),
+                                        opts.songs_per_ticket())
+
     def assert_dictionary_equal(self, expected: Dict, actual: Dict,
                                 path: str = '') -> None:
         """
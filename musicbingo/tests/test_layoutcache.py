@@ -0,0 +1,40 @@
+"""
+Unit tests for LayoutCache
+"""
+import unittest
+
+from musicbingo.docgen.layoutcache import LayoutCache
+
+class TestLayoutCache(unittest.TestCase):
+    """tests of the LayoutCache class"""
+
+    def test_least_recently_used(self):
+        """Check that the least recently used item is removed when full"""
+        cache = LayoutCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_statistics(self):
+        """Check the hit rate statistics"""
+        cache = LayoutCache(10)
+        self.assertEqual(cache.hit_rate, 0.0)
+        self.assertIsNone(cache.get('a'))
+        cache.put('a', 1)
+        for _ in range(3):
+            cache.get('a')
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+        self.assertAlmostEqual(cache.hit_rate, 75.0)
+        self.assertIn('hit_rate=75.0%', repr(cache))
+        cache.clear()
+        self.assertEqual((len(cache), cache.hits, cache.misses), (0, 0, 0))
+        with self.assertRaises(ValueError):
+            LayoutCache(0)
+
+if __name__ == "__main__":
+    unittest.main()
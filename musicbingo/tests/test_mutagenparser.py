@@ -0,0 +1,104 @@
+"""
+Unit tests for MutagenParser
+"""
+from pathlib import Path
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+
+from mutagen.easyid3 import EasyID3 # type: ignore
+from mutagen.mp3 import MP3 # type: ignore
+from pydub import AudioSegment # type: ignore
+
+from musicbingo.mp3.exceptions import InvalidMP3Exception
+from musicbingo.mp3.mutagenparser import MutagenParser
+
+FFMPEG = shutil.which('ffmpeg')
+
+@unittest.skipUnless(FFMPEG, 'ffmpeg is required to create MP3 files')
+class TestMutagenParser(unittest.TestCase):
+    """tests of the MutagenParser class"""
+
+    # duration (in milliseconds) of the test MP3 file
+    CLIP_LENGTH: int = 4000
+
+    # the duration calculated from the MPEG headers includes the padding
+    # added by the encoder, which can be up to two MPEG frames
+    # (2 * 1152 samples)
+    TOLERANCE: int = 53
+
+    tmpdir: Path
+    clip: Path
+
+    @classmethod
+    def setUpClass(cls):
+        """create an MP3 file containing a test tone"""
+        cls.tmpdir = Path(tempfile.mkdtemp())
+        cls.clip = cls.tmpdir / 'Album' / 'tone.mp3'
+        cls.clip.parent.mkdir()
+        subprocess.run([str(FFMPEG), '-nostdin', '-v', 'error', '-y',
+                        '-f', 'lavfi', '-i',
+                        f'sine=frequency=440:duration={cls.CLIP_LENGTH/1000.0}',
+                        '-ac', '2', '-ar', '44100', '-b:a', '128k',
+                        '-id3v2_version', '3',
+                        '-metadata', 'artist=Test Artist',
+                        '-metadata', 'title=Test Tone',
+                        str(cls.clip)], check=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        """remove the MP3 file"""
+        shutil.rmtree(str(cls.tmpdir), ignore_errors=True)
+
+    def test_duration_from_frame_headers(self):
+        """
+        Check that the duration is calculated from the MPEG headers,
+        without decoding the file
+        """
+        parser = MutagenParser()
+        with mock.patch.object(AudioSegment, 'from_file') as from_file:
+            metadata = parser.parse(self.clip)
+        from_file.assert_not_called()
+        self.assertEqual(metadata.artist, 'Test Artist')
+        self.assertEqual(metadata.title, 'Test Tone')
+        self.assertEqual(metadata.album, 'Album')
+        self.assertEqual(metadata.filename, 'tone.mp3')
+        self.assertAlmostEqual(metadata.duration, self.CLIP_LENGTH, delta=self.TOLERANCE)
+
+    def test_sketchy_duration_decodes_file(self):
+        """
+        Check that the file is decoded if mutagen is not confident of
+        the duration it calculated from the MPEG headers
+        """
+        mp3info = MP3(str(self.clip), ID3=EasyID3)
+        mp3info.info.sketchy = True
+        mp3info.info.length = 1.0
+        duration = MutagenParser.duration(self.clip, mp3info)
+        self.assertAlmostEqual(duration, self.CLIP_LENGTH, delta=self.TOLERANCE)
+        mp3info.info = None
+        self.assertEqual(MutagenParser.duration(self.clip, mp3info), duration)
+
+    def test_decode_failure(self):
+        """Check that a file that cannot be decoded is reported"""
+        filename = self.tmpdir / 'invalid.mp3'
+        filename.write_bytes(b'not an MP3 file')
+        mp3info = MP3(str(self.clip), ID3=EasyID3)
+        mp3info.info.sketchy = True
+        with self.assertRaises(InvalidMP3Exception) as context:
+            MutagenParser.duration(filename, mp3info)
+        self.assertIsNotNone(context.exception.__cause__)
+
+    def test_missing_tags(self):
+        """Check that a file without an artist and title is rejected"""
+        filename = self.tmpdir / 'untagged.mp3'
+        shutil.copy(str(self.clip), str(filename))
+        mp3info = MP3(str(filename), ID3=EasyID3)
+        mp3info.delete()
+        with self.assertRaises(InvalidMP3Exception) as context:
+            MutagenParser().parse(filename)
+        self.assertIsInstance(context.exception.__cause__, KeyError)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,7 +4,7 @@ Tests of the Options() class and command line parsing
 from pathlib import Path
 import unittest
 
-from musicbingo.options import Options
+from musicbingo.options import LibraryOptions, Options
 
 class TestOptions(unittest.TestCase):
     """tests of the Options class"""
@@ -32,3 +32,32 @@ class TestOptions(unittest.TestCase):
                          outdir / '2020-02-14-1 Ticket Results.pdf')
         self.assertEqual(opts.ticket_checker_output_name(),
                          outdir / 'ticketTracks')
+
+    def test_library_options(self):
+        """
+        Check that the library and play history options are grouped
+        together
+        """
+        opts = Options.parse(['Clips'])
+        self.assertEqual(opts.library._asdict(), LibraryOptions()._asdict())
+        opts = Options.parse(['--library_index', '/tmp/lib.db', '--watch',
+                              '--play_history', 'history.db',
+                              '--exclude_games', '3', '--exclude_days', '0',
+                              '--distinct_artists', '--id', 'abc', 'Clips'])
+        self.assertEqual(opts.library._asdict(), {
+            'library_index': '/tmp/lib.db',
+            'watch': True,
+            'play_history': 'history.db',
+            'exclude_games': 3,
+            'exclude_days': 0,
+            'distinct_artists': True,
+        })
+        for key in LibraryOptions.FIELDS:
+            self.assertNotIn(key, opts.__dict__)
+        self.assertEqual(opts.game_id, 'abc')
+        self.assertEqual(opts.library_index_filename(), Path('/tmp/lib.db'))
+        self.assertEqual(opts.play_history_filename(),
+                         opts.games_directory() / 'history.db')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -8,7 +8,8 @@ import os
 from pathlib import Path
 import shutil
 import tempfile
-from typing import Collection, Iterable, List, Tuple, cast
+import re
+from typing import Collection, Iterable, Iterator, List, Tuple, cast
 import unittest
 from unittest import mock
 
@@ -20,6 +21,7 @@ from musicbingo.docgen.pdfgen import PDFGenerator
 from musicbingo.docgen.sizes import Dimension, PageSizes
 from musicbingo.docgen.styles import HorizontalAlignment, VerticalAlignment
 from musicbingo.docgen.styles import Padding, ElementStyle
+from musicbingo.progress import Progress
 
 class TestPDFGenerator(unittest.TestCase):
     """tests of the PDF generator"""
@@ -231,6 +233,7 @@ class TestPDFGenerator(unittest.TestCase):
         ]
         index = 0
         for box_row in range(0, 3):
+            row_colours: List[lib.colors.Color] = []
             for box_col in range(0, 5):
                 box_style = DG.ElementStyle(
                     name=f'bingo-cell-r{box_row}-c{box_col}',
@@ -239,13 +242,11 @@ class TestPDFGenerator(unittest.TestCase):
                 dg_table.style_cells(DG.CellPos(col=box_col, row=box_row),
                                      DG.CellPos(col=box_col, row=box_row),
                                      box_style)
-                expected_styles.append((
-                    'BACKGROUND',
-                    (box_col, box_row),
-                    (box_col, box_row),
-                    lib.colors.HexColor(box_style.background.css()),
-                ))
+                row_colours.append(PDFGenerator.translate_colour(box_style.background))
                 index += 1
+            # the background of each row is merged into one command
+            expected_styles.append((
+                'COLBACKGROUNDS', (0, box_row), (-1, box_row), tuple(row_colours)))
 
         pdfgen = PDFGenerator()
         pdf_styles = pdfgen.translate_table_style(
@@ -260,6 +261,138 @@ class TestPDFGenerator(unittest.TestCase):
         for dg_row, pdf_row in zip(row_heights, kwargs['rowHeights']):
             self.assertAlmostEqual(dg_row.points(), pdf_row)
 
+    def test_document_pages(self):
+        """Test splitting the elements of a document into pages"""
+        style = ElementStyle(name='para', fontSize=12, leading=14)
+        doc = DG.Document(PageSizes.A4)
+        self.assertEqual(doc.num_pages, 1)
+        self.assertEqual(list(doc.pages()), [])
+        paras = [DG.Paragraph(f'Para {idx}', style) for idx in range(3)]
+        breaks = [DG.PageBreak(), DG.PageBreak()]
+        for elt in [paras[0], breaks[0], paras[1], paras[2], breaks[1]]:
+            doc.append(elt)
+        self.assertEqual(doc.num_pages, 2)
+        self.assertEqual(list(doc.pages()),
+                         [[paras[0], breaks[0]], [paras[1], paras[2], breaks[1]]])
+        stream = DG.StreamingDocument(PageSizes.A4, iter(paras))
+        self.assertIsNone(stream.num_pages)
+        with self.assertRaises(ValueError):
+            stream.append(paras[0])
+        self.assertEqual(len(stream.as_dict()['elements']), 3)
+        # the elements created by as_dict() are used when rendering
+        self.assertEqual(list(stream.pages()), [paras])
+        with self.assertRaises(ValueError):
+            list(DG.StreamingDocument(PageSizes.A4, ['text']).pages())
+
+    def test_render_streaming_document(self):
+        """
+        Test that the elements of a StreamingDocument are created one
+        page at a time, while the document is being rendered
+        """
+        style = ElementStyle(name='para', colour='black', fontSize=12, leading=14)
+        created: List[int] = []
+
+        def elements() -> Iterator[DG.Element]:
+            for page in range(3):
+                for line in range(2):
+                    created.append(page)
+                    yield DG.Paragraph(f'Page {page} line {line}', style)
+                if page < 2:
+                    yield DG.PageBreak()
+
+        progress = Progress()
+        reports: List[Tuple[str, int]] = []
+        progress.on_change_text = lambda text: reports.append((text, len(created)))
+        filename = os.path.join(self.tmpdir, 'stream.pdf')
+        doc = DG.StreamingDocument(PageSizes.A4, elements(), num_pages=3)
+        PDFGenerator().render(filename, doc, progress)
+        self.assertEqual(reports, [('Page 1/3', 2), ('Page 2/3', 4), ('Page 3/3', 6)])
+        self.assertEqual(progress.pct, 100.0)
+        with open(filename, 'rb') as pdf:
+            self.assertEqual(len(re.findall(rb'/Type /Page\b', pdf.read())), 3)
+
+    def test_merge_cell_backgrounds(self):
+        """
+        Test that the background of each cell is converted into as few
+        Reportlab commands as possible
+        """
+        white = lib.colors.Color(1, 1, 1)
+        blue = lib.colors.Color(0, 0, 1)
+
+        def cells(colour_of):
+            return [('BACKGROUND', (col, row + 1), (col, row + 1), colour_of(col, row))
+                    for row in range(3) for col in range(5)]
+
+        merge = PDFGenerator.merge_cell_backgrounds
+        self.assertEqual(
+            merge(cells(lambda col, row: blue), 1, 4, 5),
+            [('BACKGROUND', (0, 1), (-1, 3), blue)])
+        self.assertEqual(
+            merge(cells(lambda col, row: blue if (col + row) & 1 else white), 1, 4, 5),
+            [('COLBACKGROUNDS', (0, 1), (-1, 1), (white, blue)),
+             ('COLBACKGROUNDS', (0, 2), (-1, 2), (blue, white)),
+             ('COLBACKGROUNDS', (0, 3), (-1, 3), (white, blue))])
+        self.assertEqual(
+            merge(cells(lambda col, row: blue if col < 2 else white), 1, 4, 5),
+            [('COLBACKGROUNDS', (0, 1), (-1, 3), (blue, blue, white, white, white))])
+        self.assertEqual(
+            merge(cells(lambda col, row: (blue, white, white)[row]), 1, 4, 5),
+            [('ROWBACKGROUNDS', (0, 1), (4, 3), (blue, white, white))])
+        gradient = [('BACKGROUND', (0, 1), (0, 1), ['VERTICAL', blue, white])]
+        self.assertEqual(merge(gradient, 1, 4, 5), gradient)
+
+    def test_merge_negative_cell_backgrounds(self):
+        """
+        Test that negative cell positions in BACKGROUND commands count
+        back from the last row or column of the table
+        """
+        white = lib.colors.Color(1, 1, 1)
+        blue = lib.colors.Color(0, 0, 1)
+        merge = PDFGenerator.merge_cell_backgrounds
+        checkerboard = [('BACKGROUND', (0, 0), (-1, -1), white)]
+        checkerboard += [('BACKGROUND', (col, row), (col, row), blue)
+                         for row in range(3) for col in range(5)
+                         if (col + row) & 1]
+        self.assertEqual(
+            merge(checkerboard, 0, 3, 5),
+            [('COLBACKGROUNDS', (0, 0), (-1, 0), (white, blue)),
+             ('COLBACKGROUNDS', (0, 1), (-1, 1), (blue, white)),
+             ('COLBACKGROUNDS', (0, 2), (-1, 2), (white, blue))])
+        columns = [('BACKGROUND', (1, 0), (1, -1), blue),
+                   ('BACKGROUND', (-2, 0), (-2, -1), blue)]
+        self.assertEqual(
+            merge(columns, 0, 3, 5),
+            [('COLBACKGROUNDS', (0, 0), (-1, 2), (None, blue))])
+        # the first row of a table with a heading, and the last row of a
+        # table with a footer, are not part of the body
+        self.assertEqual(merge(columns, 1, 4, 5, num_rows=4), columns)
+        columns = [('BACKGROUND', (1, 1), (1, -1), blue),
+                   ('BACKGROUND', (-2, 1), (-2, -1), blue)]
+        self.assertEqual(merge(columns, 1, 4, 5, num_rows=5), columns)
+        self.assertEqual(
+            merge(columns, 1, 4, 5, num_rows=4),
+            [('COLBACKGROUNDS', (0, 1), (-1, 3), (None, blue))])
+        outside = [('BACKGROUND', (-6, 0), (0, -1), blue)]
+        self.assertEqual(merge(outside, 0, 3, 5), outside)
+
+    def test_table_style_cache(self):
+        """Test that the style commands of identical tables are re-used"""
+        tstyle = DG.TableStyle(name='bingo-ticket', gridColour=Colour('black'))
+        pdfgen = PDFGenerator()
+        tables = []
+        for _ in range(2):
+            table = DG.Table([[[], []]], style=tstyle)
+            table.style_cells(DG.CellPos(col=0, row=0), DG.CellPos(col=0, row=0),
+                              background=Colour('blue'))
+            tables.append(table)
+        first = pdfgen.translate_table_style(tables[0], 0, 1, 2)
+        hits = pdfgen.layout_cache.hits
+        self.assertEqual(pdfgen.translate_table_style(tables[1], 0, 1, 2), first)
+        self.assertEqual(pdfgen.layout_cache.hits, hits + 1)
+        tables[1].style_cells(DG.CellPos(col=1, row=0), DG.CellPos(col=1, row=0),
+                              background=Colour('white'))
+        self.assertNotEqual(pdfgen.translate_table_style(tables[1], 0, 1, 2), first)
+
     @mock.patch('musicbingo.docgen.pdfgen.platypus.Table', autospec=True)
     def test_render_box(self, mock_table):
         """test rendering DG.Box to a reportlab table"""
@@ -308,6 +441,25 @@ class TestPDFGenerator(unittest.TestCase):
         self.assertStylesEqual(dg_style, pdf_style)
 
     #pylint: disable=invalid-name
+    def test_paragraph_layout_cache(self):
+        """Check that styles and line breaks are re-used between paragraphs"""
+        style = ElementStyle(name='ticket-cell', colour='black', fontSize=12,
+                             leading=12, alignment=HorizontalAlignment.CENTER)
+        pdfgen = PDFGenerator()
+        paras = [pdfgen.render_paragraph(DG.Paragraph('A song with a long title', style))
+                 for _ in range(3)]
+        self.assertIs(paras[0].style, paras[1].style)
+        sizes = [para.wrap(60, 200) for para in paras]
+        self.assertEqual(sizes[0], sizes[2])
+        self.assertGreater(sizes[0][1], 12)
+        self.assertIs(paras[0].blPara, paras[2].blPara)
+        # style, frags and wrap are each missed once
+        self.assertEqual(pdfgen.layout_cache.misses, 3)
+        self.assertEqual(pdfgen.layout_cache.hits, 6)
+        other = pdfgen.render_paragraph(DG.Paragraph('A song with a long title', style))
+        other.wrap(200, 200)
+        self.assertIsNot(other.blPara, paras[0].blPara)
+
     def assertListsEqual(self, expected: Collection, actual: Collection) -> None:
         """
         check that both lists are equal after rendering
@@ -0,0 +1,114 @@
+"""
+Unit tests for PlayHistory
+"""
+import datetime
+import json
+from pathlib import Path
+import shutil
+import tempfile
+import unittest
+
+from musicbingo.playhistory import PlayHistory
+from musicbingo.song import Metadata, Song
+
+class TestPlayHistory(unittest.TestCase):
+    """tests of the PlayHistory class"""
+
+    SONGS = [
+        ('Bohemian Rhapsody', 'Queen'),
+        ('Another One Bites the Dust', 'Queen'),
+        ('Rhapsody in Blue', 'George Gershwin'),
+        ('Nightswimming', 'R.E.M.'),
+    ]
+
+    def setUp(self):
+        """called before each test"""
+        self.tmpdir = Path(tempfile.mkdtemp())
+        self.songs = [
+            Song(None, idx, Metadata(title=title, artist=artist,
+                                     filepath=self.tmpdir / f'{idx:02d}.mp3'))
+            for idx, (title, artist) in enumerate(self.SONGS, 1)
+        ]
+        self.history = PlayHistory(self.tmpdir / 'history.db')
+
+    def tearDown(self):
+        """called after each test"""
+        self.history.close()
+        shutil.rmtree(str(self.tmpdir))
+
+    def test_song_identity(self):
+        """Check that a moved or re-encoded song has the same identity"""
+        moved = Song(None, 10, Metadata(
+            title='Bohemian Rhapsody (Remastered 2011)', artist='Queen',
+            duration=12345, filepath=self.tmpdir / 'other' / 'bohemian.mp3'))
+        self.assertEqual(PlayHistory.song_key(moved),
+                         PlayHistory.song_key(self.songs[0]))
+        self.assertEqual(
+            PlayHistory.song_key(Metadata(title='Bohemian Rhapsody', artist='Queen')),
+            PlayHistory.song_key(self.songs[0]))
+
+    def test_recent_songs(self):
+        """Check selecting songs by number of games and age of game"""
+        today = datetime.date.today()
+        self.history.add_game('old', self.songs[:1], today - datetime.timedelta(days=10))
+        self.history.add_game('yesterday', self.songs[1:2],
+                              today - datetime.timedelta(days=1))
+        self.history.add_game('today', self.songs[2:3])
+        key = PlayHistory.song_key
+        self.assertEqual(self.history.recent_songs(),
+                         {key(song) for song in self.songs[:3]})
+        self.assertEqual(self.history.recent_songs(days=1), {key(self.songs[2])})
+        self.assertEqual(self.history.recent_songs(days=2),
+                         {key(song) for song in self.songs[1:3]})
+        self.assertEqual(self.history.recent_songs(games=2),
+                         {key(song) for song in self.songs[1:3]})
+        self.assertEqual(self.history.last_played(self.songs[0]),
+                         ('old', today - datetime.timedelta(days=10)))
+        self.assertIsNone(self.history.last_played(self.songs[3]))
+        self.assertEqual(self.history.game_ids('to'), {'today'})
+
+    def test_import_games(self):
+        """Check that gameTracks.json files are only imported once"""
+        games_dest = self.tmpdir / 'games'
+        gamedir = games_dest / 'Game-20-01-01-1'
+        gamedir.mkdir(parents=True)
+        with (gamedir / 'gameTracks.json').open('w') as gt_file:
+            json.dump([{'title': title, 'artist': artist}
+                       for title, artist in self.SONGS[:2]], gt_file)
+        self.history.import_games(games_dest, 'Game-{game_id}', 'gameTracks.json')
+        self.assertEqual(self.history.game_ids(), {'20-01-01-1'})
+        self.assertEqual(self.history.recent_songs(),
+                         {PlayHistory.song_key(song) for song in self.songs[:2]})
+        shutil.rmtree(str(games_dest))
+        self.history.import_games(games_dest, 'Game-{game_id}', 'gameTracks.json')
+        self.assertEqual(len(self.history), 1)
+
+    def test_import_invalid_games(self):
+        """
+        Check that old format and invalid gameTracks.json files do not
+        stop the other games being imported
+        """
+        games_dest = self.tmpdir / 'games'
+        contents = {
+            'Game-old': json.dumps([
+                {'songId': 1, 'index': 0, 'title': title, 'artist': artist}
+                for title, artist in self.SONGS[:2]]),
+            'Game-new': json.dumps([{'title': self.SONGS[2][0],
+                                     'artist': self.SONGS[2][1]}]),
+            'Game-truncated': '[{"title": "abc", ',
+            'Game-no-artist': json.dumps([{'title': 'abc'}]),
+            'Game-not-list': json.dumps({'title': 'abc'}),
+        }
+        for dirname, text in contents.items():
+            (games_dest / dirname).mkdir(parents=True)
+            (games_dest / dirname / 'gameTracks.json').write_text(text)
+        self.history.import_games(games_dest, 'Game-{game_id}', 'gameTracks.json')
+        self.assertEqual(self.history.game_ids(), {'old', 'new'})
+        self.assertEqual(self.history.recent_songs(),
+                         {PlayHistory.song_key(song) for song in self.songs[:3]})
+        # the invalid files are not imported again
+        self.history.import_games(games_dest, 'Game-{game_id}', 'gameTracks.json')
+        self.assertEqual(len(self.history), 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,279 @@
+"""
+Unit tests for PydubEditor
+"""
+import os
+from pathlib import Path
+import shutil
+import subprocess
+import tempfile
+from typing import List, Optional
+import unittest
+from unittest import mock
+
+import numpy # type: ignore
+from pydub import AudioSegment # type: ignore
+
+from musicbingo.assets import Assets
+from musicbingo.generator import GameGenerator
+from musicbingo.mp3 import MP3Factory
+from musicbingo.mp3.editor import FileMode, MP3File
+from musicbingo.mp3.exceptions import InvalidMP3Exception
+from musicbingo.mp3.pydubeditor import PydubEditor
+from musicbingo.options import Options
+from musicbingo.progress import Progress
+from musicbingo.song import Metadata, Song
+
+from .mock_docgen import MockDocumentGenerator
+from .mock_random import MockRandom
+
+FFMPEG = shutil.which('ffmpeg')
+
+@unittest.skipUnless(FFMPEG, 'ffmpeg is required to decode MP3 files')
+class TestPydubEditor(unittest.TestCase):
+    """tests of the PydubEditor class"""
+
+    # frequencies of the test tones used to create the MP3 clips
+    TONES: List[int] = [220, 330, 440, 550, 660, 770]
+
+    # duration (in milliseconds) of each MP3 clip
+    CLIP_LENGTH: int = 3000
+
+    tmpdir: Path
+    clips: List[Path]
+
+    @classmethod
+    def setUpClass(cls):
+        """create a set of MP3 clips, each containing a different tone"""
+        cls.tmpdir = Path(tempfile.mkdtemp())
+        cls.clips = []
+        for freq in cls.TONES:
+            filename = cls.tmpdir / f'{freq}.mp3'
+            cls.ffmpeg('-f', 'lavfi', '-i',
+                       f'sine=frequency={freq}:duration={cls.CLIP_LENGTH/1000.0}',
+                       '-ac', '2', '-ar', '44100', '-b:a', '128k', str(filename))
+            cls.clips.append(filename)
+
+    @classmethod
+    def tearDownClass(cls):
+        """remove the MP3 clips"""
+        shutil.rmtree(str(cls.tmpdir), ignore_errors=True)
+
+    @staticmethod
+    def ffmpeg(*args: str) -> None:
+        """run ffmpeg with the given arguments"""
+        subprocess.run([str(FFMPEG), '-nostdin', '-v', 'error', '-y'] + list(args),
+                       check=True)
+
+    def decode_all(self, filename: Path) -> AudioSegment:
+        """
+        decode an entire MP3 file, without using PydubEditor
+        """
+        wav_file = filename.with_suffix('.wav')
+        self.ffmpeg('-i', str(filename), '-ar', '44100', '-ac', '2',
+                    '-f', 'wav', str(wav_file))
+        try:
+            return AudioSegment.from_wav(str(wav_file))
+        finally:
+            wav_file.unlink()
+
+    def mp3file(self, index: int, start: int = 0,
+                end: int = CLIP_LENGTH) -> MP3File:
+        """create an MP3File for a section of one of the test clips"""
+        return MP3File(self.clips[index], FileMode.READ_ONLY,
+                       start=start, end=end)
+
+    def test_decode_section_matches_slice(self):
+        """
+        Check that decoding a section of a file using seeking produces
+        the same audio as slicing the decoded file
+        """
+        editor = PydubEditor(workers=1)
+        full = self.decode_all(self.clips[0])
+        for start, end in [(0, 1000), (50, 1250), (1000, 2500),
+                           (2500, self.CLIP_LENGTH)]:
+            seg = editor._decode_file(self.mp3file(0, start, end))
+            expected = full[start:end]
+            self.assertEqual(len(seg), end - start)
+            self.assertEqual(seg.frame_count(), expected.frame_count())
+            self.assertEqual(seg.raw_data, expected.raw_data,
+                             f'section {start} to {end}')
+
+    def test_decode_missing_file(self):
+        """Check that the ffmpeg error message is reported"""
+        editor = PydubEditor(workers=1)
+        mp3file = MP3File(self.tmpdir / 'missing.mp3', FileMode.READ_ONLY,
+                          start=0, end=1000)
+        with self.assertRaises(InvalidMP3Exception) as context:
+            editor._decode_file(mp3file)
+        self.assertIn('missing.mp3', str(context.exception))
+        self.assertIsInstance(context.exception.__cause__,
+                              subprocess.CalledProcessError)
+
+    def generate(self, editor: PydubEditor, filename: Path,
+                 sections: List[MP3File],
+                 progress: Optional[Progress] = None) -> None:
+        """create an MP3 file from the given list of sections"""
+        output = editor.create(filename, bitrate='128k', progress=progress)
+        for mp3file in sections:
+            output.append(mp3file)
+        output.generate()
+
+    def test_streaming_matches_export(self):
+        """
+        Check that encoding while decoding produces the same audio as
+        encoding the combined clips in one go
+        """
+        sections = [self.mp3file(0, 0, 1000), self.mp3file(1, 500, 2000),
+                    self.mp3file(2, 1000, 2500)]
+        streamed = self.tmpdir / 'streamed.mp3'
+        exported = self.tmpdir / 'exported.mp3'
+        self.generate(PydubEditor(workers=1, streaming=True), streamed, sections)
+        self.generate(PydubEditor(workers=1, streaming=False), exported, sections)
+        streamed_audio = self.decode_all(streamed)
+        exported_audio = self.decode_all(exported)
+        self.assertEqual(streamed_audio.frame_count(),
+                         exported_audio.frame_count())
+        self.assertEqual(streamed_audio.raw_data, exported_audio.raw_data)
+
+    def test_abort_removes_output(self):
+        """
+        Check that the partial output file is removed if generation is
+        aborted part way through
+        """
+
+        class AbortProgress(Progress):
+            """progress that aborts when the second file is added"""
+            def on_change_text(self, text: str) -> None:
+                if text.startswith('Adding') and self.pct > 0:
+                    self.abort = True
+
+        filename = self.tmpdir / 'aborted.mp3'
+        progress = AbortProgress()
+        sections = [self.mp3file(idx) for idx in range(len(self.clips))]
+        self.generate(PydubEditor(workers=1), filename, sections, progress)
+        self.assertTrue(progress.abort)
+        self.assertFalse(filename.exists())
+
+    def test_decode_failure_removes_output(self):
+        """
+        Check that the encoder is stopped and the partial output file
+        is removed if one of the input files cannot be decoded
+        """
+        filename = self.tmpdir / 'failed.mp3'
+        missing = MP3File(self.tmpdir / 'missing.mp3', FileMode.READ_ONLY,
+                          start=0, end=1000)
+        editor = PydubEditor(workers=1)
+        with mock.patch.object(PydubEditor, '_abort_encoder',
+                               wraps=PydubEditor._abort_encoder) as abort:
+            with self.assertRaises(InvalidMP3Exception):
+                self.generate(editor, filename, [self.mp3file(0), missing])
+        abort.assert_called_once()
+        proc = abort.call_args[0][0]
+        self.assertIsNotNone(proc.returncode)
+        self.assertFalse(filename.exists())
+
+    def test_encoder_failure(self):
+        """Check that an error reported by the encoder is reported"""
+        filename = self.tmpdir / 'invalid.mp3'
+        editor = PydubEditor(workers=1)
+        output = editor.create(filename, bitrate='not-a-bitrate')
+        output.append(self.mp3file(0))
+        with self.assertRaises(InvalidMP3Exception):
+            output.generate()
+        self.assertFalse(filename.exists())
+
+    def test_decode_ahead_order(self):
+        """
+        Check that decoding using several workers returns the decoded
+        clips in the order they were requested, including clips that
+        are requested more than once
+        """
+        sections: List[MP3File] = []
+        for index in range(len(self.clips)):
+            sections.append(self.mp3file(index, 100 * index, 1500 + 100 * index))
+            sections.append(self.mp3file(0, 0, 1000))
+        sequential = PydubEditor(workers=1)
+        expected = [sequential._decode_file(mp3file).raw_data
+                    for mp3file in sections]
+        editor = PydubEditor(workers=4, lookahead=3)
+        decoded = [seg.raw_data for seg in editor._decode_ahead(sections)]
+        self.assertEqual(len(decoded), len(expected))
+        for index, (dec, exp) in enumerate(zip(decoded, expected)):
+            self.assertEqual(dec, exp, f'section {index}')
+        self.assertEqual(len(editor.cache), len(self.clips) + 1)
+
+    def test_decode_ahead_shares_decoding(self):
+        """
+        Check that a clip that is requested again while it is still
+        being decoded is only decoded once
+        """
+        sections = [self.mp3file(0, 0, 1000) for _ in range(8)]
+        editor = PydubEditor(workers=4, lookahead=8)
+        with mock.patch.object(editor, '_decode_file',
+                               wraps=editor._decode_file) as decode_file:
+            decoded = [seg.raw_data for seg in editor._decode_ahead(sections)]
+        decode_file.assert_called_once()
+        self.assertEqual(len(set(decoded)), 1)
+        self.assertEqual(editor._in_flight, {})
+
+    def test_decode_options(self):
+        """Check that the parallel decode options are used by the editor"""
+        opts = Options.parse(['--decode_workers', '1',
+                              '--decode_lookahead', '5', 'Clips'])
+        editor = MP3Factory.create_editor(workers=opts.decode_workers,
+                                          lookahead=opts.decode_lookahead)
+        self.assertIsInstance(editor, PydubEditor)
+        self.assertEqual((editor.workers, editor.lookahead), (1, 5))
+        opts = Options.parse(['Clips'])
+        editor = MP3Factory.create_editor(workers=opts.decode_workers,
+                                          lookahead=opts.decode_lookahead)
+        self.assertEqual(editor.workers, os.cpu_count() or 1)
+        self.assertEqual(editor.lookahead, 2 * editor.workers)
+
+    def test_generate_game_with_workers(self):
+        """
+        Check that a game generated using several decode workers has
+        its songs in the same order as the track listing, and is the
+        same as a game generated using one worker
+        """
+        songs: List[Song] = []
+        for index, filename in enumerate(self.clips, 1):
+            metadata = Metadata(title=f'Tone {self.TONES[index - 1]}',
+                                artist='Test', filename=filename.name,
+                                filepath=filename,
+                                duration=self.CLIP_LENGTH)
+            songs.append(Song(None, index, metadata))
+        audio: List[AudioSegment] = []
+        tracks: List[List[Song]] = []
+        for workers in [1, 4]:
+            opts = Options(game_id=f'workers-{workers}',
+                           games_dest=str(self.tmpdir), title='Workers')
+            gen = GameGenerator(opts, PydubEditor(workers=workers, lookahead=3),
+                                MockDocumentGenerator(), Progress())
+            gen.rand = MockRandom()
+            gen.game_songs = songs
+            opts.game_destination_dir().mkdir(parents=True)
+            tracks.append(gen.generate_mp3())
+            audio.append(self.decode_all(opts.mp3_output_name()))
+        self.assertEqual([track.title for track in tracks[0]],
+                         [track.title for track in tracks[1]])
+        self.assertNotEqual([track.title for track in tracks[0]],
+                            [song.title for song in songs])
+        self.assertEqual(audio[0].raw_data, audio[1].raw_data)
+        pos = Assets.countdown().duration
+        for track in tracks[1]:
+            tone = self.TONES[track.ref_id - 1]
+            self.assertEqual(self.dominant_frequency(
+                audio[1][pos + 500:pos + self.CLIP_LENGTH - 500]), tone)
+            pos += self.CLIP_LENGTH + Assets.transition().duration
+
+    @staticmethod
+    def dominant_frequency(seg: AudioSegment) -> int:
+        """find the loudest frequency (in Hz) in the given audio"""
+        samples = numpy.array(seg.split_to_mono()[0].get_array_of_samples())
+        spectrum = numpy.abs(numpy.fft.rfft(samples))
+        freqs = numpy.fft.rfftfreq(len(samples), 1.0 / seg.frame_rate)
+        return int(round(freqs[numpy.argmax(spectrum)]))
+
+if __name__ == '__main__':
+    unittest.main()
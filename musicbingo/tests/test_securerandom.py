@@ -0,0 +1,58 @@
+"""
+Unit tests for SecureRandom
+"""
+import unittest
+
+from musicbingo.securerandom import SecureRandom, UniqueSampler
+
+class TestSecureRandom(unittest.TestCase):
+    """tests of the SecureRandom class"""
+
+    def test_same_seed_gives_same_stream(self):
+        """Check that the output only depends upon the seed"""
+        rand1 = SecureRandom(b'seed')
+        rand2 = SecureRandom(b'seed')
+        self.assertEqual(rand1.random_bytes(100000), rand2.random_bytes(100000))
+        self.assertNotEqual(SecureRandom().random_bytes(32),
+                            SecureRandom().random_bytes(32))
+
+    def test_below(self):
+        """Check that every value is within its own range"""
+        rand = SecureRandom()
+        limits = list(range(1, 1000))
+        for value, limit in zip(rand.below(limits).tolist(), limits):
+            self.assertGreaterEqual(value, 0)
+            self.assertLess(value, limit)
+
+    def test_randbelow_large_numbers(self):
+        """Check that randbelow supports numbers larger than 64 bits"""
+        rand = SecureRandom()
+        limit = 1 << 200
+        values = [rand.randbelow(limit) for _ in range(100)]
+        self.assertTrue(all(0 <= value < limit for value in values))
+        self.assertGreater(max(values), 1 << 64)
+
+    def test_unique_sampler(self):
+        """Check that UniqueSampler picks unique items"""
+        rand = SecureRandom()
+        for population, amount in [(40, 15), (15, 15), (10, 0), (1 << 70, 20)]:
+            sampler = UniqueSampler(rand, population)
+            picked = [sampler.next() for _ in range(amount)]
+            self.assertEqual(len(set(picked)), amount)
+            self.assertTrue(all(0 <= value < population for value in picked))
+            self.assertEqual(sampler.remaining, population - amount)
+        sampler = UniqueSampler(rand, 10)
+        self.assertEqual(sorted(sampler.next() for _ in range(10)), list(range(10)))
+        with self.assertRaises(ValueError):
+            sampler.next()
+
+    def test_shuffle(self):
+        """Check that shuffle() produces a permutation of its input"""
+        rand = SecureRandom()
+        items = list(range(100))
+        rand.shuffle(items)
+        self.assertEqual(sorted(items), list(range(100)))
+        self.assertNotEqual(items, list(range(100)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+"""
+Unit tests for Song and SongTable
+"""
+import copy
+import gc
+from pathlib import Path
+import pickle
+import threading
+from typing import List
+import unittest
+
+from musicbingo.song import Duration, Metadata, Song
+
+class TestSong(unittest.TestCase):
+    """tests of the Song class"""
+
+    @staticmethod
+    def make_song(ref_id: int = 1, title: str = 'Title (Radio Edit)') -> Song:
+        """create a Song for use in a test"""
+        return Song(None, ref_id, Metadata(
+            title=title, artist='Artist (ft.)', album='Album',
+            duration=Duration(1234), filename='a.mp3',
+            filepath=Path('/music/album/a.mp3')))
+
+    def test_attributes(self):
+        """Check that the attributes are stored in the table"""
+        song = self.make_song()
+        self.assertEqual(song.title, 'Title')
+        self.assertEqual(song.artist, 'Artist ft.')
+        self.assertEqual(song.duration, 1234)
+        self.assertEqual(song.filepath, Path('/music/album/a.mp3'))
+        song.song_id = 1 << 100
+        self.assertEqual(song.song_id, 1 << 100)
+        self.assertEqual(song.marshall(exclude=['ref_id', 'filepath']), {
+            'title': 'Title', 'artist': 'Artist ft.', 'album': 'Album',
+            'song_id': 1 << 100, 'duration': 1234, 'start_time': 0,
+            'filename': 'a.mp3', 'title_key': 'title', 'artist_key': 'artist ft'})
+        with self.assertRaises(AttributeError):
+            song.unknown = 1 # pylint: disable=assigning-non-slot
+
+    def test_normalise(self):
+        """Check that titles are only cleaned up once"""
+        metadata = Song.normalise(Metadata(title='Song (Single Version)',
+                                           artist='The Band'))
+        self.assertEqual(metadata.title, 'Song')
+        self.assertEqual((metadata.title_key, metadata.artist_key), ('song', 'the band'))
+        self.assertIs(Song.normalise(metadata), metadata)
+        song = Song(None, 1, metadata)
+        self.assertEqual(song.sort_key('title'), 'song')
+        song.artist = 'Another Band'
+        self.assertEqual(song.sort_key('artist'), 'another band')
+
+    def test_hash(self):
+        """Check that the cached hash is updated when the key changes"""
+        song = self.make_song(1)
+        other = self.make_song(2)
+        self.assertEqual(song, other)
+        self.assertEqual(hash(song), hash(other))
+        other.title = 'Another title'
+        self.assertNotEqual(song, other)
+        self.assertEqual(hash(other), hash(self.make_song(3, 'Another title')))
+        song.song_id = 4
+        self.assertEqual(hash(song), hash(self.make_song(5)))
+
+    def test_rows_reused(self):
+        """Check that the rows of deleted songs are re-used"""
+        gc.collect()
+        songs = [self.make_song(idx) for idx in range(10)]
+        rows = len(Song.table)
+        del songs
+        gc.collect()
+        self.assertEqual(len(Song.table), rows - 10)
+        song = self.make_song(20)
+        self.assertEqual(song.ref_id, 20)
+        self.assertEqual(len(Song.table), rows - 9)
+
+    def test_copy_and_pickle(self):
+        """
+        Check that copies of a Song have their own row of the table, so
+        that they are not changed when the original is deleted
+        """
+        song = self.make_song(7)
+        song.song_id = 1 << 70
+        song.start_time = '1:23'
+        expected = song.marshall()
+        copies = [copy.copy(song), copy.deepcopy(song),
+                  pickle.loads(pickle.dumps(song))]
+        rows = {song._row}
+        for item in copies:
+            self.assertIsNot(item, song)
+            self.assertEqual(item.marshall(), expected)
+            rows.add(item._row)
+        self.assertEqual(len(rows), 4)
+        copies[0].title = 'Changed'
+        self.assertEqual(song.title, 'Title')
+        del song
+        gc.collect()
+        self.make_song(8, 'Re-uses a row')
+        for item in copies[1:]:
+            self.assertEqual(item.marshall(), expected)
+
+    def test_str(self):
+        """Check that the song_id is only included once it has been assigned"""
+        song = self.make_song(3)
+        self.assertNotIn('song_id', str(song))
+        song.song_id = 1 << 4
+        self.assertIn('song_id=16', str(song))
+
+    def test_parallel_changes(self):
+        """
+        Check that songs can be created, changed and deleted by several
+        threads at the same time
+        """
+        num_threads = 8
+        errors: List[str] = []
+
+        def worker(offset: int) -> None:
+            for index in range(500):
+                song = self.make_song(offset + index, f'Title {offset} {index}')
+                song.song_id = 1 << index
+                song.filepath = Path(f'/music/{offset}/{index}.mp3')
+                if (song.song_id, song.title, song.filepath) != (
+                        1 << index, f'Title {offset} {index}',
+                        Path(f'/music/{offset}/{index}.mp3')):
+                    errors.append(str(song))
+                del song
+
+        threads = [threading.Thread(target=worker, args=(1000 * idx,))
+                   for idx in range(num_threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+if __name__ == "__main__":
+    unittest.main()
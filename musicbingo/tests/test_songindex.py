@@ -0,0 +1,54 @@
+"""
+Unit tests for SongIndex
+"""
+import unittest
+
+from musicbingo.song import Metadata, Song
+from musicbingo.songindex import SongIndex
+
+class TestSongIndex(unittest.TestCase):
+    """tests of the SongIndex class"""
+
+    SONGS = [
+        ('Bohemian Rhapsody', 'Queen', 'A Night at the Opera'),
+        ('Another One Bites the Dust', 'Queen', 'The Game'),
+        ('Rhapsody in Blue', 'George Gershwin', 'Gershwin Plays Gershwin'),
+        ('Nightswimming', 'R.E.M.', 'Automatic for the People'),
+    ]
+
+    def setUp(self):
+        """called before each test"""
+        self.songs = [
+            Song(None, idx, Metadata(title=title, artist=artist, album=album,
+                                     filename=f'{idx:02d} {title}.mp3'))
+            for idx, (title, artist, album) in enumerate(self.SONGS, 1)
+        ]
+        self.index = SongIndex(self.songs)
+
+    def test_prefix_search(self):
+        """Check that every query word must match the start of a word"""
+        self.assertEqual(self.index.search('queen'), {1, 2})
+        self.assertEqual(self.index.search('rhaps'), {1, 3})
+        self.assertEqual(self.index.search('RHAP que'), {1})
+        self.assertEqual(self.index.search('night'), {1, 4})
+        self.assertEqual(self.index.search('ight', fuzzy=False), set())
+        self.assertEqual(self.index.search('04'), {4})
+        self.assertEqual(self.index.search('  '), {1, 2, 3, 4})
+
+    def test_fuzzy_search(self):
+        """Check that misspelt words find similar words"""
+        self.assertEqual(self.index.search('bohemain'), {1})
+        self.assertEqual(self.index.search('gershwinn blue'), {3})
+        self.assertEqual(self.index.search('bohemain', fuzzy=False), set())
+
+    def test_add_and_remove(self):
+        """Check that the index is updated when songs change"""
+        self.index.remove(self.songs[0])
+        self.assertEqual(self.index.search('queen'), {2})
+        self.assertEqual(self.index.search('bohemian', fuzzy=False), set())
+        self.index.add(self.songs[0])
+        self.assertEqual(self.index.search('bohemian'), {1})
+        self.assertEqual(len(self.index), 4)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+"""
+Unit tests for SongSampler
+"""
+import unittest
+
+from musicbingo.playhistory import PlayHistory
+from musicbingo.securerandom import SecureRandom
+from musicbingo.song import Metadata, Song
+from musicbingo.songsampler import SongSampler
+
+class TestSongSampler(unittest.TestCase):
+    """tests of the SongSampler class"""
+
+    def setUp(self):
+        """called before each test"""
+        self.songs = [
+            Song(None, idx, Metadata(title=f'Song {idx}', artist=f'Artist {idx % 5}'))
+            for idx in range(1, 101)
+        ]
+        self.sampler = SongSampler(self.songs, SecureRandom(b'seed'))
+
+    def test_unique_songs(self):
+        """Check that songs are chosen without replacement"""
+        chosen = self.sampler.sample(60)
+        self.assertEqual(len(chosen), 60)
+        self.assertEqual(len({song.ref_id for song in chosen}), 60)
+        self.assertEqual(len(self.sampler.sample(200)), 100)
+
+    def test_exclusions(self):
+        """Check that excluded and rejected songs are never chosen"""
+        exclude_ids = set(range(1, 51))
+        exclude_keys = {PlayHistory.song_key(song) for song in self.songs[50:60]}
+        chosen = self.sampler.sample(100, exclude_ids=exclude_ids,
+                                     exclude_keys=exclude_keys,
+                                     accept=lambda song: song.ref_id % 2 == 0)
+        self.assertEqual(sorted(song.ref_id for song in chosen),
+                         list(range(62, 101, 2)))
+
+    def test_distinct_artists(self):
+        """Check that repeated artists are only used when required"""
+        chosen = self.sampler.sample(5, distinct_artists=True)
+        self.assertEqual(len({song.artist for song in chosen}), 5)
+        chosen = self.sampler.sample(8, distinct_artists=True)
+        self.assertEqual(len(chosen), 8)
+        self.assertEqual(len({song.artist for song in chosen[:5]}), 5)
+
+if __name__ == "__main__":
+    unittest.main()
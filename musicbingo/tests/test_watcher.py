@@ -0,0 +1,131 @@
+"""
+Unit tests for DirectoryWatcher
+"""
+import os
+from pathlib import Path
+import shutil
+import tempfile
+import threading
+import unittest
+
+from musicbingo.directory import Directory
+from musicbingo.progress import Progress
+from musicbingo.song import Metadata
+from musicbingo.watcher import ChangeAction, DirectoryWatcher
+
+from .mock_parser import MockMP3Parser
+
+class TestDirectoryWatcher(unittest.TestCase):
+    """tests of the DirectoryWatcher class"""
+
+    FILES = ['a.mp3', 'b.mp3', 'sub1/c.mp3', 'sub2/deeper/d.mp3']
+
+    def setUp(self):
+        """called before each test"""
+        self.tmpdir = Path(tempfile.mkdtemp())
+        self.parser = MockMP3Parser({})
+        for name in self.FILES + ['sub1/e.mp3', 'new/f.mp3']:
+            filename = self.tmpdir / name
+            self.parser.testcases[filename.name] = Metadata(
+                title=f'Title {filename.stem}', artist=f'Artist {filename.stem}',
+                duration=1000, filename=filename.name, filepath=filename)
+        for name in self.FILES:
+            (self.tmpdir / name).parent.mkdir(parents=True, exist_ok=True)
+            (self.tmpdir / name).touch()
+
+    def tearDown(self):
+        """called after each test"""
+        shutil.rmtree(str(self.tmpdir))
+
+    def test_changes(self):
+        """Check that added and removed files are applied to the tree"""
+        clips = Directory(None, 1, self.tmpdir, self.parser, Progress())
+        clips.parallel_search()
+        self.assertEqual(clips.total_length(), 4)
+        watcher = DirectoryWatcher(clips, self.parser)
+        watcher.poll()
+        self.assertEqual(watcher.apply_changes(), [])
+        (self.tmpdir / 'a.mp3').unlink()
+        (self.tmpdir / 'sub1' / 'e.mp3').write_bytes(b'')
+        (self.tmpdir / 'new').mkdir()
+        (self.tmpdir / 'new' / 'f.mp3').write_bytes(b'')
+        shutil.rmtree(str(self.tmpdir / 'sub2' / 'deeper'))
+        watcher.poll()
+        changes = [(action, item.filename) for action, item in watcher.apply_changes()]
+        self.assertEqual(sorted(changes), sorted([
+            (ChangeAction.REMOVE_SONG, 'a.mp3'),
+            (ChangeAction.ADD_DIRECTORY, 'new'),
+            (ChangeAction.ADD_SONG, 'f.mp3'),
+            (ChangeAction.ADD_SONG, 'e.mp3'),
+            (ChangeAction.REMOVE_DIRECTORY, 'deeper'),
+        ]))
+        titles = sorted(song.title for song in clips.get_songs(clips.ref_id))
+        self.assertEqual(titles, ['Title b', 'Title c', 'Title e', 'Title f'])
+        new_dir = clips.find_directory(self.tmpdir / 'new')
+        self.assertIsNotNone(new_dir)
+        self.assertEqual([song.filename for song in new_dir.songs], ['f.mp3'])
+        ref_ids = [song.ref_id for song in clips.get_songs(clips.ref_id)]
+        self.assertEqual(len(ref_ids), len(set(ref_ids)))
+
+    def test_modified_in_place(self):
+        """
+        Check that a song that is overwritten in place is parsed again,
+        even though its directory has not changed
+        """
+        clips = Directory(None, 1, self.tmpdir, self.parser, Progress())
+        clips.parallel_search()
+        watcher = DirectoryWatcher(clips, self.parser)
+        watcher.poll()
+        self.assertEqual(watcher.apply_changes(), [])
+        sub1 = self.tmpdir / 'sub1'
+        dir_stats = sub1.stat()
+        with (sub1 / 'c.mp3').open('r+b') as mp3file:
+            mp3file.write(b'new contents')
+        os.utime(str(sub1), ns=(dir_stats.st_atime_ns, dir_stats.st_mtime_ns))
+        self.parser.testcases['c.mp3'] = self.parser.testcases['c.mp3']._replace(
+            title='New title')
+        watcher.poll()
+        changes = [(action, item.title) for action, item in watcher.apply_changes()]
+        self.assertEqual(changes, [(ChangeAction.REMOVE_SONG, 'Title c'),
+                                   (ChangeAction.ADD_SONG, 'New title')])
+        titles = sorted(song.title for song in clips.get_songs(clips.ref_id))
+        self.assertEqual(titles, ['New title', 'Title a', 'Title b', 'Title d'])
+        watcher.poll()
+        self.assertEqual(watcher.apply_changes(), [])
+
+    def test_stop_without_waiting(self):
+        """
+        Check that the watcher can be told to stop while it is parsing a
+        file, without waiting for the parsing to finish
+        """
+        clips = Directory(None, 1, self.tmpdir, self.parser, Progress())
+        clips.parallel_search()
+        parsing = threading.Event()
+        release = threading.Event()
+
+        class SlowParser(MockMP3Parser):
+            """parser that blocks until it is released"""
+            def parse(self, filename: Path) -> Metadata:
+                parsing.set()
+                release.wait()
+                return super(SlowParser, self).parse(filename)
+
+        watcher = DirectoryWatcher(clips, SlowParser(self.parser.testcases),
+                                   interval=0.01)
+        watcher.poll()
+        watcher.start()
+        (self.tmpdir / 'sub1' / 'e.mp3').write_bytes(b'')
+        self.assertTrue(parsing.wait(5))
+        watcher.stop(wait=False)
+        closer = threading.Thread(target=watcher.close)
+        closer.start()
+        closer.join(0.1)
+        self.assertTrue(closer.is_alive())
+        release.set()
+        closer.join(5)
+        self.assertFalse(closer.is_alive())
+        changes = [(action, item.filename) for action, item in watcher.apply_changes()]
+        self.assertEqual(changes, [(ChangeAction.ADD_SONG, 'e.mp3')])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,258 @@
+"""
+Watches a song library for changes, so that they can be applied to a
+Directory tree without searching the whole library again.
+"""
+
+from enum import IntEnum, auto
+import os
+from pathlib import Path
+import queue
+import threading
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple, Union
+
+from musicbingo.directory import Directory
+from musicbingo.mp3.exceptions import InvalidMP3Exception
+from musicbingo.mp3.parser import MP3Parser
+from musicbingo.song import Metadata, Song
+
+class ChangeAction(IntEnum):
+    """the types of change that can be made to a song library"""
+    ADD_SONG = auto()
+    REMOVE_SONG = auto()
+    ADD_DIRECTORY = auto()
+    REMOVE_DIRECTORY = auto()
+
+class LibraryChange(NamedTuple):
+    """one change to the song library"""
+    action: ChangeAction
+    path: Path
+    metadata: Optional[Metadata] = None
+
+# the (mtime_ns, size) of an MP3 file, or None if not yet known
+FileState = Optional[Tuple[int, int]]
+
+class DirectoryState:
+    """the state of one directory the last time it was checked"""
+    def __init__(self, songs: Dict[str, FileState], subdirectories: Set[str]) -> None:
+        self.mtime_ns: Optional[int] = None
+        self.songs = songs
+        self.subdirectories = subdirectories
+
+class DirectoryWatcher:
+    """
+    Watches a song library for added, removed, renamed and modified
+    files and directories.
+    A background thread polls the modification time of every directory
+    in the library, and only lists the contents of the directories that
+    have changed. A file that is overwritten in place does not change
+    its directory, so the modification time and size of every song in
+    an unchanged directory is also checked. A modified song is reported
+    as being removed and then added again. Each change is added to a
+    queue, which is used by apply_changes() to update the Directory
+    tree. apply_changes() must be called from the thread that
+    owns the Directory tree (e.g. the GUI thread).
+    """
+
+    POLL_INTERVAL: float = 5.0
+
+    def __init__(self, root: Directory, parser: MP3Parser,
+                 interval: float = POLL_INTERVAL) -> None:
+        self.root = root
+        self.parser = parser
+        self.index = root.index
+        self.interval = interval
+        self.changes: "queue.Queue[LibraryChange]" = queue.Queue()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._state: Dict[Path, DirectoryState] = {}
+        self._next_ref_id: int = self._add_state(root) + 1
+
+    def _add_state(self, directory: Directory) -> int:
+        """
+        record the contents of a directory and its sub-directories.
+        Returns the largest ref_id found
+        """
+        max_ref_id = directory.ref_id
+        self._state[directory.directory] = DirectoryState(
+            {song.filename: None for song in directory.songs},
+            {sub_dir.filename for sub_dir in directory.subdirectories})
+        for song in directory.songs:
+            max_ref_id = max(max_ref_id, song.ref_id)
+        for sub_dir in directory.subdirectories:
+            max_ref_id = max(max_ref_id, self._add_state(sub_dir))
+        return max_ref_id
+
+    def start(self) -> None:
+        """start the background thread"""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self, wait: bool = True) -> None:
+        """
+        stop the background thread.
+        If wait is False, the thread is told to stop but this function
+        returns without waiting for it to finish checking the directory
+        it is currently checking.
+        """
+        self._stop.set()
+        if wait and self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def close(self) -> None:
+        """stop the background thread and close the library index"""
+        self.stop()
+        if self.index is not None:
+            self.index.close()
+
+    def run(self) -> None:
+        """function that is called in the background thread"""
+        while not self._stop.wait(self.interval):
+            self.poll()
+
+    def poll(self) -> None:
+        """check every directory for changes"""
+        for path in list(self._state.keys()):
+            if self._stop.is_set():
+                break
+            self._check_directory(path)
+        if self.index is not None:
+            self.index.commit()
+
+    def _check_directory(self, path: Path) -> None:
+        """check one directory for changes"""
+        state = self._state.get(path)
+        if state is None:
+            # directory was removed while polling
+            return
+        try:
+            dir_stats = os.stat(str(path))
+            if dir_stats.st_mtime_ns == state.mtime_ns:
+                songs = self._song_states(path, state.songs)
+                entries = None
+            else:
+                entries = list(os.scandir(str(path)))
+        except OSError:
+            # the parent directory will report the removal
+            return
+        subdirectories = state.subdirectories
+        if entries is not None:
+            songs = {}
+            subdirectories = set()
+            for entry in entries:
+                if entry.is_dir():
+                    subdirectories.add(entry.name)
+                elif entry.name.lower().endswith(".mp3") and entry.is_file():
+                    fstats = entry.stat()
+                    songs[entry.name] = (fstats.st_mtime_ns, fstats.st_size)
+        modified = {name for name, fstate in songs.items()
+                    if state.songs.get(name, fstate) not in (None, fstate)}
+        for name in sorted((state.songs.keys() - songs.keys()) | modified):
+            self.changes.put(LibraryChange(ChangeAction.REMOVE_SONG, path / name))
+        for name in sorted(state.subdirectories - subdirectories):
+            self._forget(path / name)
+            self.changes.put(LibraryChange(ChangeAction.REMOVE_DIRECTORY, path / name))
+        for name in sorted((songs.keys() - state.songs.keys()) | modified):
+            self._add_song(path / name)
+        for name in sorted(subdirectories - state.subdirectories):
+            self._add_directory(path / name)
+        state.songs = songs
+        state.subdirectories = subdirectories
+        state.mtime_ns = dir_stats.st_mtime_ns
+
+    @staticmethod
+    def _song_states(path: Path, songs: Dict[str, FileState]) -> Dict[str, FileState]:
+        """
+        get the (mtime_ns, size) of the songs in a directory whose
+        entries have not changed
+        """
+        result: Dict[str, FileState] = {}
+        for name in songs:
+            try:
+                fstats = os.stat(str(path / name))
+            except FileNotFoundError:
+                continue
+            result[name] = (fstats.st_mtime_ns, fstats.st_size)
+        return result
+
+    def _forget(self, path: Path) -> None:
+        """stop watching a directory and all of its sub-directories"""
+        state = self._state.pop(path, None)
+        if state is not None:
+            for name in state.subdirectories:
+                self._forget(path / name)
+
+    def _add_directory(self, path: Path) -> None:
+        """start watching a new directory"""
+        self.changes.put(LibraryChange(ChangeAction.ADD_DIRECTORY, path))
+        self._state[path] = DirectoryState({}, set())
+        self._check_directory(path)
+
+    def _add_song(self, filename: Path) -> None:
+        """parse a new MP3 file"""
+        try:
+            fstats = os.stat(str(filename))
+            metadata: Optional[Metadata] = None
+            if self.index is not None:
+                metadata = self.index.lookup(filename, fstats)
+            if metadata is None:
+                if fstats.st_size > Directory.maxFileSize:
+                    raise InvalidMP3Exception(f'{filename} is too large')
+                metadata = self.parser.parse(filename)
+                if self.index is not None:
+                    self.index.store(filename, fstats, metadata)
+        except (OSError, InvalidMP3Exception) as err:
+            print(f"Error inspecting file: {filename} - {err}")
+            return
+        self.changes.put(LibraryChange(ChangeAction.ADD_SONG, filename, metadata))
+
+    def apply_changes(self) -> List[Tuple[ChangeAction, Union[Song, Directory]]]:
+        """
+        Apply all of the changes found by the background thread to the
+        Directory tree.
+        Returns the list of Song and Directory objects that have been
+        added or removed.
+        """
+        changed: List[Tuple[ChangeAction, Union[Song, Directory]]] = []
+        while True:
+            try:
+                change = self.changes.get_nowait()
+            except queue.Empty:
+                break
+            item = self.apply(change)
+            if item is not None:
+                changed.append((change.action, item))
+        return changed
+
+    def apply(self, change: LibraryChange) -> Optional[Union[Song, Directory]]:
+        """
+        Apply one change to the Directory tree.
+        Returns the Song or Directory that has been added or removed
+        """
+        parent = self.root.find_directory(change.path.parent)
+        if parent is None:
+            return None
+        if change.action == ChangeAction.ADD_SONG:
+            assert change.metadata is not None
+            song = Song(parent, self._next_ref_id, change.metadata)
+            self._next_ref_id += 1
+            parent.add_song(song)
+            return song
+        if change.action == ChangeAction.ADD_DIRECTORY:
+            directory = Directory(parent, self._next_ref_id, change.path,
+                                  parent.parser, parent.progress, parent.index)
+            self._next_ref_id += 1
+            parent.add_subdirectory(directory)
+            return directory
+        if change.action == ChangeAction.REMOVE_SONG:
+            for song in parent.songs:
+                if song.filename == change.path.name:
+                    parent.remove_song(song)
+                    return song
+            return None
+        for sub_dir in parent.subdirectories:
+            if sub_dir.directory == change.path:
+                parent.remove_subdirectory(sub_dir)
+                return sub_dir
+        return None